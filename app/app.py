@@ -9,6 +9,8 @@ This script is responsible for:
     - Conducting backend processes on the display page and rendering the results into the db_display_page.html template.
     - Preparing the dropdown menus available on the query and display pages.
     - Preparing the content in tables displayed on the query and display pages for exportation in CSV format.
+    - Streaming the tables on the query and display pages into a CSV, one batch of rows at a time.
+    - Purging stale variant files from the 'temp' folder in a background thread.
     - Displaying flash message to the User.
     - Logging how the application is used.
 
@@ -19,30 +21,42 @@ import os
 import io
 import csv
 import json
+import time
 import errno
+import hashlib
+import zlib
 import sqlite3
+import threading
 
 from flask import (
     Flask,
     render_template,
+    stream_template,
     request,
     redirect,
     url_for,
     flash,
+    get_flashed_messages,
     jsonify,
-    send_file,
-    session
+    session,
+    Response,
+    make_response,
+    stream_with_context
 )
 
 from tools.utils.logger import logger
 from tools.utils.stringify import stringify
+from tools.utils.parser import VARIANT_FILE_EXTENSIONS
 from tools.modules.vv_functions import get_mane_nc
 from tools.utils.error_handlers import request_status_codes, connection_error, sqlite_error
 from tools.modules.database_functions import (
     patient_variant_table,
     variant_annotations_table,
     validate_database,
-    query_db
+    query_db,
+    read_connection,
+    read_only_uri,
+    READ_PRAGMAS
 )
 
 # ---------------------------------------------------------------
@@ -63,48 +77,566 @@ os.makedirs(app.config['db_upload_folder'], exist_ok=True)
 app.config['variant_files_upload_folder'] = os.path.join(base_dir, 'temp')
 # Make the 'temp' folder if it does not already exist.
 os.makedirs(app.config['variant_files_upload_folder'], exist_ok=True)
+# The number of bytes copied at a time when an uploaded variant file is saved to the 'temp' folder (1 MiB), rather than
+# the 16 KiB used by default.
+UPLOAD_BUFFER_SIZE = 1 << 20
 
 
 # ---------------------------------------------------------------
-# Route: Homepage - create, upload or select a database
+# Databases folder - list the databases that can be queried
 # ---------------------------------------------------------------
-@app.route("/", methods=["GET", "POST"])
-def choose_create_or_add():
+# The names of the databases in the 'databases' folder, stored with the modification time of the folder when it was
+# scanned. The modification time of a folder changes whenever a file is added to, removed from or renamed in it.
+_DATABASES_CACHE = {}
+
+
+def _list_databases():
     """
-    This function facilitates the use of the Variant Query Database homepage. Users are able to Upload variants from
-    variant files with .VCF or .CSV extensions to a new or existing database. They are also able to redirect to the
-    query page, where databases can be queried, after they are selected or uploaded on the homepage.
+    This function lists the databases in the 'databases' folder, so that they can be selected on the homepage and the
+    query page. os.scandir is used so that the names are read from the directory entries as the folder is scanned. The
+    list is stored in _DATABASES_CACHE and reused until a database is added to or removed from the folder.
+
+    A FileNotFoundError is raised if the 'databases' folder does not exist, so that it is handled by the route that
+    called this function.
+
+    :output: A list of the database filenames in the 'databases' folder, in alphabetical order.
+
+       E.g.: ['sea.db', 'test.db']
+
+    :command: databases = _list_databases()
+    """
+
+    folder = app.config['db_upload_folder']
+    mtime = os.stat(folder).st_mtime_ns
+
+    # Return the stored list if the folder has not been modified since it was scanned.
+    cached = _DATABASES_CACHE.get(folder)
+    if cached is not None and cached[0] == mtime:
+        return list(cached[1])
+
+    with os.scandir(folder) as entries:
+        databases = sorted(entry.name for entry in entries if entry.name.endswith(".db") and entry.is_file())
+
+    # A file can be added in the same tick of the file system clock as the scan, without changing the modification
+    # time. The list is only stored once the folder has not been modified for a second.
+    if time.time_ns() - mtime > 1_000_000_000:
+        _DATABASES_CACHE[folder] = (mtime, tuple(databases))
+
+    return databases
+
+
+# ---------------------------------------------------------------
+# Temp folder - purge variant files left behind by failed uploads
+# ---------------------------------------------------------------
+
+# The number of seconds between each purge of the 'temp' folder by the background thread (5 minutes).
+TEMP_PURGE_INTERVAL = 300
+# The number of seconds a variant file can remain in the 'temp' folder before the background thread removes it (1 day).
+# This is long enough that the files of an upload that is still being annotated are not removed.
+TEMP_FILE_MAX_AGE = 24 * 60 * 60
+
+
+def _purge_temp_folder(max_age=None):
+    """
+    This function removes the files in the 'temp' folder. The database functions load every variant file in the 'temp'
+    folder, so any variant files left behind by an upload that failed would be loaded again with the next upload.
+
+    os.scandir is used so that the age of each file is read from the directory entry, without listing the folder and
+    calling os.stat on each file separately. The removal is only logged if a file was removed.
+
+    :params: max_age: The number of seconds since a file was last modified, after which it is removed. If None, every
+                      file is removed.
+
+                E.g.: 86400
+
+    :output: removed: A list of the names of the files that were removed from the 'temp' folder.
+
+               E.g.: ['patient1.vcf', 'patient2.csv']
+
+    :command: removed = _purge_temp_folder(TEMP_FILE_MAX_AGE)
+    """
+
+    # Create an empty list to store the names of the removed files.
+    removed = []
+
+    # Files last modified before this time are stale.
+    oldest = time.time() - max_age if max_age is not None else None
+
+    with os.scandir(app.config['variant_files_upload_folder']) as entries:
+        for entry in entries:
+            # Skip anything that is not a file, and files that are not old enough to be removed.
+            if not entry.is_file() or (oldest is not None and entry.stat().st_mtime > oldest):
+                continue
+            os.remove(entry.path)
+            removed.append(entry.name)
+
+    # Only log the purge if files were actually removed.
+    if removed:
+        logger.warning(f"{', '.join(removed)} removed from 'temp' folder.")
+
+    return removed
+
+
+def _purge_temp_loop():
+    """
+    This function runs in a background thread for as long as the flask app is running. Every TEMP_PURGE_INTERVAL
+    seconds, it removes the variant files that have been in the 'temp' folder for longer than TEMP_FILE_MAX_AGE, so that
+    the 'temp' folder does not need to be purged every time the homepage is loaded.
+
+    :command: threading.Thread(target=_purge_temp_loop, daemon=True).start()
+    """
+
+    while True:
+        time.sleep(TEMP_PURGE_INTERVAL)
+        # An error must not stop the thread, otherwise the 'temp' folder will not be purged again.
+        try:
+            _purge_temp_folder(TEMP_FILE_MAX_AGE)
+        except OSError as e:
+            logger.warning(f"Failed to clean temp folder: {e}")
+
+
+# Start purging the 'temp' folder in the background. It is a daemon thread so that it stops when the flask app stops.
+threading.Thread(target=_purge_temp_loop, daemon=True).start()
+
+
+# ---------------------------------------------------------------
+# Dropdown menus - patient IDs, variant_NC and genes
+# ---------------------------------------------------------------
+
+# The patient IDs, HGVS genomic descriptions and gene symbols listed in the dropdown menus of each database. Each entry
+# is stored against the filepath to the database, with the modification time of the database file when it was read.
+_DROPDOWN_CACHE = {}
+
+# The distinct patient IDs in the patient_variant table, and the distinct HGVS genomic descriptions and gene symbols in
+# the variant_annotations table. Each value is returned with a tag for the dropdown menu that it belongs to: 'p' for
+# patient IDs, 'v' for HGVS genomic descriptions and 'g' for gene symbols. Each part groups and orders by a single
+# column, so that it is read in order from the index on that column (see DATABASE_INDEXES in database_functions.py),
+# without sorting the values or building a temporary table to remove duplicates.
+_DROPDOWN_QUERY = """
+SELECT * FROM (SELECT 'p', patient_ID FROM patient_variant GROUP BY patient_ID ORDER BY patient_ID)
+UNION ALL
+SELECT * FROM (SELECT 'v', variant_NC FROM variant_annotations GROUP BY variant_NC ORDER BY variant_NC)
+UNION ALL
+SELECT * FROM (SELECT 'g', gene FROM variant_annotations GROUP BY gene ORDER BY gene)
+"""
+
+
+def _get_dropdowns(db_path):
+    """
+    This function retrieves the distinct patient IDs, HGVS genomic descriptions and gene symbols from a database, to
+    populate the dropdown menus on the query page. The lists are stored in _DROPDOWN_CACHE and reused until the database
+    file is modified, so that revisiting the query page does not query the database again.
+
+    sqlite3 exceptions are not handled here, so that they are handled by the route that called this function.
+
+    :params: db_path: The absolute filepath to the database.
+
+    :output: A tuple of three lists: the patient IDs, HGVS genomic descriptions and gene symbols, in ascending order.
+
+       E.g.: (['Patient1', 'Patient2'], ['NC_000017.11:g.44349216A>G'], ['ATP1A3', 'GRN'])
+
+    :command: patient_list, variant_list, gene_list = _get_dropdowns(db_path)
+    """
+
+    # Retrieve the modification time of the database file. If it cannot be retrieved, the lists are not cached.
+    try:
+        mtime = os.stat(db_path).st_mtime_ns
+    except OSError:
+        mtime = None
+
+    # Return the stored lists if the database has not been modified since they were read.
+    cached = _DROPDOWN_CACHE.get(db_path)
+    if mtime is not None and cached is not None and cached[0] == mtime:
+        logger.debug(f'Dropdown menus for {db_path} retrieved from cache.')
+        return cached[1]
+
+    # Load the selected database using the absolute filepath to the database file.
+    with read_connection(db_path) as conn:
+        cur = conn.cursor()
+        # Retrieve the distinct patient IDs, HGVS genomic descriptions and gene symbols with a single query.
+        cur.execute(_DROPDOWN_QUERY)
+        # Sort the values into the list for the dropdown menu that they belong to.
+        dropdown_lists = {'p': [], 'v': [], 'g': []}
+        for tag, value in cur.fetchall():
+            dropdown_lists[tag].append(value)
+
+    patient_list, variant_list, gene_list = dropdown_lists['p'], dropdown_lists['v'], dropdown_lists['g']
+    dropdowns = (patient_list, variant_list, gene_list)
+
+    # Store the lists against the modification time of the database file.
+    if mtime is not None:
+        _DROPDOWN_CACHE[db_path] = (mtime, dropdowns)
+
+    return dropdowns
+
+
+# The distinct values under each column of the display page, used to populate the filter dropdown menu. Each entry is
+# stored against the filepath to the database, with the modification time of the database file when it was read.
+_FILTER_VALUES_CACHE = {}
+
+
+def _get_filter_values(db_path, columns):
+    """
+    This function retrieves the distinct values under each column of the patient_variant and variant_annotations tables
+    joined together, to populate the filter dropdown menu on the display page. The values for every column are retrieved
+    with a single query, which joins the tables once. The values, and the JSON used by the display page to populate the
+    filter dropdown menu, are stored in _FILTER_VALUES_CACHE and reused until the database file is modified.
+
+    sqlite3 exceptions are not handled here, so that they are handled by the route that called this function.
+
+    :params: db_path: The absolute filepath to the database.
+             columns: The column headers displayed on the display page.
+               E.g.: ['patient_ID', 'variant_NC', 'gene']
+
+    :output: filter_values: A dictionary where each column header is a key and its value is a list of the distinct
+                            values under that column, in ascending order.
+
+               E.g.: {'patient_ID': ['Patient1', 'Patient2'], 'variant_NC': ['NC_000017.11:g.44349216A>G'],
+                      'gene': ['ATP1A3', 'GRN']}
+
+             filter_values_json: The 'filter_values' dictionary converted into a JSON string.
+
+    :command: filter_values, filter_values_json = _get_filter_values(db_path, ['patient_ID', 'variant_NC', 'gene'])
+    """
+
+    # Retrieve the modification time of the database file. If it cannot be retrieved, the values are not cached.
+    try:
+        mtime = os.stat(db_path).st_mtime_ns
+    except OSError:
+        mtime = None
+
+    # Return the stored values if the database has not been modified since they were read.
+    key = (db_path, tuple(columns))
+    cached = _FILTER_VALUES_CACHE.get(key)
+    if mtime is not None and cached is not None and cached[0] == mtime:
+        logger.debug(f'Filter values for {db_path} retrieved from cache.')
+        return cached[1], cached[2]
+
+    # The tables are joined once, in the 'joined' common table expression. The distinct values under each column are
+    # then selected from it, labelled with the column header, and combined into one result with UNION ALL.
+    query = "WITH joined AS (SELECT * FROM patient_variant pv JOIN variant_annotations v ON pv.variant = v.variant_NC) "
+    query += " UNION ALL ".join(
+        f"SELECT * FROM (SELECT DISTINCT '{col}' AS col, {col} AS val FROM joined WHERE {col} IS NOT NULL)"
+        for col in columns
+    )
+    # Order the values by column header, then by value, as each column was ordered before.
+    query += " ORDER BY col, val"
+
+    # Every column has a list, even if it does not have any values.
+    filter_values = {col: [] for col in columns}
+
+    # Connect to the User-selected database using the absolute path to it.
+    with read_connection(db_path) as conn:
+        cur = conn.cursor()
+        cur.execute(query)
+        # Add each value to the list of the column that it was under.
+        for col, val in cur.fetchall():
+            filter_values[col].append(val)
+
+    # 'filter_values' dictionary converted into a JSON, once for each version of the database.
+    filter_values_json = json.dumps(filter_values, separators=(',', ':'))
+
+    # Store the values against the modification time of the database file.
+    if mtime is not None:
+        _FILTER_VALUES_CACHE[key] = (mtime, filter_values, filter_values_json)
+
+    return filter_values, filter_values_json
+
+
+# ---------------------------------------------------------------
+# Homepage - form handlers
+# ---------------------------------------------------------------
+def _save_upload(file, folder, label=None):
+    """
+    This function saves a file uploaded by the User to a folder. The file is copied in chunks of UPLOAD_BUFFER_SIZE, so
+    that fewer reads and writes are needed to save a large file. If the file cannot be saved, the error is logged and a
+    message describing it is returned so that it can be shown to the User.
+
+    :params: file: The FileStorage object of the file uploaded by the User.
+
+             folder: The absolute filepath to the folder that the file is saved to.
+
+             label: The name used for the file in the message shown to the User when they lack permission to save it.
+                    Defaults to the name of the file.
+
+               E.g.: 'test.db database'
+
+    :output: None if the file was saved, otherwise the message describing why it could not be saved.
+
+       E.g.: '❌ Failed to save sample.vcf. Permission denied.'
+
+    :command: error = _save_upload(file, app.config['variant_files_upload_folder'])
     """
 
-    # The function uploads variants from every variant file in the 'temp' folder. If the User uploaded any variant files
-    # without adding them to a database, the variant files will still be in the 'temp' folder the next time the app is
-    # used. This will cause the database functions in this script to run slower. If the uploaded files are not
-    # variant files, the functions will raise an exception. Therefore, the contents of the 'temp' folder are purged
-    # from the folder before the homepage is loaded.
+    # Create a filepath to the uploaded file, in the selected folder.
+    filepath = os.path.join(folder, file.filename)
+
+    # Test if the file can be saved to the folder.
     try:
-        for variant_file in os.listdir(app.config['variant_files_upload_folder']):
-            os.remove(os.path.join(app.config['variant_files_upload_folder'], variant_file))
-            # Log which files were deleted from the 'temp' folder.
-            logger.info(f"{variant_file} removed from 'temp' folder.")
+        file.save(filepath, buffer_size=UPLOAD_BUFFER_SIZE)
+        # Log the name of the file that was saved and the folder that it was saved to. This is logged at the DEBUG
+        # level because it is called for every file in an upload; the routes log one summary line for the upload.
+        logger.debug(f"{file.filename} uploaded to '{os.path.basename(folder)}' folder.")
+        return None
+
+    # Raise an exception if the User lack permission to save the file.
+    except PermissionError as e:
+        # Log the error, explaining the User's lack of permission, using the exception output.
+        logger.error(f"Failed to save {file.filename} to {folder} because the User lacks permissions: {str(e)}")
+        # Notify the User that the file couldn't be saved to the folder because they lack permission.
+        return f'❌ Failed to save {label or file.filename}. Permission denied.'
+
+    # Raise an exception if there is an error with the system, preventing the file from being saved.
+    except OSError as e:
+        # from ChatGPT.
+        if e.errno == errno.ENOSPC:
+            # Log the error, explaining there isn't enough disk space, using the exception output.
+            logger.error(
+                f"Failed to save {file.filename} to {folder} because there is a problem with your disk space: {str(e)}")
+            # Notify the User that the file couldn't be saved to the folder because there is not enough disk.
+            return f'❌ Failed to save {file.filename}. There is a problem with your disk space.'
+
+        # Log that there was an error with the operating system, using the exception output.
+        logger.error(
+            f"Failed to save {file.filename} to {folder} because there is an issue with the operating system: {str(e)}")
+        # Notify the User that the file couldn't be saved to the folder.
+        return f'❌ Failed to save {file.filename}. There is an issue with the operating system: {str(e)}'
+
+    # Raise an exception if the file cannot be saved.
+    except Exception as e:
+        # Log the error, describing the reason why the test failed, using the exception output.
+        logger.error(f"Failed to save {file.filename} to {folder}: {str(e)}")
+        # Notify the User that the file couldn't be saved to the folder.
+        return f'❌ Failed to save {file.filename}: {str(e)}'
+
+
+def _homepage(databases, message=None):
+    """
+    This function renders the homepage, after flashing a message to the User if one is given. Every form handler
+    returns to the homepage this way when the User's request cannot be completed.
+
+    :params: databases: A list of the databases in the 'databases' folder, returned by _list_databases().
+
+             message: The message to flash at the top of the homepage.
+
+    :output: The rendered homepage.
+
+    :command: return _homepage(databases, "⚠ A variant file was not uploaded")
+    """
+
+    # Notify the User, at the top of the homepage.
+    if message:
+        flash(message)
+
+    # Render the output into the homepage.
+    return render_template("homepage.html", databases=databases)
+
+
+def _handle_add(databases):
+    """
+    This function handles the 'add_variant' form on the homepage, which creates or adds to a database. The variant
+    files uploaded by the User are saved to the 'temp' folder and the variants in them are loaded into the selected
+    database.
+
+    :params: databases: A list of the databases in the 'databases' folder, returned by _list_databases().
+
+    :output: A redirect to the homepage if the variants were added to the database, otherwise the rendered homepage
+             with the error flashed to the User.
+
+    :command: return _handle_add(databases)
+    """
+
+    # Log that the User wants to create or add to a database.
+    logger.info(f'Form-type: add_variant. User is trying to create or add to a database.')
+
+    # The variant files uploaded by the User are added to a list called 'variant_files' in the backend.
+    # This command pulls the variant files into the variable, 'files'.
+    files = request.files.getlist("variant_files")
+    # The databases in the 'databases' folder appear in a dropdown menu, for the User to select. This command
+    # pulls the selected database into the variable, 'database_name'.
+    database_name = os.path.splitext(request.form["db_file"])[0]
+    # The 'temp' folder that the variant files are saved to, loaded from and removed from.
+    temp_folder = app.config['variant_files_upload_folder']
+
+    # The html provides many prompts preventing the User from not uploading a file before creating/adding to
+    # the database. However, if somehow nothing has been assigned to the 'files' variable...
+    if not files or files[0].filename == '':
+        # The warning is logged and appears at the top of the homepage.
+        logger.warning("No variant files were uploaded.")
+        return _homepage(databases, "⚠ A variant file was not uploaded")
+
+    # If any file does not have a .CSV or.VCF extension (optionally compressed, e.g. .vcf.gz), none of the files are
+    # uploaded. This is checked before anything is written to the 'temp' folder. The extension is compared in lower
+    # case, so that files such as sample.VCF are accepted.
+    for file in files:
+        if not file.filename.lower().endswith(VARIANT_FILE_EXTENSIONS):
+            # Log that the file could not be uploaded.
+            logger.warning(f"{file.filename} not uploaded because it is not a .VCF or .CSV file.")
+            return _homepage(databases, "❌ Invalid file type. Please upload .VCF or .CSV files only.")
+
+    # The database functions upload variants from every variant file in the 'temp' folder. If a previous upload
+    # failed, its variant files will still be in the 'temp' folder and would be uploaded into this database too.
+    # If the uploaded files are not variant files, the functions will raise an exception. Therefore, the contents
+    # of the 'temp' folder are purged before the selected files are saved.
+    try:
+        _purge_temp_folder()
 
     # If a file in the temp folder is open, os.remove might raise an OSError exception (500).
     # Handle the error with the following logger and flash messages.
     except OSError as e:
         logger.warning(f"Failed to clean temp folder: {e}")
-        flash("⚠ Failed to delete files from temp folder. "
-              "Please consider closing and removing them before uploading new variant files.")
-        return render_template("homepage.html")
+        return _homepage(databases, "⚠ Failed to delete files from temp folder. "
+                                    "Please consider closing and removing them before uploading new variant files.")
+
+    # Save the selected files to the 'temp' folder. Stop at the first file that cannot be saved.
+    for file in files:
+        if error := _save_upload(file, temp_folder):
+            return _homepage(databases, error)
+    # Log the files that were saved, in one line for the whole upload.
+    logger.info(f"{len(files)} variant files uploaded to 'temp' folder: {', '.join(file.filename for file in files)}")
+
+    # Execute the imported database_functions, using the absolute path to the 'temp' folder and the database
+    # created/selected by the User. These functions parse the files and populate the database with the relevant
+    # information.
+    # Log the start of when the variant files are being loaded into the User-specified database.
+    logger.info(f"Starting to load variant files from 'temp' folder, into {database_name} database.")
+    # The variants parsed by patient_variant_table, and their VariantValidator responses, are shared with
+    # variant_annotations_table through 'prepared', so that each file is only parsed and queried once.
+    # If 'error' was returned from either function, the function errored. The User should be notified and app.py
+    # should stop processing.
+    prepared = {}
+    for table_function in (patient_variant_table, variant_annotations_table):
+        if table_function(temp_folder, database_name, prepared) == 'error':
+            return _homepage(databases, f'❌ {database_name}.db was not created/updated.')
+
+    # The dropdown menus for this database need to be read from the database again.
+    _DROPDOWN_CACHE.pop(os.path.join(app.config["db_upload_folder"], f'{database_name}.db'), None)
+
+    # Delete the files from the 'temp' folder otherwise every file in the 'temp' folder will be processed after
+    # the User adds another file to the database.
+    for file in files:
+        os.remove(os.path.join(temp_folder, file.filename))
+        # Log when the file has been deleted from the 'temp' folder.
+        logger.debug(f"{file.filename} removed from 'temp' folder.")
+    # Log the files that were deleted, in one line for the whole upload.
+    logger.info(f"{len(files)} variant files removed from 'temp' folder.")
+
+    # Notify the User which files have been loaded into the database.
+    flash(f"Added {', '.join(file.filename for file in files)} to database.")
+    # Refresh the homepage so that the newly created/updated database can be queried.
+    return redirect(url_for("choose_create_or_add"))
+
+
+def _handle_open(databases):
+    """
+    This function handles the 'open_db' form on the homepage, which queries a database that already exists in the
+    'databases' folder.
+
+    :params: databases: A list of the databases in the 'databases' folder, returned by _list_databases().
+
+    :output: A redirect to the query page for the database selected by the User.
+
+    :command: return _handle_open(databases)
+    """
+
+    # The 'existing_db' represents the database that the User selected from the dropdown menu on the homepage.
+    selected_db = request.form.get("existing_db")
+    # Log which database is going to be queried.
+    logger.info(f'User is going to query the {selected_db} database.')
+    # Redirect the User to the query page where the chosen database can be queried.
+    return redirect(url_for("query_page", db_name=selected_db))
+
 
-    # Create an empty list to iterate through the databases.
-    databases = []
+def _handle_upload(databases):
+    """
+    This function handles the 'upload_db' form on the homepage, which uploads a database so that it can be queried.
+    The database is saved to the 'databases' folder and removed again if it does not conform with the required schema.
+
+    :params: databases: A list of the databases in the 'databases' folder, returned by _list_databases().
+
+    :output: A redirect to the query page for the uploaded database if it was validated, otherwise the rendered
+             homepage with the error flashed to the User.
+
+    :command: return _handle_upload(databases)
+    """
 
-    # Add the names of the databases in the 'databases' folder to the databases list.
-    for f in os.listdir(app.config['db_upload_folder']):
-        if f.endswith(".db"):
-            databases.append(f)
+    # Log that the User wants to upload a database.
+    logger.info(f'Form-type: upload_db. User is trying to upload a database to query.')
+
+    # The uploaded file is represented by 'database_file' in the homepage.html, which is assigned to the 'file'
+    # variable.
+    file = request.files.get("database_file")
+
+    # The html provides many prompts preventing the User from not uploading a database. However, if somehow
+    # nothing has been assigned to the 'file' variable...
+    if not file or file.filename == "":
+        # The warning is logged and appears at the top of the homepage, notifying the User.
+        logger.warning('No database files were uploaded.')
+        return _homepage(databases, "⚠ A database file was not uploaded.")
+
+    # Assign the database's file name to the variable 'filename'.
+    filename = file.filename
+
+    # If the filename does not end with the .DB database extension, it will be rejected from being uploaded.
+    if not filename.endswith(".db"):
+        # Log the rejection.
+        logger.warning(f'{filename} does not contain a .db file extension. It is not recognised as a database file.')
+        # Notify the User that their attempt to upload a database has been rejected.
+        return _homepage(databases, '❌ Invalid file type. Please upload a .db file.')
+
+    # Save the database to the 'databases' folder, where the database can be queried from.
+    db_folder = app.config['db_upload_folder']
+    if error := _save_upload(file, db_folder, label=f'{filename} database'):
+        return _homepage(databases, error)
+
+    # Create a filepath to the database in the 'databases' folder.
+    filepath = os.path.join(db_folder, filename)
+    # The dropdown menus for a database previously uploaded with the same name need to be read again.
+    _DROPDOWN_CACHE.pop(filepath, None)
+
+    # validate_database() function ensures that the database conforms with the expected schema that allows the
+    # database file to be queried.
+    if not validate_database(filepath):
+        # Log that the database failed validation and cannot be queried.
+        logger.warning(f'{filename} does not conform with the required schema. Validation failed.')
+        # Remove the database file from the 'databases' folder.
+        os.remove(filepath)
+        # Log that the database file was removed.
+        logger.info(f"Removed {filename} from 'database' folder.")
+        # Notify the User that the database cannot be queried.
+        return _homepage(databases, f'❌ Upload Error: {filename} cannot be queried. Inappropriate tables or headers.')
+
+    # Log that the database was successfully uploaded and validated.
+    logger.info(f"Successfully uploaded and validated {filename} database.")
+    # Notify the User that the database was successfully uploaded and validated.
+    flash("✅ Database uploaded and validated successfully.")
+    # Redirect the User to the query page where the uploaded database can be queried.
+    return redirect(url_for("query_page", db_name=filename))
+
+
+# Each operation (create or add to database, select a database to query, upload a database to query) has been assigned a
+# form-type ID in the homepage.html file. Each form-type ID is mapped to the function that handles it.
+_HANDLERS = {
+    "add_variant": _handle_add,
+    "open_db": _handle_open,
+    "upload_db": _handle_upload,
+}
+
+
+# ---------------------------------------------------------------
+# Route: Homepage - create, upload or select a database
+# ---------------------------------------------------------------
+@app.route("/", methods=["GET", "POST"])
+def choose_create_or_add():
+    """
+    This function facilitates the use of the Variant Query Database homepage. Users are able to Upload variants from
+    variant files with .VCF or .CSV extensions to a new or existing database. They are also able to redirect to the
+    query page, where databases can be queried, after they are selected or uploaded on the homepage.
+    """
 
-    # Sort them into alphabetical order to make them easily viewable for the User.
-    databases.sort()
+    # Add the names of the databases in the 'databases' folder to the databases list, in alphabetical order to make them
+    # easily viewable for the User.
+    databases = _list_databases()
 
     # If no databases are in the 'databases' folder, log that there are not databases in the folder.
     if len(databases) == 0:
@@ -113,252 +645,124 @@ def choose_create_or_add():
     else:
         logger.info(f"Databases in the 'databases' folder: {', '.join(databases)}")
 
-    # Perform the following processes if the User's request uses the HTTP 'POST' method.
+    # If the User's request uses the HTTP 'POST' method, retrieve the form-type ID used by the User and pass the request
+    # to the function that handles it.
     if request.method == "POST":
-        # Each operation (create or add to database, select a database to query, upload a database to query) has been
-        # assigned a form-type ID in the homepage.html file. This retrieves the form-type ID used by the User.
-        form_type = request.form.get("form_type")
-
-        # The 'add_variant' form-type corresponds with creating or adding to a database.
-        if form_type == "add_variant":
-            # Log that the User wants to create or add to a database.
-            logger.info(f'Form-type: add_variant. User is trying to create or add to a database.')
-
-            # The variant files uploaded by the User are added to a list called 'variant_files' in the backend.
-            # This command pulls the variant files into the variable, 'files'.
-            files = request.files.getlist("variant_files")
-            # The databases in the 'databases' folder appear in a dropdown menu, for the User to select. This command
-            # pulls the selected database into the variable, 'database_name'.
-            database_name = os.path.splitext(request.form["db_file"])[0]
-
-            # The html provides many prompts preventing the User from not uploading a file before creating/adding to
-            # the database. However, if somehow nothing has been assigned to the 'files' variable...
-            if not files or files[0].filename == '':
-                # A warning appears at the top of the homepage.
-                flash("⚠ A variant file was not uploaded")
-                # The warning is also logged.
-                logger.warning("No variant files were uploaded.")
-                # Render the output into the homepage.
-                return render_template("homepage.html", databases=databases)
-
-            # Save the selected files to the 'temp' folder.
-            for file in files:
-                # If the file does not have a .CSV or.VCF extension, they cannot be uploaded.
-                if not file.filename.endswith('.vcf') and not file.filename.endswith('.csv'):
-                    # Log that the file could not be uploaded.
-                    logger.warning(f"{file.filename} not uploaded because it is not a .VCF or .CSV file.")
-                    flash("❌ Invalid file type. Please upload .VCF or .CSV files only.")
-                    # Render this output into the homepage.
-                    return render_template("homepage.html", databases=databases)
-
-                # Test if the file can be saved to the 'temp' folder.
-                try:
-                    # Create a filepath to the uploaded file, in the 'temp' folder.
-                    variant_file_path = os.path.join(app.config['variant_files_upload_folder'], file.filename)
-                    # Save the file using the aforementioned filepath.
-                    file.save(variant_file_path)
-                    # Log the name of the file that was saved to the 'temp' folder.
-                    logger.info(f"{file.filename} uploaded to 'temp' folder.")
-
-                # Raise an exception if the User lack permission to save the file.
-                except PermissionError as e:
-                    # Log the error, explaining the User's lack of permission, using the exception output.
-                    logger.error(
-                        f"Failed to save {file.filename} to {app.config['variant_files_upload_folder']} because the "
-                        f"User lacks permissions: {str(e)}")
-                    # Notify the User that the file couldn't be saved to the 'temp' folder because they lack permission.
-                    flash(f'❌ Failed to save {file.filename}. Permission denied.')
-                    # Render this output into the homepage.
-                    return render_template("homepage.html", databases=databases)
-
-                # Raise an exception if there is an error with the system, preventing the file from being saved.
-                except OSError as e:
-                    # from ChatGPT.
-                    if e.errno == errno.ENOSPC:
-                        # Log the error, explaining there isn't enough disk space, using the exception output.
-                        logger.error(
-                            f"Failed to save {file.filename} to {app.config['variant_files_upload_folder']} because "
-                            f"there is a problem with your disk space: {str(e)}")
-                        # Notify the User that the file couldn't be saved to the 'temp' folder because there is not
-                        # enough disk.
-                        flash(f'❌ Failed to save {file.filename}. There is a problem with your disk space.')
-                        # Render this output into the homepage.
-                        return render_template("homepage.html", databases=databases)
-
-                    else:
-                        # Log that there was an error with the operating system, using the exception output.
-                        logger.error(
-                            f"Failed to save {file.filename} to {app.config['variant_files_upload_folder']} because "
-                            f"there is an issue with the operating system: {str(e)}")
-                        # Notify the User that the file couldn't be saved to the 'temp' folder.
-                        flash(
-                            f'❌ Failed to save {file.filename}. There is an issue with the operating system: '
-                            f'{str(e)}')
-                        # Render this output into the homepage.
-                        return render_template("homepage.html", databases=databases)
-
-                # Raise an exception if the file cannot be saved.
-                except Exception as e:
-                    # Log the error, describing the reason why the test failed, using the exception output.
-                    logger.error(
-                        f"Failed to save {file.filename} to {app.config['variant_files_upload_folder']}: {str(e)}")
-                    # Notify the User that the file couldn't be saved to the 'temp' folder.
-                    flash(f'❌ Failed to save {file.filename}: {str(e)}')
-                    # Render this output into the homepage.
-                    return render_template("homepage.html", databases=databases)
-
-            # Execute the imported database_functions, using the absolute path to the 'temp' folder and the database
-            # created/selected by the User. These functions parse the files and populate the database with the relevant
-            # information.
-            # Log the start of when the variant files are being loaded into the User-specified database.
-            logger.info(f"Starting to load variant files from 'temp' folder, into {database_name} database.")
-            error = patient_variant_table(app.config['variant_files_upload_folder'], database_name)
-            # If 'error' was returned from the patient_variant_table() function, the function errored. The User
-            # should be notified and app.py should stop processing.
-            if error == 'error':
-                flash(f'❌ {database_name}.db was not created/updated.')
-                return render_template("homepage.html", databases=databases)
-            error = variant_annotations_table(app.config['variant_files_upload_folder'], database_name)
-            # If 'error' was returned from the variant_annotations_table() function, the function errored. The User
-            # should be notified and app.py should stop processing.
-            if error == 'error':
-                flash(f'❌ {database_name}.db was not created/updated.')
-                return render_template("homepage.html", databases=databases)
-
-            # Delete the files from the 'temp' folder otherwise every file in the 'temp' folder will be processed after
-            # the User adds another file to the database.
-            for file in files:
-                variant_file_path = os.path.join(app.config['variant_files_upload_folder'], file.filename)
-                os.remove(variant_file_path)
-                # Log when the file has been deleted from the 'temp' folder.
-                logger.info(f"{file.filename} removed from 'temp' folder.")
-
-            # Notify the User which files have been loaded into the database.
-            filenames = [file.filename for file in files]
-            flash(f"Added {', '.join(filenames)} to database.")
-            # Refresh the homepage so that the newly created/updated database can be queried.
-            return redirect(url_for("choose_create_or_add"))
-
-        # The 'open_db' form-type corresponds with querying a database that already exists in the 'database' folder, in
-        # the homepage.html.
-        elif form_type == "open_db":
-            # The 'existing_db' represents the database that the User selected from the dropdown menu on the homepage.
-            selected_db = request.form.get("existing_db")
-            # Log which database is going to be queried.
-            logger.info(f'User is going to query the {selected_db} database.')
-            # Redirect the User to the query page where the chosen database can be queried.
-            return redirect(url_for("query_page", db_name=selected_db))
-
-        # The 'upload_db' form-type corresponds with uploading a database so that it can be queried, in the
-        # homepage.html.
-        elif form_type == "upload_db":
-
-            # Log that the User wants to create or add to a database.
-            logger.info(f'Form-type: upload_db. User is trying to upload a database to query.')
-
-            # The uploaded file is represented by 'database_file' in the homepage.html, which is assigned to the file
-            # 'variable'.
-            file = request.files.get("database_file")
-
-            # The html provides many prompts preventing the User from not uploading a database. However, if somehow
-            # nothing has been assigned to the 'files' variable...
-            if not file or file.filename == "":
-                # A warning appears at the top of the homepage, notifying the User.
-                flash("⚠ A database file was not uploaded.")
-                # The warning is also logged.
-                logger.warning('No database files were uploaded.')
-                # Render the output into the homepage.
-                return render_template("homepage.html", databases=databases)
-
-            # Assign the database's file name to the variable 'filename'.
-            filename = file.filename
-
-            # If the filename does not end with the .DB database extension, it will be rejected from being uploaded.
-            if not filename.endswith(".db"):
-                # Log the rejection.
-                logger.warning(f'{filename} does not contain a .db file extension. It is not recognised as a database '
-                               f'file.')
-                # Notify the User that their attempt to upload a database has been rejected.
-                flash('❌ Invalid file type. Please upload a .db file.')
-                return render_template("homepage.html", databases=databases)
-
-            # Test that the database can be saved to the 'database' folder, where the database can be queried from.
-            try:
-                # Create a filepath to the 'database' folder.
-                filepath = os.path.join(app.config['db_upload_folder'], filename)
-                # Save the uploaded file to the aforementioned filepath.
-                file.save(filepath)
-                # Log the name of the file that was saved to the 'temp' folder.
-                logger.info(f"{file.filename} uploaded to 'database' folder.")
-
-            # Raise an exception if the User lack permission to save the file.
-            except PermissionError as e:
-                # Log the error, explaining the User's lack of permission, using the exception output.
-                logger.error(
-                    f"Failed to save {filename} to {app.config['db_upload_folder']} because the User lacks permissions:"
-                    f" {str(e)}")
-                # Notify the User that the file couldn't be saved to the 'database' folder because they lack permission.
-                flash(f'❌ Failed to save {filename} database. Permission denied.')
-                # Render this output into the homepage.
-                return render_template("homepage.html", databases=databases)
-
-            # Raise an exception if there is an error with the system, preventing the file from being saved.
-            except OSError as e:
-                # from ChatGPT.
-                if e.errno == errno.ENOSPC:
-                    # Log the error, explaining there isn't enough disk space, using the exception output.
-                    logger.error(
-                        f"Failed to save {filename} to {app.config['db_upload_folder']} because there is a problem with"
-                        f" your disk space: {str(e)}")
-                    # Notify the User that the file couldn't be saved to the 'database' folder because there is not
-                    # enough disk.
-                    flash(f'❌ Failed to save {filename}. There is a problem with your disk space.')
-                    # Render this output into the homepage.
-                    return render_template("homepage.html", databases=databases)
-
-                else:
-                    # Log that there was an error with the operating system, using the exception output.
-                    logger.error(
-                        f"Failed to save {filename} to {app.config['db_upload_folder']} because there is an issue with "
-                        f"the operating system: {str(e)}")
-                    # Notify the User that the file couldn't be saved to the 'database' folder.
-                    flash(
-                        f'❌ Failed to save {filename}. There is an issue with the operating system: '
-                        f'{str(e)}')
-                    # Render this output into the homepage.
-                    return render_template("homepage.html", databases=databases)
-
-            # Raise an exception if the file cannot be saved.
-            except Exception as e:
-                # Log the error, describing the reason why the test failed, using the exception output.
-                logger.error(
-                    f"Failed to save {filename} to {app.config['db_upload_folder']}: {str(e)}")
-                # Notify the User that the file couldn't be saved to the 'database' folder.
-                flash(f'❌ Failed to save {filename}: {str(e)}')
-                # Render this output into the homepage.
-                return render_template("homepage.html", databases=databases)
-
-            # validate_database() function ensures that the database conforms with the expected schema that allows the
-            # database file to be queried.
-            if not validate_database(filepath):
-                # Log that the database failed validation and cannot be queried.
-                logger.warning(f'{filename} does not conform with the required schema. Validation failed.')
-                # Remove the database file from the 'database' folder.
-                os.remove(filepath)
-                # Log that the database file was removed.
-                logger.info(f"Removed {filename} from 'database' folder.")
-                # Notify the User that the database cannot be queried.
-                flash(f'❌ Upload Error: {filename} cannot be queried. Inappropriate tables or headers.')
-            else:
-                # Log that the database was successfully uploaded and validated.
-                logger.info(f"Successfully uploaded and validated {filename} database.")
-                # Notify the User that the database was successfully uploaded and validated.
-                flash("✅ Database uploaded and validated successfully.")
-                # Redirect the User to the query page where the uploaded database can be queried.
-                return redirect(url_for("query_page", db_name=filename))
+        handler = _HANDLERS.get(request.form.get("form_type"))
+        if handler:
+            return handler(databases)
 
     # Render the output from this function into the homepage.
-    return render_template("homepage.html", databases=databases)
+    return _homepage(databases)
+
+
+# ---------------------------------------------------------------
+# SQL queries - query and display pages
+# ---------------------------------------------------------------
+
+# The queries are defined once, so that the same query string is passed to sqlite3 on every request and the statement
+# that sqlite3 prepared for it is reused by the connection from read_connection.
+
+# The queried patient ID and corresponding HGVS genomic descriptions, HGVS transcript descriptions, HGVS protein
+# descriptions of the variants that derive from that patient, the gene symbol, HGNC ID, Classification, Associated
+# conditions, ClinVar star-rating, and ClinVar review status of those variants. The patient ID and HGVS genomic
+# descriptions are taken from the patient_variant table. The HGVS genomic descriptions of the variants are mapped to the
+# descriptions in the variant_annotations table, to find the additional information to append to the patient ID and
+# HGVS genomic descriptions in the table that will be returned to the User through the UI.
+_PATIENT_QUERY = """
+SELECT
+    pv.patient_ID,
+    v.variant_NC,
+    v.variant_NM,
+    v.variant_NP,
+    v.gene,
+    v.HGNC_ID,
+    v.Classification,
+    v.Conditions,
+    v.Stars,
+    v.Review_status
+FROM patient_variant pv
+JOIN variant_annotations v
+  ON pv.variant = v.variant_NC
+WHERE pv.patient_ID = ?
+"""
+
+# The HGVS genomic description, HGVS transcript description, HGVS protein description, gene symbol, HGNC ID,
+# Classification, Associated conditions, ClinVar star-rating, and ClinVar review status of a variant. The number of
+# patients with the HGVS genomic description, in the patient_variant table, is counted and returned. Each row in the
+# variant_annotations table is unique by its HGVS genomic, transcript and protein descriptions, so the patients are
+# counted for each row by a subquery on the idx_pv_variant index, rather than by joining and grouping the two tables.
+_VARIANT_QUERY = """
+SELECT
+    v.variant_NC,
+    v.variant_NM,
+    v.variant_NP,
+    v.gene,
+    v.HGNC_ID,
+    v.Classification,
+    v.Conditions,
+    v.Stars,
+    v.Review_status,
+    (SELECT COUNT(pv.patient_ID) FROM patient_variant pv WHERE pv.variant = v.variant_NC) AS Patient_Count
+FROM variant_annotations v
+WHERE v.variant_NC = ?
+"""
+
+# The HGVS genomic descriptions, HGVS transcript descriptions and the HGVS protein descriptions of the variants that
+# derived from a gene, the gene symbol, HGNC ID, Classification, Associated conditions, ClinVar star-rating, and ClinVar
+# review status. The number of patients with each variant, in the patient_variant table, is also counted and returned,
+# for each unique combination of HGVS descriptions and annotations. Every selected column is grouped, so that an
+# uploaded database with more than one annotation for the same HGVS descriptions returns each annotation rather than
+# one picked arbitrarily by SQLite. The HGNC ID of the gene symbol queried by the User is looked up in the
+# variant_annotations table by the subquery, as part of the same query.
+_GENE_QUERY = """
+SELECT
+    v.variant_NC,
+    v.variant_NM,
+    v.variant_NP,
+    v.gene,
+    v.HGNC_ID,
+    v.Classification,
+    v.Conditions,
+    v.Stars,
+    v.Review_status,
+    COUNT(pv.patient_ID) AS Patient_Count
+FROM variant_annotations v
+LEFT JOIN patient_variant pv
+  ON v.variant_NC = pv.variant
+WHERE v.HGNC_ID = (SELECT HGNC_ID FROM variant_annotations WHERE gene = ? LIMIT 1)
+GROUP BY
+    v.variant_NC,
+    v.variant_NM,
+    v.variant_NP,
+    v.gene,
+    v.HGNC_ID,
+    v.Classification,
+    v.Conditions,
+    v.Stars,
+    v.Review_status
+ORDER BY Patient_Count DESC
+"""
+
+# The HGVS genomic descriptions, HGVS transcript descriptions and the HGVS protein descriptions of the variants in the
+# database, the gene symbol, HGNC ID, Classification, Associated conditions, ClinVar star-rating, and ClinVar review
+# status, for the table on the display page.
+_DISPLAY_QUERY = """
+SELECT
+    pv.patient_ID,
+    v.variant_NC,
+    v.variant_NM,
+    v.variant_NP,
+    v.gene,
+    v.HGNC_ID,
+    v.Classification,
+    v.Conditions,
+    v.Stars,
+    v.Review_status
+FROM patient_variant pv
+JOIN variant_annotations v
+  ON pv.variant = v.variant_NC
+"""
 
 
 # ---------------------------------------------------------------
@@ -433,13 +837,8 @@ def query_page(db_name):
 
     # Check that there are databases in the 'database' folder, that can be queried.
     try:
-        # Add the names of the databases in the 'databases' folder to the databases list.
-        databases = [
-            f for f in os.listdir(app.config["db_upload_folder"]) if f.endswith(".db")
-        ]
-
-        # Sort the list into alphabetical order.
-        databases.sort()
+        # Add the names of the databases in the 'databases' folder to the databases list, in alphabetical order.
+        databases = _list_databases()
 
     # Raise an Exception if a file that ends in .DB (a database file) cannot be found in the 'databases' folder.
     except FileNotFoundError as e:
@@ -463,25 +862,8 @@ def query_page(db_name):
     # Check that the patient IDs, HGVS genomic descriptions and gene symbols can be parsed from the tables in the
     # database into the dropdown menus on the query page.
     try:
-        # Load the selected database using the absolute filepath to the database file.
-        with sqlite3.connect(db_path) as conn:
-            cur = conn.cursor()
-            # Retrieve all the patient IDs in the patient_variant table, only once.
-            cur.execute(
-                "SELECT DISTINCT patient_ID FROM patient_variant ORDER BY patient_ID ASC;"
-            )
-            # Store the patient IDs into a list assigned to the 'patient_list' variable.
-            patient_list = [row[0] for row in cur.fetchall()]
-            # Retrieve all the HGVS genomic descriptions in the variant_annotations table, only once.
-            cur.execute(
-                "SELECT DISTINCT variant_NC FROM variant_annotations ORDER BY variant_NC ASC;"
-            )
-            # Store the HGVS genomic descriptions into a list assigned to the 'variant_list' variable.
-            variant_list = [row[0] for row in cur.fetchall()]
-            # Retrieve all the different gene symbols in the variant_annotations table, only once.
-            cur.execute("SELECT DISTINCT gene FROM variant_annotations ORDER BY gene ASC;")
-            # Store the gene symbols into a list assigned to the 'gene_list' variable.
-            gene_list = [row[0] for row in cur.fetchall()]
+        # Retrieve the patient IDs, HGVS genomic descriptions and gene symbols in the database.
+        patient_list, variant_list, gene_list = _get_dropdowns(db_path)
 
     # Error handler executed when exceptions related to sqlite3 are raised.
     except (sqlite3.OperationalError, sqlite3.DatabaseError, sqlite3.ProgrammingError) as e:
@@ -514,31 +896,8 @@ def query_page(db_name):
             if patient_ID:
                 # Log that they are trying to retrieve the variants for a patient.
                 logger.info(f'User querying variants from {patient_ID}...')
-                # Assign the queried patient ID and corresponding HGVS genomic descriptions, HGVS transcript
-                # descriptions, HGVS protein descriptions of the variants that derive from that patient, the gene
-                # symbol, HGNC ID, Classification, Associated conditions, ClinVar star-rating, and ClinVar review
-                # status of those variants, to the 'query' string. The patient ID and HGVS genomic descriptions are
-                # taken from the patient_variant table. The HGVS genomic descriptions of the variants are mapped to the
-                # descriptions in the variant_annotations table, to find the additional information to append to the
-                # patient ID and HGVS genomic descriptions in the table that will be returned to the User
-                # through the UI.
-                query = """
-                SELECT
-                    pv.patient_ID,
-                    v.variant_NC,
-                    v.variant_NM,
-                    v.variant_NP,
-                    v.gene,
-                    v.HGNC_ID,
-                    v.Classification,
-                    v.Conditions,
-                    v.Stars,
-                    v.Review_status
-                FROM patient_variant pv
-                JOIN variant_annotations v
-                  ON pv.variant = v.variant_NC
-                WHERE pv.patient_ID = ?
-                """
+                # Assign the patient query, defined above the route, to the 'query' string.
+                query = _PATIENT_QUERY
                 # Use the query_db() function from database_functions.py to convert each entry returned by the sqlite3
                 # query into dictionary format and assign the output to the 'data' variable.
                 data = query_db(db_path, query, (patient_ID,))
@@ -561,37 +920,9 @@ def query_page(db_name):
                 # gene descriptions into the HGVS genomic descriptions of the RefSeq MANE select transcript. This is
                 # used to look up the variant in the User-selected database.
                 variant_search_term = get_mane_nc(variant_nc)
-                # Assign the HGVS genomic description, HGVS transcript description, HGVS protein description, gene
-                # symbol, HGNC ID, Classification, Associated conditions, ClinVar star-rating, and ClinVar review
-                # status, to the 'query' string. The number of patients with the HGVS genomic description from the
-                # get_mane_nc() function output, in the patient_variant table, is counted and returned.
-                query = """
-                SELECT
-                    v.variant_NC,
-                    v.variant_NM,
-                    v.variant_NP,
-                    v.gene,
-                    v.HGNC_ID,
-                    v.Classification,
-                    v.Conditions,
-                    v.Stars,
-                    v.Review_status,
-                    COUNT(pv.patient_ID) AS Patient_Count
-                FROM variant_annotations v
-                LEFT JOIN patient_variant pv
-                  ON v.variant_NC = pv.variant
-                WHERE v.variant_NC = ?
-                GROUP BY
-                    v.variant_NC,
-                    v.variant_NM,
-                    v.variant_NP,
-                    v.gene,
-                    v.HGNC_ID,
-                    v.Classification,
-                    v.Conditions,
-                    v.Stars,
-                    v.Review_status
-                """
+                # Assign the variant query, defined above the route, to the 'query' string. The number of patients
+                # with the HGVS genomic description from the get_mane_nc() function output is counted and returned.
+                query = _VARIANT_QUERY
                 # Use the query_db() function from database_functions.py to convert each entry returned by the
                 # sqlite3 query into dictionary format and assign the output to the 'data' variable.
                 data = query_db(db_path, query, (variant_search_term,))
@@ -610,59 +941,18 @@ def query_page(db_name):
                 # Log that they are trying to retrieve information about variants that derive from the gene that they
                 # are querying.
                 logger.info(f'User querying information about variants from {gene}...')
-                # Look for the gene symbol in the variant_annotations table of the selected database and retrieve the
-                # associated HGNC ID.
-                lookup_query = (
-                    "SELECT DISTINCT HGNC_ID FROM variant_annotations WHERE gene = ?"
-                )
-                # Assign the row with the corresponding HGNC ID to the variable, 'hgnc_row'
-                hgnc_row = query_db(db_path, lookup_query, (gene,), one=True)
-
-                # If the gene symbol was found and a corresponding HGNC ID was retrieved...
-                if hgnc_row:
-                    # Parse the HGNC ID out of the row.
-                    hgnc_id = hgnc_row["HGNC_ID"]
-                    # Assign the HGVS genomic descriptions, HGVS transcript descriptions and the HGVS protein
-                    # descriptions of the variants that derived from the queried gene, the gene symbol, HGNC ID,
-                    # Classification, Associated conditions, ClinVar star-rating, and ClinVar review status, to the
-                    # 'query' string. The number of patients with the HGVS genomic descriptions of the variants
-                    # returned by the query, in the patient_variant table, are also counted and returned.
-                    query = """
-                    SELECT
-                        v.variant_NC,
-                        v.variant_NM,
-                        v.variant_NP,
-                        v.gene,
-                        v.HGNC_ID,
-                        v.Classification,
-                        v.Conditions,
-                        v.Stars,
-                        v.Review_status,
-                        COUNT(pv.patient_ID) AS Patient_Count
-                    FROM variant_annotations v
-                    LEFT JOIN patient_variant pv
-                      ON v.variant_NC = pv.variant
-                    WHERE v.HGNC_ID = ?
-                    GROUP BY
-                        v.variant_NC,
-                        v.variant_NM,
-                        v.variant_NP,
-                        v.gene,
-                        v.HGNC_ID,
-                        v.Classification,
-                        v.Conditions,
-                        v.Stars,
-                        v.Review_status
-                    ORDER BY Patient_Count DESC
-                    """
-                    # Use the query_db() function from database_functions.py to convert each entry returned by the
-                    # sqlite3 query into dictionary format and assign the output to the 'data' variable.
-                    data = query_db(db_path, query, (hgnc_id,))
-                    # Label this query by its type so that it is easily identifiable and callable later on.
-                    result_type = "gene"
-                # If the gene symbol could not be found in the database, a warning message is logged and an error
-                # message is returned, indicating that the gene symbol could not be found.
-                else:
+                # Assign the gene query, defined above the route, to the 'query' string. The query looks up the HGNC ID
+                # associated with the gene symbol and returns the variants with that HGNC ID.
+                query = _GENE_QUERY
+                # Use the query_db() function from database_functions.py to convert each entry returned by the
+                # sqlite3 query into dictionary format and assign the output to the 'data' variable.
+                data = query_db(db_path, query, (gene,))
+                # Label this query by its type so that it is easily identifiable and callable later on.
+                result_type = "gene"
+                # If the gene symbol could not be found in the database, the 'data' variable will remain empty. In such
+                # a case, log a warning and notify the User that the gene symbol could not be found in the selected
+                # database, on the query page.
+                if not data:
                     logger.warning(f"User's gene query could not be found in {db_name} database: {gene}")
                     flash(f"⚠ Gene Query: {gene} could not be found in {db_name} database.")
                     return redirect(url_for("query_page", db_name=db_name))
@@ -689,9 +979,13 @@ def query_page(db_name):
         export_rows_json = "[]"
         if data:
             cols = list(data[0].keys())
-            rows_for_export = [[row[c] for c in cols] for row in data]
-            export_columns_json = json.dumps(cols)
-            export_rows_json = json.dumps(rows_for_export)
+            # query_db() returns sqlite3.Row objects, so the values of each row are already in the same order as the
+            # column headers and do not need to be looked up by column name. json cannot serialise sqlite3.Row objects
+            # itself, so each row is converted into a tuple by 'default' as it is written, rather than copying every
+            # row into a new list before the JSON is written.
+            # Compact separators keep the JSON embedded in the page as small as possible.
+            export_columns_json = json.dumps(cols, separators=(',', ':'))
+            export_rows_json = json.dumps(data, default=tuple, separators=(',', ':'))
 
     # Raise an exception if the 'data' variable remained as None.
     except TypeError as e:
@@ -740,8 +1034,9 @@ def query_page(db_name):
               f'Please contact your nearest friendly neighbourhood Bioinformatician')
         return render_template("db_query_page.html", db_name=db_name)
 
-    # Render the information extracted from 'data' into a table that is viewable on the query page.
-    return render_template(
+    # Render the information extracted from 'data' into a table that is viewable on the query page. The page is
+    # compressed with gzip, if the User's browser accepts it, since the results are also embedded in it for export.
+    return _gzip_response(make_response(render_template(
         "db_query_page.html",
         db_name=db_name,
         databases=databases,
@@ -752,7 +1047,83 @@ def query_page(db_name):
         gene_list=gene_list,
         export_columns_json=export_columns_json,
         export_rows_json=export_rows_json,
-    )
+    )))
+
+
+# The column headers of the table on the display page. These are the only columns that the User can filter or sort by.
+DISPLAY_COLUMNS = [
+    "patient_ID",
+    "variant_NC",
+    "variant_NM",
+    "variant_NP",
+    "gene",
+    "HGNC_ID",
+    "Classification",
+    "Conditions",
+    "Stars",
+    "Review_status",
+]
+
+# The WHERE clause that filters the table on the display page by each column, and the ORDER BY clause that sorts it.
+_DISPLAY_WHERE = {column: f" WHERE {column} = ?" for column in DISPLAY_COLUMNS}
+_DISPLAY_ORDER_BY = {column: f" ORDER BY {column}" for column in DISPLAY_COLUMNS}
+
+
+def _display_query(filter_column, filter_value, sort_column):
+    """
+    This function builds the sqlite3 query for the table on the display page, which joins the patient_variant and
+    variant_annotations tables, with the column to filter by, the value to filter by and the column to sort by that the
+    User selected. It is shared by the display page and its CSV export, so that the exported table matches the table
+    displayed.
+
+    Column names cannot be bound to '?' placeholders, so the filter and sort by columns are written into the query.
+    Columns that are not in DISPLAY_COLUMNS are ignored, so that only the column headers of the table can be written
+    into the query and the same few queries are prepared by sqlite3 each time.
+
+    :params: filter_column: The column to filter by, or an empty string.
+                      E.g.: 'Classification'
+              filter_value: The value to filter by, or an empty string.
+                      E.g.: 'Pathogenic'
+               sort_column: The column to sort by, or an empty string.
+                      E.g.: 'patient_ID'
+
+    :output: query: The sqlite3 query.
+            params: A tuple of the values that replace the placeholders in the query.
+              E.g.: ('Pathogenic',)
+
+    :command: query, params = _display_query('Classification', 'Pathogenic', 'patient_ID')
+    """
+
+    # Ignore a column to filter by that is not one of the column headers of the table.
+    if filter_column and filter_column not in DISPLAY_COLUMNS:
+        logger.warning(f"'{filter_column}' is not a column on the display page. The filter was not applied.")
+        filter_column = ""
+    # Ignore a column to sort by that is not one of the column headers of the table.
+    if sort_column and sort_column not in DISPLAY_COLUMNS:
+        logger.warning(f"'{sort_column}' is not a column on the display page. The table was not sorted.")
+        sort_column = ""
+
+    # Start from the query for the whole table. The WHERE and ORDER BY clauses for each column are prepared in advance,
+    # so the query is always one of a small number of identical strings that sqlite3 has already prepared.
+    query = _DISPLAY_QUERY
+    # Create an empty tuple to store the value that the User wants to filter by.
+    params = ()
+
+    # If a column and value was chosen by the User, apply the filter to the sqlite3 query.
+    if filter_column and filter_value:
+        query += _DISPLAY_WHERE[filter_column]
+        # Add the value to the 'params' tuple.
+        params = (filter_value,)
+        # Log which column and value the user wants to filter by.
+        logger.info(f"User wants to filter by '{filter_column}': '{filter_value}'.")
+
+    # If the User selected a column to sort by apply it to the sqlite3 query.
+    if sort_column:
+        query += _DISPLAY_ORDER_BY[sort_column]
+        # Log which column the User wants to sort by.
+        logger.info(f"User wants to sort by '{sort_column}'.")
+
+    return query, params
 
 
 # ---------------------------------------------------------------
@@ -813,19 +1184,29 @@ def display_database(db_name):
         # Redirect the User back to the homepage.
         return redirect(url_for("choose_create_or_add"))
 
+    # The unfiltered display page (GET) only changes when the database file changes, so the modification time and size
+    # of the file are combined into an ETag. If the User's browser already has this page, it is told to reuse it instead
+    # of the database being queried and the table being rendered again. Pages with flash messages waiting to be shown
+    # are not cached, because the messages are part of the page. The compressed and uncompressed pages are different
+    # files, so they have different ETags.
+    compress = _accepts_gzip()
+    etag = None
+    if request.method == "GET" and not session.get("_flashes"):
+        try:
+            db_stat = os.stat(db_path)
+            etag = hashlib.blake2b(f'display:{db_stat.st_mtime_ns}:{db_stat.st_size}:{compress}'.encode("utf-8"),
+                                   digest_size=16).hexdigest()
+        # If the database file cannot be looked up, the page is not cached.
+        except OSError:
+            etag = None
+        if etag and request.if_none_match.contains(etag):
+            logger.info(f'Display page of {db_name} has not changed since it was last viewed.')
+            not_modified = Response(status=304)
+            not_modified.set_etag(etag)
+            return not_modified
+
     # A list of the column headers that are shown to the User.
-    all_columns = [
-        "patient_ID",
-        "variant_NC",
-        "variant_NM",
-        "variant_NP",
-        "gene",
-        "HGNC_ID",
-        "Classification",
-        "Conditions",
-        "Stars",
-        "Review_status",
-    ]
+    all_columns = DISPLAY_COLUMNS
 
     # Check that the filter queries work.
     try:
@@ -834,83 +1215,18 @@ def display_database(db_name):
         filter_value = request.form.get("filter_value") or ""
         sort_column = request.form.get("sort_column") or ""
 
-        # Assign the HGVS genomic descriptions, HGVS transcript descriptions and the HGVS protein descriptions of the
-        # variants in the database, the gene symbol, HGNC ID, Classification, Associated conditions, ClinVar star-rating,
-        # and ClinVar review status, to the 'base_query' string.
-        base_query = """
-        SELECT
-            pv.patient_ID,
-            v.variant_NC,
-            v.variant_NM,
-            v.variant_NP,
-            v.gene,
-            v.HGNC_ID,
-            v.Classification,
-            v.Conditions,
-            v.Stars,
-            v.Review_status
-        FROM patient_variant pv
-        JOIN variant_annotations v
-          ON pv.variant = v.variant_NC
-        """
-
-        # Create an empty list to store the column header that the User wants to filter by.
-        where_clauses = []
-        # Create an empty list to store the value that the User wants to filter by.
-        params = []
-
-        # If a column and value was chosen by the User...
-        if filter_column and filter_value:
-            # Add the column to the 'where_clauses' list with additional sqlite3 syntax so that it is easily integrated
-            # within the sqlite query code.
-            where_clauses.append(f"{filter_column} = ?")
-            # Add the value to the 'params' list.
-            params.append(filter_value)
-            # Log which column and value the user wants to filter by.
-            logger.info(f"User wants to filter by '{filter_column}': '{filter_value}'.")
-
-
-        # Assign the original query to a new query where the filters and sort by values can be applied.
-        query = base_query
-        # Apply the filter column to the sqlite3 query with additional syntax to make it logical in the code.
-        if where_clauses:
-            query += " WHERE " + " AND ".join(where_clauses)
-
-        # If the User selected a column to sort by apply it to the sqlite3 query with additional syntax to make it logical
-        # in the code.
-        if sort_column:
-            query += f" ORDER BY {sort_column}"
-            # Log which column the User wants to sort by.
-            logger.info(f"User wants to sort by '{sort_column}'.")
+        # Build the sqlite3 query with the filter and sort by options selected by the User.
+        query, params = _display_query(filter_column, filter_value, sort_column)
 
         # Convert each entry returned from the sqlite3 query into a dictionary using the query_db() function from the
         # database_functions.py script and assign it to the 'data' variable.
-        data = query_db(db_path, query, tuple(params))
+        # The rows are returned as tuples, in the same order as the column headers, since every row in the database can
+        # be displayed at once and tuples use less memory than sqlite3.Row objects.
+        data = query_db(db_path, query, params, as_tuples=True)
 
         # Build a dictionary of filter values that the User can view in the dropdown menu, after selecting a column to
         # filter by.
-        filter_values = {}
-        # Connect to the User-selected database using the absolute path to it.
-        with sqlite3.connect(db_path) as conn:
-            cur = conn.cursor()
-            # Iterate through each column header in the 'all_columns' list.
-            for col in all_columns:
-                # Retrieve each distinct value under each column header.
-                cur.execute(
-                    f"""
-                    SELECT DISTINCT {col}
-                    FROM patient_variant pv
-                    JOIN variant_annotations v
-                      ON pv.variant = v.variant_NC
-                    WHERE {col} IS NOT NULL
-                    ORDER BY {col}
-                    """
-                )
-                # Assign the filter value to the 'val' variable.
-                vals = [r[0] for r in cur.fetchall()]
-                # Add the filter value to a keyword in the 'filter_values' dictionary, named after the corresponding column
-                # header.
-                filter_values[col] = vals
+        filter_values, filter_values_json = _get_filter_values(db_path, all_columns)
 
     # Error handler executed when exceptions related to sqlite3 are raised.
     except (sqlite3.OperationalError, sqlite3.DatabaseError, sqlite3.ProgrammingError) as e:
@@ -928,67 +1244,14 @@ def display_database(db_name):
         flash(f'❌ {db_name} Filter Error: Failed to prepare {db_name} to be filtered: {str(e)}')
         return render_template("db_display_page.html", db_name=db_name)
 
-    # 'filter_values' dictionary converted into a JSON.
-    filter_values_json = json.dumps(filter_values)
-
-    # Prepare JSON to export query results into a table that can be viewed by the User through the user interface.
-    try:
-        export_columns_json = "[]"
-        export_rows_json = "[]"
-        if data:
-            cols = all_columns[:]  # fixed order
-            rows_for_export = [[row[c] for c in cols] for row in data]
-            export_columns_json = json.dumps(cols)
-            export_rows_json = json.dumps(rows_for_export)
-
-    # Raise an exception if the 'data' variable is None.
-    except TypeError as e:
-        # Log the TypeError.
-        logger.error(f"Filter TypeError: No data was returned to the 'data' variable: {e}")
-        # Return a flash message to help the User understand why they have not received the expected response, on the
-        # display page.
-        flash(f'❌ Filter Error: An error occurred while processing the query. It is not your fault. '
-              f'Please contact your nearest friendly neighbourhood Bioinformatician')
-        return render_template("db_display_page.html", db_name=db_name)
-
-    # Raise an exception if the keys in the 'data' are not iterable (specific to 'cols' variable).
-    except IndexError as e:
-        # Log the IndexError.
-        logger.error(f"Filter IndexError: 'data' variable is not iterable: {e}")
-        # Return a flash message to help the User understand why they have not received the expected response, on the
-        # display page.
-        flash(f'❌ Filter Error: An error occurred while processing the query. It is not your fault. '
-              f'Please contact your nearest friendly neighbourhood Bioinformatician')
-        return render_template("db_display_page.html", db_name=db_name)
-
-    # Raise an exception if any of the keys in 'data' are missing.
-    except KeyError as e:
-        # KeyError message contains the missing key (from ChatGPT).
-        missing_key = e.args[0]
-        # Log the KeyError.
-        logger.error(f"Filter KeyError: The {missing_key} key is missing from 'data'. "
-                     f"Variant info could not be parsed from {db_name}. {e}")
-        # Return a flash message to help the User understand why they have not received the expected response, on the
-        # display page.
-        flash(f'❌ Filter Error: An error occurred while processing the query. It is not your fault. '
-              f'Please contact your nearest friendly neighbourhood Bioinformatician')
-        return render_template("db_display_page.html", db_name=db_name)
-
-    # Raise an exception if an error occurs while extracting information from 'data'.
-    except Exception as e:
-        # Log the error using the exception output message.
-        logger.error(f'Filter Error: An error occurred while extracting the information from the {db_name} database: '
-                     f'{e}')
-        # Log the value assigned to the 'data' variable, to help with debugging.
-        logger.debug(f'Filter Error: data:\n{json.dumps(data, indent=4)}')
-        # Return a flash message to help the User understand why they have not received the expected response, on the
-        # display page.
-        flash(f'❌ Filter Error: An error occurred while processing the query. It is not your fault.'
-              f'Please contact your nearest friendly neighbourhood Bioinformatician')
-        return render_template("db_display_page.html", db_name=db_name)
-
-    # Render the information extracted from 'data' into a table that is viewable on the query page.
-    return render_template(
+    # Render the information extracted from 'data' into a table that is viewable on the display page. The page is
+    # streamed to the User's browser as it is rendered, so that the HTML of every row in the table is not held in memory
+    # at once and the browser can start showing the page before the last row has been rendered. stream_template keeps
+    # the request context available to the template while it is streamed.
+    # The session is saved before the page is streamed, so the flash messages are removed from the session here. The
+    # template receives the same messages from get_flashed_messages(), and they are not shown again on the next page.
+    get_flashed_messages()
+    chunks = stream_template(
         "db_display_page.html",
         db_name=db_name,
         data=data,
@@ -998,9 +1261,269 @@ def display_database(db_name):
         selected_filter_value=filter_value,
         selected_sort_column=sort_column,
         filter_values_json=filter_values_json,
-        export_columns_json=export_columns_json,
-        export_rows_json=export_rows_json,
     )
+    # Compress the page as it is streamed, if the User's browser accepts gzip. The table repeats the same values in
+    # many rows, so it is much smaller once compressed.
+    if compress:
+        chunks = _gzip_chunks(chunks)
+    response = Response(chunks, mimetype="text/html")
+    if compress:
+        response.content_encoding = "gzip"
+    response.vary.add("Accept-Encoding")
+    # The User's browser must check the ETag with the flask app before reusing the page, so that changes to the
+    # database are always shown.
+    if etag:
+        response.set_etag(etag)
+        response.cache_control.no_cache = True
+    return response
+
+
+# ---------------------------------------------------------------
+# CSV streaming
+# ---------------------------------------------------------------
+# The largest table, in bytes, that the query page can send back to be exported as a CSV (64 MiB).
+MAX_EXPORT_BYTES = 64 * 1024 * 1024
+
+# The number of rows written to the CSV with each call to csv.writer.writerows(), and sent to the User at a time.
+CSV_EXPORT_BATCH_SIZE = 1000
+
+# The smallest page, in bytes, that is compressed with gzip before it is sent to the User (1 KiB). Smaller pages are
+# sent as they are, because compressing them saves too little to be worth the time.
+GZIP_MIN_SIZE = 1024
+
+
+def _drain(output):
+    """
+    This function returns the CSV written to an 'io' buffer and empties the buffer, so that it only ever holds one
+    batch of rows.
+
+    :params: output: The io.StringIO buffer that csv.writer writes to.
+
+    :output: The CSV written to the buffer since it was last emptied.
+
+       E.g.: 'Patient1,ATP1A3\r\nPatient2,SCN1A\r\n'
+
+    :command: yield _drain(output)
+    """
+    value = output.getvalue()
+    output.seek(0)
+    output.truncate(0)
+    return value
+
+
+def _accepts_gzip():
+    """
+    This function checks if the User's browser accepts responses compressed with gzip, from the Accept-Encoding header
+    of the request.
+
+    :output: True if the CSV can be sent compressed with gzip, otherwise False.
+
+    :command: compress = _accepts_gzip()
+    """
+    return request.accept_encodings["gzip"] > 0
+
+
+def _gzip_chunks(chunks):
+    """
+    This function compresses a stream of CSV, or of a page on the flask app, with gzip, one chunk at a time, so that
+    the compressed text can be streamed to the User as well. The tables repeat the same values (e.g. classifications
+    and review statuses) in many rows, so they are much smaller once compressed. The fastest compression level is used,
+    because the text is compressed while it is being downloaded.
+
+    :params: chunks: An iterable of the strings of CSV or HTML to compress.
+
+    :output: The compressed text, in gzip format, as a generator of bytes.
+
+    :command: _gzip_chunks(generate())
+    """
+    # wbits=31 writes the gzip header and trailer around the compressed data.
+    compressor = zlib.compressobj(1, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode("utf-8"))
+        # The compressor holds on to small chunks until it has enough data to compress.
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def _gzip_response(response):
+    """
+    This function compresses a page that has been rendered in full with gzip, if the User's browser accepts gzip and
+    the page is at least GZIP_MIN_SIZE bytes. The query page embeds the results of the query in the page as JSON, for
+    them to be exported, so it can be large and is mostly repeated text.
+
+    :params: response: The response with the rendered page.
+
+    :output: The same response, with its body compressed with gzip if it was compressed.
+
+    :command: return _gzip_response(make_response(render_template("db_query_page.html", ...)))
+    """
+    # 'Vary' tells caches that the response depends on whether the browser accepts gzip.
+    response.vary.add("Accept-Encoding")
+
+    # Streamed pages, and pages that are already compressed or too small to benefit, are sent as they are.
+    if response.is_streamed or response.content_encoding or not _accepts_gzip():
+        return response
+    data = response.get_data()
+    if len(data) < GZIP_MIN_SIZE:
+        return response
+
+    # wbits=31 writes the gzip header and trailer around the compressed data. The page is compressed at the default
+    # level, because it is compressed once, before it is sent.
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    response.set_data(compressor.compress(data) + compressor.flush())
+    response.content_encoding = "gzip"
+    return response
+
+
+def _csv_response(chunks, filename, compress=False):
+    """
+    This function streams CSV to the User as a file download, compressed with gzip if 'compress' is True.
+
+    :params: chunks: A generator of the strings of CSV to send.
+
+             filename: The name of the file that the CSV is downloaded as.
+
+             compress: Whether to compress the CSV with gzip, as returned by _accepts_gzip().
+
+    :output: A streamed 'text/csv' response.
+
+    :command: return _csv_response(generate(), f"{db_name}.csv", compress=_accepts_gzip())
+    """
+    # Compress the CSV as it is streamed, if the User's browser accepts gzip.
+    if compress:
+        chunks = _gzip_chunks(chunks)
+
+    response = Response(
+        stream_with_context(chunks),
+        mimetype="text/csv",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+    # The browser decompresses the CSV before it is saved. 'Vary' tells caches that the response depends on whether
+    # the browser accepts gzip.
+    if compress:
+        response.content_encoding = "gzip"
+    response.vary.add("Accept-Encoding")
+    return response
+
+
+# ---------------------------------------------------------------
+# Route: Export the display page table as a CSV
+# ---------------------------------------------------------------
+@app.route("/export/<db_name>.csv")
+def export_display_csv(db_name):
+    """
+    This function exports the table on the display page, with the filter and sort by options selected by the User, in
+    CSV format. Rather than sending every row to the page to be sent back for export, the rows are read from the
+    database and written to the CSV one at a time, as the file is downloaded.
+
+    :param db_name: The name of the database being queried.
+              E.g.: sea.db
+
+    :query string: filter_column, filter_value and sort_column, as selected on the display page.
+             E.g.: /export/sea.db.csv?filter_column=Classification&filter_value=Pathogenic&sort_column=patient_ID
+
+    :output: A streamed 'text/csv' response, downloaded as <db_name>.csv, with the same headers and rows as the
+             table on the display page.
+    """
+    # Log that the User wants to download the table on the display page.
+    logger.info(f'User has elected to download the table from the display page of {db_name} in CSV format.')
+
+    # Check that the filepath to the database file exists. The modification time and size of the file are used for the
+    # ETag below, so the file is only looked up once.
+    db_path = os.path.join(app.config["db_upload_folder"], db_name)
+    try:
+        db_stat = os.stat(db_path)
+    except FileNotFoundError:
+        # ...Log a warning that the database does not exist.
+        logger.warning(f"{db_name} database could not be found in: {db_path}")
+        # Notify the User that the database was not found in the database folder.
+        flash(f"⚠ {db_name} database not found. Please select a database to query on the homepage.")
+        # Redirect the User back to the homepage.
+        return redirect(url_for("choose_create_or_add"))
+
+    # Build the same sqlite3 query as the display page.
+    query, params = _display_query(
+        request.args.get("filter_column") or "",
+        request.args.get("filter_value") or "",
+        request.args.get("sort_column") or "",
+    )
+
+    # The CSV only changes when the database file or the query changes, so both are combined into an ETag. If the
+    # User's browser already has this export, it is told to reuse it instead of the database being queried again.
+    # The compressed and uncompressed CSV are different files, so they have different ETags.
+    compress = _accepts_gzip()
+    etag = hashlib.blake2b(f'{db_stat.st_mtime_ns}:{db_stat.st_size}:{query}:{params}:{compress}'.encode("utf-8"),
+                           digest_size=16).hexdigest()
+    if request.if_none_match.contains(etag):
+        logger.info(f'CSV export from {db_name} has not changed since it was last downloaded.')
+        not_modified = Response(status=304)
+        not_modified.set_etag(etag)
+        return not_modified
+
+    # Check that the query can be applied to the database before the download starts, so that errors can be shown to
+    # the User on the display page. A connection is opened for this export alone, because it stays open while the file
+    # is downloaded. The READ_PRAGMAS used by the query page connections are applied to it, so that the export reads the
+    # table through memory-mapped I/O and sorts it in memory. The database is opened read-only, so that an empty
+    # database is not created if it has been deleted since it was looked up.
+    try:
+        conn = sqlite3.connect(read_only_uri(db_path), uri=True)
+        try:
+            for pragma in READ_PRAGMAS:
+                conn.execute(pragma)
+            cur = conn.execute(query, params)
+        except Exception:
+            conn.close()
+            raise
+
+    # Error handler executed when exceptions related to sqlite3 are raised.
+    except (sqlite3.OperationalError, sqlite3.DatabaseError, sqlite3.ProgrammingError) as e:
+        error_message = sqlite_error(e, db_name)
+        flash(f'❌ CSV Export Error: {error_message}')
+        return redirect(url_for("display_database", db_name=db_name))
+
+    # Raise an exception if the query could not be applied.
+    except Exception as e:
+        logger.error(f'CSV Export Error: Failed to query {db_name} for CSV export: {e}')
+        flash(f'❌ CSV Export Error: Failed to prepare CSV. CSV cannot be exported.')
+        return redirect(url_for("display_database", db_name=db_name))
+
+    def generate():
+        """
+        This function yields the CSV one line at a time: the Byte Order Mark and headers first, then each row returned
+        by the query. The connection to the database is closed once every row has been written, or the download stops.
+        """
+        # The 'io' buffer holds one batch of rows at a time, so that the values are quoted by the csv module.
+        output = io.StringIO()
+        writer = csv.writer(output)
+        rows_written = 0
+
+        try:
+            # The Byte Order Mark ensures that characters such as ★ are read correctly when the CSV is opened.
+            writer.writerow([column[0] for column in cur.description])
+            yield "\ufeff" + _drain(output)
+
+            # Write the rows returned by the query in batches, after converting each value into a string. writerows()
+            # loops over the batch in C, rather than calling writerow() for every row.
+            while rows := cur.fetchmany(CSV_EXPORT_BATCH_SIZE):
+                writer.writerows([stringify(v) for v in row] for row in rows)
+                rows_written += len(rows)
+                yield _drain(output)
+
+            # Log that the CSV was exported successfully.
+            logger.info(f'CSV export from {db_name} complete: {rows_written} rows.')
+
+        finally:
+            # Close the connection to the database.
+            conn.close()
+
+    # Stream the CSV to the User as a file named after the database, with the ETag and the time the database was last
+    # modified so that the browser can ask whether it has changed next time.
+    response = _csv_response(generate(), f"{db_name}.csv", compress=compress)
+    response.set_etag(etag)
+    response.last_modified = db_stat.st_mtime
+    return response
 
 
 # ---------------------------------------------------------------
@@ -1046,27 +1569,8 @@ def dropdown_data(db_name):
 
     # Check that the information from the sqlite3 database can be accessed.
     try:
-        # Connect to the database specified by the User using the absolute filepath.
-        with sqlite3.connect(db_path) as conn:
-            cur = conn.cursor()
-            # Extract the patient IDs (only once) from the patient_variant table and arrange them in ascending order.
-            cur.execute(
-                "SELECT DISTINCT patient_ID FROM patient_variant ORDER BY patient_ID ASC;"
-            )
-            # Store the patient IDs in a list and assign the list to the 'patient_list' variable.
-            patient_list = [row[0] for row in cur.fetchall()]
-            # Extract the HGVS genomic descriptions (only once) from the variant_annotations table and arrange them in
-            # ascending order.
-            cur.execute(
-                "SELECT DISTINCT variant_NC FROM variant_annotations ORDER BY variant_NC ASC;"
-            )
-            # Store the HGVS genomic descriptions in a list and assign the list to the 'variant_list' variable.
-            variant_list = [row[0] for row in cur.fetchall()]
-            # Extract the gene symbols (only once) from the variant_annotations table and arrange them in ascending
-            # order.
-            cur.execute("SELECT DISTINCT gene FROM variant_annotations ORDER BY gene ASC;")
-            # Store the gene symbols in a list and assign the list to the 'gene_list' variable.
-            gene_list = [row[0] for row in cur.fetchall()]
+        # Retrieve the patient IDs, HGVS genomic descriptions and gene symbols in the database.
+        patient_list, variant_list, gene_list = _get_dropdowns(db_path)
 
     # Error handler executed when exceptions related to sqlite3 are raised.
     except (sqlite3.OperationalError, sqlite3.DatabaseError, sqlite3.ProgrammingError) as e:
@@ -1138,7 +1642,7 @@ def export_csv():
     """
     This function prepares the table generated by the User on the flask app for download into a .CSV file.
 
-    :output: send_file(mem, mimetype="text/csv", as_attachment=True, download_name="export.csv",)
+    :output: A streamed 'text/csv' response, downloaded as <db_name>.csv.
 
               E.g.:  patient_ID | variant_NC	| variant_NM   | variant_NP	   | gene   | HGNC_ID | Classification | Conditions	                 | Stars | Review_status
                     ------------|---------------|--------------|---------------|--------|---------|----------------|-----------------------------|-------|-------------------
@@ -1151,10 +1655,26 @@ def export_csv():
     """
 
     # Check if the process for exporting CSVs works properly.
-    try:
-        # Log that the User wants to download a table.
-        logger.info('User has elected to download the table on the UI in CSV format.')
+    # Log that the User wants to download a table.
+    logger.info('User has elected to download the table on the UI in CSV format.')
+
+    # The table is sent back in the form, so a table larger than MAX_EXPORT_BYTES is rejected from its Content-Length,
+    # before the form is read and the JSON is parsed.
+    if request.content_length is not None and request.content_length > MAX_EXPORT_BYTES:
+        logger.warning(f'CSV Export Error: The table is {request.content_length} bytes, which is larger than the limit '
+                       f'of {MAX_EXPORT_BYTES} bytes.')
+        flash(f'❌ CSV Export Error: The table is too large to export. Please narrow down the query.')
+        return redirect(url_for("choose_create_or_add"))
+
+    # Flask limits each form field to 500 kB by default, which is smaller than the table of a large gene query. Allow
+    # the table to be read up to MAX_EXPORT_BYTES for this request only.
+    request.max_content_length = MAX_EXPORT_BYTES
+    request.max_form_memory_size = MAX_EXPORT_BYTES
 
+    # Set before the form is read, so that the error handlers below can always refer to it.
+    db_name = None
+
+    try:
         # Retrieve the name of the database that the information in the table derives from so that the User can be
         # redirected back to the query page and query the same database again.
         db_name = request.form.get("db_name")
@@ -1176,25 +1696,11 @@ def export_csv():
             return render_template("db_query_page.html", db_name=db_name)
 
         try:
-            # The 'io' buffer saves text to the Random-Access Memory (RAM) using 'StringIo()'.
+            # The 'io' buffer holds one batch of rows at a time, so that the CSV can be streamed to the User without
+            # building the whole file in memory first.
             output = io.StringIO()
             # Data is written to the text buffer in CSV format.
             writer = csv.writer(output)
-            # Writes the headers from the table into the text buffer.
-            writer.writerow(columns)
-
-            # Iterate through each row.
-            for row in rows:
-
-                # If the number of values in a row is not equal to the number of headers in 'columns', log a warning
-                if len(row) != len(columns):
-                    logger.warning(f'The number of values in this row is not as expected: {row}')
-                    logger.debug(f'No. of headers: {len(columns)}; No. of values: {len(row)}')
-                    continue
-
-                # Write each value in the row into the text buffer after converting it into a string using the
-                # stringify() function.
-                writer.writerow([stringify(v) for v in row])
 
         # Raise and exception if there is an error generating the CSV.
         except csv.Error as e:
@@ -1204,30 +1710,51 @@ def export_csv():
             flash(f'❌ CSV Export Error: Failed to write values into CSV. CSV cannot be exported.')
             return render_template("db_query_page.html", db_name=db_name)
 
-        # 'BytesIO()' converts the 'io' buffer from text data into bytes. This will allow the send_file() function to
-        # download the data into a .CSV file on the client's computer.
-        mem = io.BytesIO()
-
-        # Adds the Unicode characters 'U+FEFF' to the beginning of the 'io' buffer, indicating what needs to be encoded
-        # into UTF-8 for download. This ensures that characters such as * are interpreted as * in the csv rather than
-        # being converted into letters. Also known as 'Byte Order Mark'.
-        mem.write("\ufeff".encode("utf-8"))
-        # The text data written to the 'io' is converted into binary UTF-8 code.
-        mem.write(output.getvalue().encode("utf-8"))
-        # Cursor is set back to the beginning so that the flask app can read the binary buffer from the beginning.
-        mem.seek(0)
-
-        # Log that the CSV was exported successfully.
-        logger.info('CSV successfully prepared for exportation.')
-
-        # Returns the output from the send_file() function. send_file() returns the binary data (mem) into a .CSV file
-        # which is exported to the User as a file called 'export.csv'.
-        return send_file(
-            mem,
-            mimetype="text/csv",
-            as_attachment=True,
-            download_name=f"{db_name}.csv",
-        )
+        # The headers and each row must be lists of values. This is checked before the response is returned, so that
+        # an error is reported to the User rather than ending the download part of the way through.
+        if not isinstance(columns, list) or not isinstance(rows, list):
+            raise TypeError(f'Expected lists of headers and rows, received {type(columns).__name__} and '
+                            f'{type(rows).__name__}.')
+
+        # Collect the rows that will be written to the CSV.
+        csv_rows = []
+
+        # Iterate through each row.
+        for row in rows:
+
+            # Raise an exception if the row is not a list of values.
+            if not isinstance(row, (list, tuple)):
+                raise TypeError(f'Expected a list of values in each row, received {type(row).__name__}: {row}')
+
+            # If the number of values in a row is not equal to the number of headers in 'columns', log a warning
+            if len(row) != len(columns):
+                logger.warning(f'The number of values in this row is not as expected: {row}')
+                logger.debug(f'No. of headers: {len(columns)}; No. of values: {len(row)}')
+                continue
+
+            # Convert each value in the row into a string using the stringify() function.
+            csv_rows.append([stringify(v) for v in row])
+
+        def generate():
+            """
+            This function yields the CSV one batch of rows at a time: the Byte Order Mark and headers first, then the
+            rows from the table, CSV_EXPORT_BATCH_SIZE at a time.
+            """
+            # The Byte Order Mark ensures that characters such as ★ are read correctly when the CSV is opened.
+            writer.writerow(columns)
+            yield "\ufeff" + _drain(output)
+
+            # Write the rows in batches, so that writerows() loops over each batch in C.
+            for i in range(0, len(csv_rows), CSV_EXPORT_BATCH_SIZE):
+                writer.writerows(csv_rows[i:i + CSV_EXPORT_BATCH_SIZE])
+                yield _drain(output)
+
+            # Log that the CSV was exported successfully.
+            logger.info('CSV successfully exported.')
+
+        # Stream the CSV to the User as a file named after the database. Each batch of rows is sent as soon as it is
+        # written, so the whole file is never held in memory.
+        return _csv_response(generate(), f"{db_name}.csv", compress=_accepts_gzip())
 
     # Raise and exception if there is an error generating the CSV.
     except Exception as e:
@@ -6,6 +6,7 @@ This script is responsible for:
     - Launching the app in a web browser.
     - Checking if a copy of clinvar.db exists in the app/clinvar subdirectory.
     - Logging the start of the application.
+    - Reading the command-line options (--port and --no-debug).
 
 No patient or variant-level data is processed here.
 Some of the code used in this script derived from ChatGPT.
@@ -13,6 +14,7 @@ Some of the code used in this script derived from ChatGPT.
 
 import os
 import sys
+import argparse
 import webbrowser
 from app.app import app
 from threading import Timer
@@ -48,33 +50,44 @@ def clinvar_db_check(path):
         logger.info("ClinVar database available. No download needed.")
 
 
-def open_browser():
+def open_browser(port=5000):
     '''
     Function that launches the flask app automatically at startup on port 5000, unless port forwarding is required.
     '''
     try:
         # Open the http://127.0.0.1:5000 webpage in a local browser.
         if os.environ.get("RUNNING_IN_DOCKER") != "1":
-            webbrowser.open("http://127.0.0.1:5000")
+            webbrowser.open(f"http://127.0.0.1:{port}")
 
     # If an error occurs while launching the flask app in a web browser, log the error.
     except Exception as e:
-        logger.warning(f"Could not launch flask app @ http://127.0.0.1:5000 in web browser. {e}")
+        logger.warning(f"Could not launch flask app @ http://127.0.0.1:{port} in web browser. {e}")
 
-def run_app():
+def run_app(debug=True, port=5000):
     """
     This function first runs the clinvar_db_check function to check if a clinvar database already exists before
     launching the app.
+
+    In debug mode, Flask's reloader runs this script a second time in a child process, which serves the app. The
+    WERKZEUG_RUN_MAIN environment variable is set in the child process, so that clinvar.db is only checked and the web
+    browser only opened once.
+
+    :params: debug: Run the flask app in debug mode, with the reloader.
+             port: The port that the flask app is served on.
+
+    :command: run_app(debug=False, port=8080)
     """
     try:
-        # Run the clinvar_db_check
-        clinvar_db_check(clinvar_db_path)
-        # Timer module initiates the open_browser function above after 1 second, launching the flask app. App runs in
-        # debug mode when debug=True
-        Timer(1, open_browser).start()
-        # Log the address where the flask app was launched.
-        logger.info("Launching flask app @ http://localhost:5000")
-        app.run(debug=True, host="0.0.0.0", port=5000)
+        # Only check for clinvar.db and open the web browser in the first process.
+        if os.environ.get("WERKZEUG_RUN_MAIN") != "true":
+            # Run the clinvar_db_check
+            clinvar_db_check(clinvar_db_path)
+            # Timer module initiates the open_browser function above after 1 second, launching the flask app.
+            Timer(1, open_browser, [port]).start()
+            # Log the address where the flask app was launched.
+            logger.info(f"Launching flask app @ http://localhost:{port}")
+        # App runs in debug mode when debug=True
+        app.run(debug=debug, host="0.0.0.0", port=port)
 
     # Raise a RuntimeError exception if an error occurs while checking for a local copy of the ClinVar database and log
     # the error.
@@ -86,6 +99,25 @@ def run_app():
         logger.critical(f"Fatal error occurred during application startup: {e}")
         sys.exit(1)
 
+def parse_args(argv=None):
+    """
+    This function reads the command-line options used to start the flask app.
+
+    :params: argv: The command-line arguments. Defaults to sys.argv.
+
+    :output: An argparse.Namespace with 'debug' and 'port' attributes.
+
+    :command: python main.py --port 8080 --no-debug
+    """
+    parser = argparse.ArgumentParser(description="SEA: the Variant Database Query Tool")
+    # Port that the flask app is served on.
+    parser.add_argument("--port", type=int, default=5000, help="Port to serve the flask app on (default: 5000).")
+    # Debug mode (with the reloader) is on by default, and can be turned off with --no-debug.
+    parser.add_argument("--debug", action=argparse.BooleanOptionalAction, default=True,
+                        help="Run the flask app in debug mode (default: on).")
+    return parser.parse_args(argv)
+
 # Initialise this script from the commandline.
 if __name__ == "__main__":
-    run_app()
\ No newline at end of file
+    args = parse_args()
+    run_app(debug=args.debug, port=args.port)
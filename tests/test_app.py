@@ -11,8 +11,11 @@ Some tests were initially generated with assistance from ChatGPT and
 subsequently refined by the developer.
 """
 
+import os
 import csv
 import json
+import time
+import gzip
 import errno
 import pytest
 import sqlite3
@@ -20,12 +23,15 @@ import werkzeug
 from io import BytesIO
 from flask import flash
 from app.app import app
+import app.app as app_module
 from tools.utils.logger import logger
 from tools.modules.database_functions import (
     patient_variant_table,
     variant_annotations_table,
     validate_database,
-    query_db
+    query_db,
+    DATABASE_INDEXES,
+    READ_PRAGMAS
 )
 
 # ----------------------------------------------------------------
@@ -135,12 +141,12 @@ def raise_csv_error(*args, **kwargs):
     raise csv.Error("write failed")
 
 # ----------------------------------------------------------------
-# Test Homepage-GET: files removed from temp folder.
+# Test Homepage-GET: temp folder not purged on each request.
 # ----------------------------------------------------------------
-def test_homepage_cleans_temp_folder(client, monkeypatch):
+def test_homepage_does_not_clean_temp_folder(client, monkeypatch):
     """
-    This function tests if the route to the homepage in app.py adequately removes .VCF and .CSV file from the 'temp'
-    folder, as soon as the flask app has been initialised.
+    This function tests that the route to the homepage in app.py no longer removes files from the 'temp' folder every
+    time the homepage is loaded, since the 'temp' folder is purged in a background thread and before each upload.
     Monkeypatch creates a fake path to two fake files: one VCF and one CSV.
 
     :param: client: A fake test client generated by the 'client' pytest fixture.
@@ -148,7 +154,7 @@ def test_homepage_cleans_temp_folder(client, monkeypatch):
                          altered without changing the original attributes and variables being used.
 
     :test outcomes: Test that a response was received successfully (status code 200).
-                    Test that if files were removed from the 'temp' folder.
+                    Test that no files were removed from the 'temp' folder.
     """
 
     # Create an empty list to store the paths to the removed files.
@@ -162,17 +168,137 @@ def test_homepage_cleans_temp_folder(client, monkeypatch):
     monkeypatch.setattr("app.app.os.remove", lambda path: removed.append(path))
 
     # The homepage in app.py is specified in the route by a '/'. This is submitted by the test client to 'get' a
-    # response from app.py during which os.remove is used.
+    # response from app.py.
     response = client.get("/")
 
     # A status code of 200 indicates that the simulated response was received successfully.
     assert response.status_code == 200
-    # The length of the 'removed' list is checked to ensure that both files were removed.
-    assert len(removed) == 2
+    # No files should have been removed.
+    assert removed == []
+
+# ----------------------------------------------------------------
+# Test _purge_temp_folder: stale files removed from temp folder.
+# ----------------------------------------------------------------
+def test_purge_temp_folder_removes_stale_files(tmp_path, monkeypatch):
+    """
+    This function tests that _purge_temp_folder in app.py only removes the files in the 'temp' folder that are older
+    than max_age, and removes every file when max_age is None.
+
+    :param: tmp_path: An in-built pytest fixture that provides a temporary directory, used as the 'temp' folder.
+            monkeypatch: An in-built pytest fixture that allows attributes and variables used in a software to be
+                         altered without changing the original attributes and variables being used.
+
+    :test outcomes: Test that only the stale file is removed when max_age is given.
+                    Test that the remaining file is removed when max_age is None.
+    """
+
+    # Point the 'temp' folder at the temporary directory.
+    monkeypatch.setitem(app_module.app.config, "variant_files_upload_folder", str(tmp_path))
+
+    # Create a variant file that was last modified in 1970, and one that was just uploaded.
+    stale = tmp_path / "old.vcf"
+    stale.write_text("")
+    os.utime(stale, (0, 0))
+    (tmp_path / "new.csv").write_text("")
+
+    # Only the stale file is removed.
+    assert app_module._purge_temp_folder(app_module.TEMP_FILE_MAX_AGE) == ["old.vcf"]
+    assert [p.name for p in tmp_path.iterdir()] == ["new.csv"]
+
+    # Every file is removed when max_age is not given.
+    assert app_module._purge_temp_folder() == ["new.csv"]
+    assert list(tmp_path.iterdir()) == []
+
+# ----------------------------------------------------------------
+# Test _list_databases: only database files listed, in order.
+# ----------------------------------------------------------------
+def test_list_databases_sorted_db_files(tmp_path, monkeypatch):
+    """
+    This function tests that _list_databases in app.py lists only the .db files in the 'databases' folder, in
+    alphabetical order.
+
+    :param: tmp_path: An in-built pytest fixture that provides a temporary directory, used as the 'databases' folder.
+            monkeypatch: An in-built pytest fixture that allows attributes and variables used in a software to be
+                         altered without changing the original attributes and variables being used.
+
+    :test outcome: Test that the .db files are listed in alphabetical order, without other files or folders.
+    """
+
+    # Point the 'databases' folder at the temporary directory.
+    monkeypatch.setitem(app_module.app.config, "db_upload_folder", str(tmp_path))
+
+    # Create two databases, a file that is not a database and a folder ending in '.db'.
+    (tmp_path / "b.db").write_text("")
+    (tmp_path / "a.db").write_text("")
+    (tmp_path / "notes.txt").write_text("")
+    (tmp_path / "folder.db").mkdir()
+
+    assert app_module._list_databases() == ["a.db", "b.db"]
+
+def test_list_databases_cached_until_folder_changes(tmp_path, monkeypatch):
+    """
+    This function tests that _list_databases in app.py reuses the list of databases until the modification time of the
+    'databases' folder changes.
+
+    :param: tmp_path: An in-built pytest fixture that provides a temporary directory, used as the 'databases' folder.
+            monkeypatch: An in-built pytest fixture that allows attributes and variables used in a software to be
+                         altered without changing the original attributes and variables being used.
+
+    :test outcome: Test that a database added without changing the folder's modification time is not listed, and that
+                   it is listed once the modification time changes.
+    """
+
+    monkeypatch.setitem(app_module.app.config, "db_upload_folder", str(tmp_path))
+    (tmp_path / "a.db").write_text("")
+    # Set the modification time of the folder to a minute ago, so that the list is stored.
+    old = time.time_ns() - 60_000_000_000
+    os.utime(tmp_path, ns=(old, old))
+
+    assert app_module._list_databases() == ["a.db"]
+
+    # Add a database, then put the folder's modification time back, so that the stored list is used.
+    (tmp_path / "b.db").write_text("")
+    os.utime(tmp_path, ns=(old, old))
+    assert app_module._list_databases() == ["a.db"]
+
+    # Once the folder's modification time changes, the folder is scanned again.
+    os.utime(tmp_path, ns=(old + 1_000_000_000, old + 1_000_000_000))
+    assert app_module._list_databases() == ["a.db", "b.db"]
 
 # ----------------------------------------------------------------
 # Test Homepage-POST: No files uploaded to temp folder.
 # ----------------------------------------------------------------
+def test_get_dropdowns_reads_indexes_in_order(tmp_path):
+    """
+    This function tests that _get_dropdowns in app.py returns the distinct patient IDs, HGVS genomic descriptions and
+    gene symbols in ascending order, reading them from the indexes without sorting them in a temporary table.
+
+    :param: tmp_path: An in-built pytest fixture that provides a temporary directory for the test database.
+
+    :test outcome: Test that each list is distinct and in ascending order, and that the query plan does not use a
+                   temporary B-tree.
+    """
+    db_path = str(tmp_path / "test.db")
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE patient_variant (No INTEGER PRIMARY KEY, patient_ID TEXT, variant TEXT)")
+    conn.execute("CREATE TABLE variant_annotations (No INTEGER PRIMARY KEY, variant_NC TEXT, variant_NM TEXT, "
+                 "variant_NP TEXT, gene TEXT, HGNC_ID INTEGER, Classification TEXT, Conditions TEXT, Stars TEXT, "
+                 "Review_status TEXT)")
+    for statements in DATABASE_INDEXES.values():
+        for statement in statements:
+            conn.execute(statement)
+    conn.executemany("INSERT INTO patient_variant (patient_ID, variant) VALUES (?, ?)",
+                     [("Patient2", "NC_2"), ("Patient1", "NC_1"), ("Patient2", "NC_1")])
+    conn.executemany("INSERT INTO variant_annotations (variant_NC, gene) VALUES (?, ?)",
+                     [("NC_2", "GRN"), ("NC_1", "ATP1A3"), ("NC_3", "GRN")])
+    conn.commit()
+    plan = [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + app_module._DROPDOWN_QUERY)]
+    conn.close()
+
+    assert app_module._get_dropdowns(db_path) == (
+        ["Patient1", "Patient2"], ["NC_1", "NC_2", "NC_3"], ["ATP1A3", "GRN"])
+    assert not any("TEMP B-TREE" in step for step in plan)
+
 def test_add_variant_no_files(client):
     """
     This function tests if the route to the homepage in app.py reports that the 'temp' folder is empty.
@@ -275,6 +401,136 @@ def test_add_variant_success(client, monkeypatch):
     # to the database.
     assert b"Added sample.vcf to database" in response.data
 
+def test_add_variant_saves_with_large_buffer(client, monkeypatch):
+    """
+    This function tests that app.py saves uploaded variant files to the 'temp' folder in chunks of UPLOAD_BUFFER_SIZE,
+    rather than the default 16 KiB used by werkzeug.
+
+    :param: client: A fake test client generated by the 'client' pytest fixture.
+       monkeypatch: An in-built pytest fixture that allows attributes and variables used in a software to be altered
+                    without changing the original attributes and variables being used.
+
+    :test outcome: Test that FileStorage.save was called with buffer_size set to UPLOAD_BUFFER_SIZE.
+    """
+
+    # Monkeypatch creates a fake environment to initialise patient_variant_table() and variant_annotations_table().
+    monkeypatch.setattr("app.app.patient_variant_table", lambda *args: None)
+    monkeypatch.setattr("app.app.variant_annotations_table", lambda *args: None)
+    monkeypatch.setattr("app.app.os.remove", lambda *args: None)
+
+    # Store the buffer sizes that FileStorage.save was called with.
+    buffer_sizes = []
+    monkeypatch.setattr(
+        "werkzeug.datastructures.FileStorage.save",
+        lambda self, dst, buffer_size=16384: buffer_sizes.append(buffer_size)
+    )
+
+    data = {"form_type": "add_variant", "db_file": "test.db", "variant_files": (BytesIO(b"fake"), "sample.vcf")}
+    client.post("/", data=data, content_type="multipart/form-data")
+
+    assert buffer_sizes == [app_module.UPLOAD_BUFFER_SIZE]
+
+def test_add_variant_rejects_before_saving(client, monkeypatch):
+    """
+    This function tests that app.py checks the extension of every uploaded variant file before any of them are saved
+    to the 'temp' folder, so that a valid file is not left in the 'temp' folder when another file is rejected.
+
+    :param: client: A fake test client generated by the 'client' pytest fixture.
+       monkeypatch: An in-built pytest fixture that allows attributes and variables used in a software to be altered
+                    without changing the original attributes and variables being used.
+
+    :test outcome: Test that "Invalid file type" is returned by the app and FileStorage.save was not called.
+    """
+
+    # Store the files that FileStorage.save was called with.
+    saved = []
+    monkeypatch.setattr(
+        "werkzeug.datastructures.FileStorage.save",
+        lambda self, dst, buffer_size=16384: saved.append(dst)
+    )
+
+    data = {
+        "form_type": "add_variant",
+        "db_file": "test.db",
+        "variant_files": [(BytesIO(b"fake"), "sample.vcf"), (BytesIO(b"fake"), "notes.txt")],
+    }
+    response = client.post("/", data=data, content_type="multipart/form-data")
+
+    assert b"Invalid file type" in response.data
+    assert saved == []
+
+def test_add_variant_uppercase_extension(client, monkeypatch):
+    """
+    This function tests that app.py accepts variant files whose extension is in upper case, such as .VCF and .CSV.GZ.
+
+    :param: client: A fake test client generated by the 'client' pytest fixture.
+       monkeypatch: An in-built pytest fixture that allows attributes and variables used in a software to be altered
+                    without changing the original attributes and variables being used.
+
+    :test outcome: Test that "Added SAMPLE.VCF, OTHER.CSV.GZ to database" is returned by the app.
+    """
+
+    # Monkeypatch creates a fake environment to initialise patient_variant_table() and variant_annotations_table().
+    monkeypatch.setattr("app.app.patient_variant_table", lambda *args: None)
+    monkeypatch.setattr("app.app.variant_annotations_table", lambda *args: None)
+    # Monkeypatch also simulates saving and removing the files without writing any real files.
+    monkeypatch.setattr("werkzeug.datastructures.FileStorage.save", lambda self, dst, buffer_size=16384: None)
+    monkeypatch.setattr("app.app.os.remove", lambda *args: None)
+
+    data = {
+        "form_type": "add_variant",
+        "db_file": "test.db",
+        "variant_files": [(BytesIO(b"fake"), "SAMPLE.VCF"), (BytesIO(b"fake"), "OTHER.CSV.GZ")],
+    }
+    response = client.post("/", data=data, content_type="multipart/form-data", follow_redirects=True)
+
+    assert response.status_code == 200
+    assert b"Added SAMPLE.VCF, OTHER.CSV.GZ to database" in response.data
+
+def test_homepage_unknown_form_type(client):
+    """
+    This function tests that app.py renders the homepage when the form-type ID of a POST request does not correspond to
+    one of the forms on the homepage.
+
+    :param: client: A fake test client generated by the 'client' pytest fixture.
+
+    :test outcome: Test that the homepage is returned with the status code, 200.
+    """
+
+    response = client.post("/", data={"form_type": "unknown"}, content_type="multipart/form-data")
+
+    assert response.status_code == 200
+
+def test_add_variant_gzip_success(client, monkeypatch):
+    """
+    This function tests if app.py accepts a gzip-compressed variant file (.vcf.gz), which is decompressed by the parser
+    while the variants are being read.
+
+    :param: client: A fake test client generated by the 'client' pytest fixture.
+       monkeypatch: An in-built pytest fixture that allows attributes and variables used in a software to be altered
+                    without changing the original attributes and variables being used.
+
+    :test outcome: Test that "Added sample.vcf.gz to database" is returned by the app.
+    """
+
+    # Monkeypatch creates a fake environment to initialise patient_variant_table() and variant_annotations_table().
+    monkeypatch.setattr("app.app.patient_variant_table", lambda *args: None)
+    monkeypatch.setattr("app.app.variant_annotations_table", lambda *args: None)
+
+    # Create a dict variable which stores the parameters required to test what happens if a .vcf.gz file is uploaded.
+    data = {
+        "form_type": "add_variant",
+        "db_file": "test.db",
+        "variant_files": (BytesIO(b"\x1f\x8bfake"), "sample.vcf.gz")
+    }
+
+    # Use request POST to submit the fake compressed variant file to app.py.
+    response = client.post("/", data=data, content_type="multipart/form-data", follow_redirects=True)
+
+    # Test that the compressed file was accepted.
+    assert response.status_code == 200
+    assert b"Added sample.vcf.gz to database" in response.data
+
 # ----------------------------------------------------------------
 # Test Homepage-POST: Failure to populate a database.
 # ----------------------------------------------------------------
@@ -514,7 +770,7 @@ def test_upload_db_validation_failure(monkeypatch, client):
     # Monkey patch prevents the fake database about to be made from saving to the 'databases' directory.
     monkeypatch.setattr(
         "werkzeug.datastructures.FileStorage.save",
-        lambda self, dst: None
+        lambda self, dst, buffer_size=16384: None
     )
 
     # Create a dict variable which stores the parameters required to test what happens if the wrong type of database
@@ -568,7 +824,7 @@ def test_upload_db_success(monkeypatch, client):
     # Monkey patch prevents the fake database about to be made from saving to the 'databases' directory.
     monkeypatch.setattr(
         "werkzeug.datastructures.FileStorage.save",
-        lambda self, dst: None
+        lambda self, dst, buffer_size=16384: None
     )
 
     # Create a dict variable which stores the parameters required to test what happens if the database is successfully
@@ -735,9 +991,9 @@ class FakeCursor:
         pass
     def fetchall(self):
         """
-        Return a result from the execution.
+        Return a result from the execution, tagged with the dropdown menu that it belongs to ('p' for patient IDs).
         """
-        return [("P1",)]
+        return [("p", "P1")]
 
 class FakeConn:
     """
@@ -749,6 +1005,12 @@ class FakeConn:
         """
         return FakeCursor()
 
+    def close(self):
+        """
+        Simulates closing the connection to the SQLite3 database.
+        """
+        pass
+
     def __enter__(self):
         """
         Simulates a 'with' block instance to initialise FakeConn.
@@ -782,12 +1044,12 @@ def test_query_get_success(monkeypatch, client):
                    Test that the db_query_page.html page is rendered by the flask app.
     """
     # Monkeypatch simulates the existence of an SQLite3 database file.
-    monkeypatch.setattr("app.app.os.listdir", lambda *_: ["test.db"])
+    monkeypatch.setattr("app.app._list_databases", lambda: ["test.db"])
     # Monkeypatch also simulates a fake check to determine if the SQLite3 database exists using the os.path.exists
     # function from app.py.
     monkeypatch.setattr("app.app.os.path.exists", lambda *_: True)
     # Monkeypatch simulates the sqlite3.connect function from app.py to connect to a fake database.
-    monkeypatch.setattr("app.app.sqlite3.connect", lambda *_: FakeConn())
+    monkeypatch.setattr("app.app.sqlite3.connect", lambda *_, **__: FakeConn())
 
     # Use request GET to connect to a database file through the app and return the appropriate query page.
     response = client.get("/query/test.db")
@@ -819,8 +1081,8 @@ def test_query_get_db_missing(monkeypatch, client):
                    Test that the route to the homepage.html page is assigned to the response's 'Location' attribute.
                    Test that "You should be redirected automatically to the target URL" is returned.
     """
-    # Monkeypatch simulates a fake database file called 'test.db' using the os.listdir function from app.py.
-    monkeypatch.setattr("app.app.os.listdir", lambda *_: ["test.db"])
+    # Monkeypatch simulates a fake database file called 'test.db' using the _list_databases function from app.py.
+    monkeypatch.setattr("app.app._list_databases", lambda: ["test.db"])
     # Monkeypatch then ensures that the os.path.exists function cannot find the file, thereby simulating that the
     # database file is missing.
     monkeypatch.setattr("app.app.os.path.exists", lambda *_: False)
@@ -866,7 +1128,7 @@ def test_query_get_no_db_folder(monkeypatch, client):
     # Monkeypatch simulates a FileNotFoundError exception that is raised because the folder where the database file
     # should be stored does not exist.
     monkeypatch.setattr(
-        "app.app.os.listdir",
+        "app.app.os.scandir",
         lambda *_: (_ for _ in ()).throw(FileNotFoundError())
     )
 
@@ -908,12 +1170,12 @@ def test_patient_query_success(monkeypatch, client):
     :test outcome: Test that a response was received successfully (status code 200)
     """
     # Monkeypatch simulates the existence of an SQLite3 database file.
-    monkeypatch.setattr("app.app.os.listdir", lambda *_: ["test.db"])
+    monkeypatch.setattr("app.app._list_databases", lambda: ["test.db"])
     # Monkeypatch also simulates a fake check to determine if the SQLite3 database exists using the os.path.exists
     # function from app.py.
     monkeypatch.setattr("app.app.os.path.exists", lambda *_: True)
     # Monkeypatch simulates the sqlite3.connect function from app.py to connect to a fake database.
-    monkeypatch.setattr("app.app.sqlite3.connect", lambda *_: FakeConn())
+    monkeypatch.setattr("app.app.sqlite3.connect", lambda *_, **__: FakeConn())
     # Monkeypatch simulates some fake SQLite database content to be processed by a fake version of query_db() in app.py.
     monkeypatch.setattr("app.app.query_db", lambda *a, **k: [{"patient_ID": "P1", "variant_NC": "NC_1"}])
     # Use request POST to render the output from the patient query (assigned to the 'data' variable) into the query
@@ -946,9 +1208,9 @@ def test_patient_query_not_found(monkeypatch, client):
     # Monkeypatch simulates empty database content to be processed by a fake version of query_db() in app.py.
     monkeypatch.setattr("app.app.query_db", lambda *a, **k: None)
     # Monkeypatch simulates the sqlite3.connect function from app.py to connect to a fake database.
-    monkeypatch.setattr("app.app.sqlite3.connect", lambda *_: FakeConn())
+    monkeypatch.setattr("app.app.sqlite3.connect", lambda *_, **__: FakeConn())
     # Monkeypatch simulates the existence of an SQLite3 database file.
-    monkeypatch.setattr("app.app.os.listdir", lambda *_: ["test.db"])
+    monkeypatch.setattr("app.app._list_databases", lambda: ["test.db"])
     # Monkeypatch also simulates a fake check to determine if the SQLite3 database exists using the os.path.exists
     # function from app.py.
     monkeypatch.setattr("app.app.os.path.exists", lambda *_: True)
@@ -981,9 +1243,9 @@ def test_variant_query_success(monkeypatch, client):
     # Monkeypatch simulates some fake SQLite database content to be processed by a fake version of query_db() in app.py.
     monkeypatch.setattr("app.app.query_db", lambda *a, **k: [{"variant_NC": "NC_1"}])
     # Monkeypatch simulates the sqlite3.connect function from app.py to connect to a fake database.
-    monkeypatch.setattr("app.app.sqlite3.connect", lambda *_: FakeConn())
+    monkeypatch.setattr("app.app.sqlite3.connect", lambda *_, **__: FakeConn())
     # Monkeypatch simulates the existence of an SQLite3 database file.
-    monkeypatch.setattr("app.app.os.listdir", lambda *_: ["test.db"])
+    monkeypatch.setattr("app.app._list_databases", lambda: ["test.db"])
     # Monkeypatch also simulates a fake check to determine if the SQLite3 database exists using the os.path.exists
     # function from app.py.
     monkeypatch.setattr("app.app.os.path.exists", lambda *_: True)
@@ -1016,9 +1278,9 @@ def test_gene_query_not_found(monkeypatch, client):
     # Monkeypatch simulates empty database content to be processed by a fake version of query_db() in app.py.
     monkeypatch.setattr("app.app.query_db", lambda *a, **k: None)
     # Monkeypatch simulates the sqlite3.connect function from app.py to connect to a fake database.
-    monkeypatch.setattr("app.app.sqlite3.connect", lambda *_: FakeConn())
+    monkeypatch.setattr("app.app.sqlite3.connect", lambda *_, **__: FakeConn())
     # Monkeypatch simulates the existence of an SQLite3 database file.
-    monkeypatch.setattr("app.app.os.listdir", lambda *_: ["test.db"])
+    monkeypatch.setattr("app.app._list_databases", lambda: ["test.db"])
     # Monkeypatch also simulates a fake check to determine if the SQLite3 database exists using the os.path.exists
     # function from app.py.
     monkeypatch.setattr("app.app.os.path.exists", lambda *_: True)
@@ -1027,6 +1289,148 @@ def test_gene_query_not_found(monkeypatch, client):
     # Test that the predetermined message from an unsuccessful gene query is returned in the response.
     assert b"Gene Query: FAKE could not be found in test.db database." in response.data
 
+def test_gene_query_single_query(monkeypatch, client, tmp_path):
+    """
+    This function tests that app.py retrieves the variants from a gene with a single query, which looks up the HGNC ID
+    of the gene symbol and the variants with that HGNC ID together.
+
+    :param: client: A fake test client generated by the 'client' pytest fixture.
+       monkeypatch: An in-built pytest fixture that allows attributes and variables used in a software to be altered
+                    without changing the original attributes and variables being used.
+          tmp_path: An in-built pytest fixture that provides a temporary directory for the test database.
+
+    :test outcome: Test that query_db() is called once, with the gene symbol.
+                   Test that the variants with the HGNC ID of the gene symbol are returned, with the patient count.
+    """
+    # Create a database with two variants in GRN, one of which is recorded under a previous gene symbol.
+    conn = sqlite3.connect(tmp_path / "test.db")
+    conn.execute("CREATE TABLE patient_variant (No INTEGER PRIMARY KEY, patient_ID TEXT, variant TEXT)")
+    conn.execute("CREATE TABLE variant_annotations (No INTEGER PRIMARY KEY, variant_NC TEXT, variant_NM TEXT, "
+                 "variant_NP TEXT, gene TEXT, HGNC_ID INTEGER, Classification TEXT, Conditions TEXT, Stars TEXT, "
+                 "Review_status TEXT)")
+    conn.executemany("INSERT INTO patient_variant (patient_ID, variant) VALUES (?, ?)",
+                     [("Patient1", "NC_1"), ("Patient2", "NC_1"), ("Patient1", "NC_3")])
+    conn.executemany("INSERT INTO variant_annotations (variant_NC, variant_NM, variant_NP, gene, HGNC_ID, "
+                     "Classification, Conditions, Stars, Review_status) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                     [("NC_1", "NM_1", "NP_1", "GRN", 4601, "Pathogenic", "FTD", "★", "single submitter"),
+                      ("NC_2", "NM_2", "NP_2", "PGRN", 4601, "Benign", "FTD", "★", "single submitter"),
+                      ("NC_3", "NM_3", "NP_3", "ATP1A3", 801, "Benign", None, "★★", "multiple submitters")])
+    conn.commit()
+    conn.close()
+    monkeypatch.setitem(app.config, "db_upload_folder", str(tmp_path))
+
+    # Record the arguments that query_db() is called with.
+    calls = []
+    real_query_db = app_module.query_db
+
+    def recording_query_db(*args, **kwargs):
+        calls.append(args[2])
+        return real_query_db(*args, **kwargs)
+
+    monkeypatch.setattr("app.app.query_db", recording_query_db)
+
+    # Capture the query results passed to the template.
+    captured = {}
+
+    def fake_render_template(template, **context):
+        captured.update(context)
+        return ""
+
+    monkeypatch.setattr(app_module, "render_template", fake_render_template)
+
+    response = client.post("/query/test.db", data={"gene": "GRN"})
+
+    assert response.status_code == 200
+    assert calls == [("GRN",)]
+    # Both variants with the HGNC ID of GRN are returned, but not the ATP1A3 variant.
+    assert captured["result_type"] == "gene"
+    assert [(row["variant_NC"], row["Patient_Count"]) for row in captured["data"]] == [("NC_1", 2), ("NC_2", 0)]
+
+def test_gene_query_keeps_each_annotation(monkeypatch, client, tmp_path):
+    """
+    This function tests that app.py returns every annotation of a variant in a gene query, when an uploaded database
+    has more than one annotation for the same HGVS descriptions, rather than one annotation picked by SQLite.
+
+    :param: client: A fake test client generated by the 'client' pytest fixture.
+       monkeypatch: An in-built pytest fixture that allows attributes and variables used in a software to be altered
+                    without changing the original attributes and variables being used.
+          tmp_path: An in-built pytest fixture that provides a temporary directory for the test database.
+
+    :test outcome: Test that both classifications of the variant are returned, each with the patient count.
+    """
+    # Create a database in which one variant has two different classifications.
+    conn = sqlite3.connect(tmp_path / "test.db")
+    conn.execute("CREATE TABLE patient_variant (No INTEGER PRIMARY KEY, patient_ID TEXT, variant TEXT)")
+    conn.execute("CREATE TABLE variant_annotations (No INTEGER PRIMARY KEY, variant_NC TEXT, variant_NM TEXT, "
+                 "variant_NP TEXT, gene TEXT, HGNC_ID INTEGER, Classification TEXT, Conditions TEXT, Stars TEXT, "
+                 "Review_status TEXT)")
+    conn.execute("INSERT INTO patient_variant (patient_ID, variant) VALUES ('Patient1', 'NC_1')")
+    conn.executemany("INSERT INTO variant_annotations (variant_NC, variant_NM, variant_NP, gene, HGNC_ID, "
+                     "Classification, Conditions, Stars, Review_status) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                     [("NC_1", "NM_1", "NP_1", "GRN", 4601, "Pathogenic", "FTD", "★", "single submitter"),
+                      ("NC_1", "NM_1", "NP_1", "GRN", 4601, "Benign", "FTD", "★", "single submitter")])
+    conn.commit()
+    conn.close()
+    monkeypatch.setitem(app.config, "db_upload_folder", str(tmp_path))
+
+    # Capture the query results passed to the template.
+    captured = {}
+
+    def fake_render_template(template, **context):
+        captured.update(context)
+        return ""
+
+    monkeypatch.setattr(app_module, "render_template", fake_render_template)
+
+    client.post("/query/test.db", data={"gene": "GRN"})
+
+    assert sorted((row["Classification"], row["Patient_Count"]) for row in captured["data"]) == [
+        ("Benign", 1), ("Pathogenic", 1)]
+
+def test_variant_query_counts_patients(monkeypatch, client, tmp_path):
+    """
+    This function tests that app.py returns the annotations of a variant with the number of patients that have the
+    variant, from a real database.
+
+    :param: client: A fake test client generated by the 'client' pytest fixture.
+       monkeypatch: An in-built pytest fixture that allows attributes and variables used in a software to be altered
+                    without changing the original attributes and variables being used.
+          tmp_path: An in-built pytest fixture that provides a temporary directory for the test database.
+
+    :test outcome: Test that the variant is returned once, with a count of the two patients that have it.
+    """
+    # Create a database with two patients who share a variant, and a variant that no patient has.
+    conn = sqlite3.connect(tmp_path / "test.db")
+    conn.execute("CREATE TABLE patient_variant (No INTEGER PRIMARY KEY, patient_ID TEXT, variant TEXT)")
+    conn.execute("CREATE TABLE variant_annotations (No INTEGER PRIMARY KEY, variant_NC TEXT, variant_NM TEXT, "
+                 "variant_NP TEXT, gene TEXT, HGNC_ID INTEGER, Classification TEXT, Conditions TEXT, Stars TEXT, "
+                 "Review_status TEXT)")
+    conn.executemany("INSERT INTO patient_variant (patient_ID, variant) VALUES (?, ?)",
+                     [("Patient1", "NC_1"), ("Patient2", "NC_1")])
+    conn.executemany("INSERT INTO variant_annotations (variant_NC, variant_NM, variant_NP, gene, HGNC_ID, "
+                     "Classification, Conditions, Stars, Review_status) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                     [("NC_1", "NM_1", "NP_1", "GRN", 4601, "Pathogenic", "FTD", "★", "single submitter"),
+                      ("NC_2", "NM_2", "NP_2", "GRN", 4601, "Benign", "FTD", "★", "single submitter")])
+    conn.commit()
+    conn.close()
+    monkeypatch.setitem(app.config, "db_upload_folder", str(tmp_path))
+    # Monkeypatch simulates the HGVS genomic description returned by VariantValidator.
+    monkeypatch.setattr("app.app.get_mane_nc", lambda v: "NC_1")
+
+    # Capture the query results passed to the template.
+    captured = {}
+
+    def fake_render_template(template, **context):
+        captured.update(context)
+        return ""
+
+    monkeypatch.setattr(app_module, "render_template", fake_render_template)
+
+    response = client.post("/query/test.db", data={"variant_NC": "NM_1:c.1A>G"})
+
+    assert response.status_code == 200
+    assert [(row["variant_NC"], row["Patient_Count"]) for row in captured["data"]] == [("NC_1", 2)]
+
 # --------------------------------------------------------------------
 # Test Query page-ERROR: SQLite error during query.
 # --------------------------------------------------------------------
@@ -1051,9 +1455,9 @@ def test_query_sqlite_error(monkeypatch, client):
         lambda *a, **k: (_ for _ in ()).throw(raise_sqlite_de())
     )
     # Monkeypatch simulates the sqlite3.connect function from app.py to connect to a fake database.
-    monkeypatch.setattr("app.app.sqlite3.connect", lambda *_: FakeConn())
+    monkeypatch.setattr("app.app.sqlite3.connect", lambda *_, **__: FakeConn())
     # Monkeypatch simulates the existence of an SQLite3 database file.
-    monkeypatch.setattr("app.app.os.listdir", lambda *_: ["test.db"])
+    monkeypatch.setattr("app.app._list_databases", lambda: ["test.db"])
     # Monkeypatch also simulates a fake check to determine if the SQLite3 database exists using the os.path.exists
     # function from app.py.
     monkeypatch.setattr("app.app.os.path.exists", lambda *_: True)
@@ -1085,9 +1489,9 @@ def test_export_index_error(monkeypatch, client):
     # Monkeypatch simulates a blank list that is processed by the query_db() database function from app.py.
     monkeypatch.setattr("app.app.query_db", lambda *a, **k: [None])
     # Monkeypatch simulates the sqlite3.connect function from app.py to connect to a fake database.
-    monkeypatch.setattr("app.app.sqlite3.connect", lambda *_: FakeConn())
+    monkeypatch.setattr("app.app.sqlite3.connect", lambda *_, **__: FakeConn())
     # Monkeypatch simulates the existence of an SQLite3 database file.
-    monkeypatch.setattr("app.app.os.listdir", lambda *_: ["test.db"])
+    monkeypatch.setattr("app.app._list_databases", lambda: ["test.db"])
     # Monkeypatch also simulates a fake check to determine if the SQLite3 database exists using the os.path.exists
     # function from app.py.
     monkeypatch.setattr("app.app.os.path.exists", lambda *_: True)
@@ -1098,66 +1502,85 @@ def test_export_index_error(monkeypatch, client):
             b"nearest friendly neighbourhood Bioinformatician") in response.data
 
 # --------------------------------------------------------------------
-# Test Query page-ERROR: KeyError from querying.
+# Test Query page: export rows taken from sqlite3.Row values.
 # --------------------------------------------------------------------
-def test_export_key_error(monkeypatch, client):
+def test_export_rows_from_sqlite_rows(monkeypatch, client):
     """
-    This function tests if app.py can appropriately handle a KeyError exception from the output returned by the
-    query_db() database function.
-
-    To determine if the exception was handled appropriately, an assertion is made that the following message is
-    returned, "Query Error: An error occurred while processing the query. It is not your fault. Please contact your
-    nearest friendly neighbourhood Bioinformatician".
+    This function tests that app.py prepares the query results for export using the values of the sqlite3.Row objects
+    returned by the query_db() database function, in the same order as the column headers.
 
     :param: client: A fake test client generated by the 'client' pytest fixture.
        monkeypatch: An in-built pytest fixture that allows attributes and variables used in a software to be altered
                     without changing the original attributes and variables being used.
 
-    :test outcome: Test that "Query Error: An error occurred while processing the query. It is not your fault. Please
-                   contact your friendly neighbourhood Clinical Bioinformatician." is returned.
+    :test outcome: Test that a response was received successfully (status code 200).
+                   Test that the column headers and the values of each row are embedded in the query page for export.
     """
+    # Create real sqlite3.Row objects, as returned by query_db(), from an in-memory database.
+    conn = sqlite3.connect(":memory:")
+    conn.row_factory = sqlite3.Row
+    rows = conn.execute(
+        "SELECT 'NC_1' AS variant_NC, 'CSF1R' AS gene UNION ALL SELECT 'NC_2', 'GRN'"
+    ).fetchall()
+    conn.close()
+
     # Monkeypatch simulates a fake variant to be processed by a fake version of get_mane_nc() in app.py.
     monkeypatch.setattr("app.app.get_mane_nc", lambda v: "NC_1")
-    # Monkeypatch simulates fake SQLite database content to be processed by a fake version of query_db() in app.py.
-    monkeypatch.setattr(
-        "app.app.query_db",
-        lambda *a, **k: [
-            {"variant_NC": "NC_1", "gene": "CSF1R"},
-            {"variant_NC": "NC_1"}
-        ]
-    )
+    # Monkeypatch simulates the SQLite database content returned by query_db() in app.py.
+    monkeypatch.setattr("app.app.query_db", lambda *a, **k: rows)
     # Monkeypatch simulates the sqlite3.connect function from app.py to connect to a fake database.
-    monkeypatch.setattr("app.app.sqlite3.connect", lambda *_: FakeConn())
+    monkeypatch.setattr("app.app.sqlite3.connect", lambda *_, **__: FakeConn())
     # Monkeypatch simulates the existence of an SQLite3 database file.
-    monkeypatch.setattr("app.app.os.listdir", lambda *_: ["test.db"])
-    # Monkeypatch also simulates a fake check to determine if the SQLite3 database exists using the os.path.exists
-    # function from app.py.
+    monkeypatch.setattr("app.app._list_databases", lambda: ["test.db"])
     monkeypatch.setattr("app.app.os.path.exists", lambda *_: True)
-    # Use request POST to submit a query to the app so that the KeyError exception can be raised.
-    response = client.post("/query/test.db", data={"variant_NC": "NM_1.1:c.1A>T"}, follow_redirects=True)
-    # Test that the predetermined message from an KeyError is returned in the response.
-    assert (b"Query Error: An error occurred while processing the query. It is not your fault. Please contact your "
-            b"nearest friendly neighbourhood Bioinformatician") in response.data
 
+    response = client.post("/query/test.db", data={"variant_NC": "NM_1.1:c.1A>T"})
+
+    # A status code of 200 indicates that the simulated response was received successfully.
+    assert response.status_code == 200
+    # The column headers and the values of each row are embedded in the page, in column order.
+    assert b"value='[\"variant_NC\",\"gene\"]'" in response.data
+    assert b"value='[[\"NC_1\",\"CSF1R\"],[\"NC_2\",\"GRN\"]]'" in response.data
 
 # --------------------------------------------------------------------
 # Fake SQLite database content to test
 # --------------------------------------------------------------------
 FAKE_ROWS = [
-    {
-        "patient_ID": "Patient1",
-        "variant_NC": "NC_000019.10:g.41968837C>G",
-        "variant_NM": "NM_152296.5:c.2767G>C",
-        "variant_NP": "NP_689509.1:p.(Asp923His)",
-        "gene": "ATP1A3",
-        "HGNC_ID": "801",
-        "Classification": "Pathogenic",
-        "Conditions": "Dystonia 12",
-        "Stars": "★",
-        "Review_status": "criteria provided, single submitter",
-    }
+    (
+        "Patient1",
+        "NC_000019.10:g.41968837C>G",
+        "NM_152296.5:c.2767G>C",
+        "NP_689509.1:p.(Asp923His)",
+        "ATP1A3",
+        "801",
+        "Pathogenic",
+        "Dystonia 12",
+        "★",
+        "criteria provided, single submitter",
+    )
 ]
 
+class FakeFilterCursor(FakeCursor):
+    """
+    FakeFilterCursor class simulates the cursor used to retrieve the filter values on the display page, which returns
+    each value with the column header that it was under.
+    """
+    def fetchall(self):
+        """
+        Return a result from the execution.
+        """
+        return [("patient_ID", "Patient1"), ("gene", "ATP1A3")]
+
+class FakeFilterConn(FakeConn):
+    """
+    Simulate the sqlite3.connect() function for the display page.
+    """
+    def cursor(self):
+        """
+        Simulates a fake cursor to retrieve the filter values from FakeFilterCursor.
+        """
+        return FakeFilterCursor()
+
 # --------------------------------------------------------------------
 # Test Display page-GET: Successful display page
 # --------------------------------------------------------------------
@@ -1186,12 +1609,12 @@ def test_display_db_success(monkeypatch, client):
     # using the data in the FAKE_ROWS array.
     monkeypatch.setattr(
         "app.app.query_db",
-        lambda db_path, query, params: FAKE_ROWS
+        lambda db_path, query, params, **kwargs: FAKE_ROWS
     )
     # Monkeypatch simulates the sqlite3.connect function from app.py to connect to a fake database.
     monkeypatch.setattr(
         "app.app.sqlite3.connect",
-        lambda *args, **kwargs: FakeConn()
+        lambda *args, **kwargs: FakeFilterConn()
     )
     # Use request GET to connect to a database file through the app and return the corresponding display page.
     response = client.get("/display/test.db")
@@ -1205,6 +1628,123 @@ def test_display_db_success(monkeypatch, client):
 # --------------------------------------------------------------------
 # Test Display page-GET: database file does not exist.
 # --------------------------------------------------------------------
+def test_display_db_streamed_flash_shown_once(monkeypatch, client):
+    """
+    This function tests that the display page, which is streamed to the User's browser, shows a flash message once and
+    removes it from the session, so that it is not shown again on the next page.
+
+    :param: client: A fake test client generated by the 'client' pytest fixture.
+       monkeypatch: An in-built pytest fixture that allows attributes and variables used in a software to be altered
+                    without changing the original attributes and variables being used.
+
+    :test outcome: Test that the flash message is shown on the first display page and not on the second.
+    """
+    monkeypatch.setattr("app.app.os.path.exists", lambda path: True)
+    monkeypatch.setattr(
+        "app.app.query_db",
+        lambda db_path, query, params, **kwargs: FAKE_ROWS
+    )
+    monkeypatch.setattr(
+        "app.app.sqlite3.connect",
+        lambda *args, **kwargs: FakeFilterConn()
+    )
+
+    # Store a flash message in the session, as a redirect to the display page would.
+    with client.session_transaction() as sess:
+        sess["_flashes"] = [("message", "CSV Export Error: test flash")]
+
+    first = client.get("/display/test.db")
+    assert first.is_streamed
+    assert b"CSV Export Error: test flash" in first.data
+
+    second = client.get("/display/test.db")
+    assert b"CSV Export Error: test flash" not in second.data
+
+def test_display_db_not_modified(client, monkeypatch, tmp_path):
+    """
+    This function tests that the display page tells the User's browser to reuse the page it has already loaded, when
+    the database has not changed since, and that filtered pages and pages with flash messages are not cached.
+
+    :param: client: A fake test client generated by the 'client' pytest fixture.
+       monkeypatch: An in-built pytest fixture that allows attributes and variables used in a software to be altered
+                    without changing the original attributes and variables being used.
+          tmp_path: An in-built pytest fixture that provides a temporary directory for the test database.
+
+    :test outcome: Test that the page has an ETag and that a request with that ETag returns the status code 304.
+                   Test that the ETag is ignored when a flash message is waiting, and for filtered (POST) pages.
+    """
+    # Create an empty database with the tables of the display page.
+    conn = sqlite3.connect(tmp_path / "test.db")
+    conn.execute("CREATE TABLE patient_variant (No INTEGER PRIMARY KEY, patient_ID TEXT, variant TEXT)")
+    conn.execute("CREATE TABLE variant_annotations (No INTEGER PRIMARY KEY, variant_NC TEXT, variant_NM TEXT, "
+                 "variant_NP TEXT, gene TEXT, HGNC_ID INTEGER, Classification TEXT, Conditions TEXT, Stars TEXT, "
+                 "Review_status TEXT)")
+    conn.commit()
+    conn.close()
+    monkeypatch.setitem(app.config, "db_upload_folder", str(tmp_path))
+
+    first = client.get("/display/test.db")
+    etag = first.headers["ETag"]
+    assert first.status_code == 200
+    assert "no-cache" in first.headers["Cache-Control"]
+    assert b"No data found." in first.data
+
+    repeat = client.get("/display/test.db", headers={"If-None-Match": etag})
+    assert repeat.status_code == 304
+    assert repeat.data == b""
+
+    # A flash message waiting to be shown is part of the page, so the page is sent again.
+    with client.session_transaction() as sess:
+        sess["_flashes"] = [("message", "CSV Export Error: test flash")]
+    flashed = client.get("/display/test.db", headers={"If-None-Match": etag})
+    assert flashed.status_code == 200
+    assert b"CSV Export Error: test flash" in flashed.data
+
+    # Filtered pages are not cached.
+    filtered = client.post("/display/test.db", data={"sort_column": "gene"}, headers={"If-None-Match": etag})
+    assert filtered.status_code == 200
+    assert "ETag" not in filtered.headers
+    assert b"No data found." in filtered.data
+
+def test_display_and_query_pages_gzip(client, monkeypatch, tmp_path):
+    """
+    This function tests that the display page and the query page are compressed with gzip when the User's browser
+    accepts it, and sent uncompressed otherwise.
+
+    :param: client: A fake test client generated by the 'client' pytest fixture.
+       monkeypatch: An in-built pytest fixture that allows attributes and variables used in a software to be altered
+                    without changing the original attributes and variables being used.
+          tmp_path: An in-built pytest fixture that provides a temporary directory for the test database.
+
+    :test outcome: Test that both pages have the gzip Content-Encoding and decompress into the same page that is sent
+                   when gzip is not accepted.
+    """
+    # Create a database with one patient and their variant.
+    conn = sqlite3.connect(tmp_path / "test.db")
+    conn.execute("CREATE TABLE patient_variant (No INTEGER PRIMARY KEY, patient_ID TEXT, variant TEXT)")
+    conn.execute("CREATE TABLE variant_annotations (No INTEGER PRIMARY KEY, variant_NC TEXT, variant_NM TEXT, "
+                 "variant_NP TEXT, gene TEXT, HGNC_ID INTEGER, Classification TEXT, Conditions TEXT, Stars TEXT, "
+                 "Review_status TEXT)")
+    conn.execute("INSERT INTO patient_variant (patient_ID, variant) VALUES ('Patient1', 'NC_1')")
+    conn.execute("INSERT INTO variant_annotations (variant_NC, variant_NM, variant_NP, gene, HGNC_ID, Classification, "
+                 "Conditions, Stars, Review_status) VALUES ('NC_1', 'NM_1', 'NP_1', 'GRN', 4601, 'Pathogenic', 'FTD', "
+                 "'★', 'single submitter')")
+    conn.commit()
+    conn.close()
+    monkeypatch.setitem(app.config, "db_upload_folder", str(tmp_path))
+
+    for method, url, data in (("get", "/display/test.db", None),
+                              ("post", "/query/test.db", {"patient_ID": "Patient1"})):
+        compressed = getattr(client, method)(url, data=data, headers={"Accept-Encoding": "gzip"})
+        uncompressed = getattr(client, method)(url, data=data)
+
+        assert compressed.headers["Content-Encoding"] == "gzip"
+        assert "Accept-Encoding" in compressed.headers["Vary"]
+        assert "Content-Encoding" not in uncompressed.headers
+        page = uncompressed.get_data(as_text=True)
+        assert "Patient1" in page
+        assert gzip.decompress(compressed.data).decode("utf-8") == page
+
 def test_display_db_not_found(monkeypatch, client):
     """
     This function tests if app.py can successfully function while the selected database file is missing, on the display
@@ -1270,7 +1810,7 @@ def test_display_db_filter(monkeypatch, client):
     # function from app.py.
     monkeypatch.setattr("app.app.os.path.exists", lambda path: True)
 
-    def fake_query_db(db_path, query, params):
+    def fake_query_db(db_path, query, params, **kwargs):
         """
         This function creates a fake version of the query_db() database function with minimal functionality so that
         assertions can be made on the content of the data, specifically the classification.
@@ -1303,7 +1843,7 @@ def test_display_db_filter(monkeypatch, client):
     # Monkeypatch simulates the sqlite3.connect function from app.py to connect to a fake database.
     monkeypatch.setattr(
         "app.app.sqlite3.connect",
-        lambda *args, **kwargs: FakeConn()
+        lambda *args, **kwargs: FakeFilterConn()
     )
     # Use request POST to submit the values to filter by, as a test client, so that they are applied to a database file
     # through the app and returned to the corresponding display page.
@@ -1322,6 +1862,46 @@ def test_display_db_filter(monkeypatch, client):
     )
     assert response.status_code == 200
 
+# --------------------------------------------------------------------
+# Test Display page: filter and sort columns restricted to the table.
+# --------------------------------------------------------------------
+def test_display_db_ignores_unknown_columns(monkeypatch, client):
+    """
+    This function tests that a column to filter by or sort by that is not a column header of the table on the display
+    page is not written into the SQL query.
+
+    :param: client: A fake test client generated by the 'client' pytest fixture.
+       monkeypatch: An in-built pytest fixture that allows attributes and variables used in a software to be altered
+                    without changing the original attributes and variables being used.
+
+    :test outcome: Test that a response was successfully received (status code 200).
+                   Test that neither a WHERE nor an ORDER BY clause was added to the query, and no params were bound.
+    """
+    # Monkeypatch simulates a fake check to determine if the SQLite3 database exists.
+    monkeypatch.setattr("app.app.os.path.exists", lambda path: True)
+    # Monkeypatch simulates the sqlite3.connect function from app.py to connect to a fake database.
+    monkeypatch.setattr("app.app.sqlite3.connect", lambda *args, **kwargs: FakeFilterConn())
+
+    # Store the queries and params passed to query_db().
+    queries = []
+    monkeypatch.setattr("app.app.query_db", lambda db_path, query, params, **kwargs: queries.append((query, params)) or [])
+
+    response = client.post(
+        "/display/test.db",
+        data={
+            "filter_column": "1=1 OR gene",
+            "filter_value": "GRN",
+            "sort_column": "(SELECT 1)"}
+    )
+
+    # A status code of 200 indicates that the simulated response was received successfully.
+    assert response.status_code == 200
+    query, params = queries[0]
+    # Neither column was written into the query.
+    assert "WHERE" not in query
+    assert "ORDER BY" not in query
+    assert params == ()
+
 # --------------------------------------------------------------------
 # Test Query page-ERROR: SQLite error on the display page.
 # --------------------------------------------------------------------
@@ -1552,6 +2132,121 @@ def test_export_csv_success(client):
     # Test that the CSV contains the second row.
     assert "Patient2,SCN1A" in content
 
+def test_export_csv_is_streamed(client):
+    """
+    This function tests that the export_csv() function in app.py streams the CSV to the User one line at a time, rather
+    than building the whole file in memory before it is sent.
+
+    :param: client: A fake test client generated by the 'client' pytest fixture.
+
+    :test outcome: Test that the response is streamed, with the Byte Order Mark and headers first and one row per line,
+                   as an attachment named after the database.
+    """
+    response = client.post(
+        "/export_csv",
+        data={
+            "columns": json.dumps(["patient_ID", "gene"]),
+            "rows": json.dumps([["Patient1", "ATP1A3"], ["Patient2", "SCN1A"]]),
+            "db_name": "test.db",
+        },
+    )
+
+    assert response.is_streamed
+    assert 'filename="test.db.csv"' in response.headers["Content-Disposition"]
+    assert response.get_data(as_text=True) == "\ufeffpatient_ID,gene\r\nPatient1,ATP1A3\r\nPatient2,SCN1A\r\n"
+
+def test_export_csv_writes_rows_in_batches(client, monkeypatch):
+    """
+    This function tests that the export_csv() function in app.py writes the rows of the table with writerows(), in
+    batches of CSV_EXPORT_BATCH_SIZE, and sends each batch to the User as it is written.
+
+    :param: client: A fake test client generated by the 'client' pytest fixture.
+       monkeypatch: An in-built pytest fixture that allows attributes and variables used in a software to be altered
+                    without changing the original attributes and variables being used.
+
+    :test outcome: Test that five rows are streamed as the headers, then batches of two, two and one rows.
+    """
+    monkeypatch.setattr("app.app.CSV_EXPORT_BATCH_SIZE", 2)
+
+    response = client.post(
+        "/export_csv",
+        data={
+            "columns": json.dumps(["patient_ID"]),
+            "rows": json.dumps([[f"Patient{i}"] for i in range(1, 6)]),
+            "db_name": "test.db",
+        },
+    )
+
+    assert [chunk.decode("utf-8") for chunk in response.iter_encoded()] == [
+        "\ufeffpatient_ID\r\n", "Patient1\r\nPatient2\r\n", "Patient3\r\nPatient4\r\n", "Patient5\r\n"]
+
+def test_export_csv_gzip(client):
+    """
+    This function tests that the export_csv() function in app.py compresses the CSV with gzip when the User's browser
+    accepts it, and sends it uncompressed otherwise.
+
+    :param: client: A fake test client generated by the 'client' pytest fixture.
+
+    :test outcome: Test that the response has the gzip Content-Encoding and decompresses into the CSV, and that the
+                   CSV is not compressed when gzip is not accepted.
+    """
+    data = {
+        "columns": json.dumps(["patient_ID", "gene"]),
+        "rows": json.dumps([["Patient1", "ATP1A3"], ["Patient2", "SCN1A"]]),
+        "db_name": "test.db",
+    }
+    csv_text = "\ufeffpatient_ID,gene\r\nPatient1,ATP1A3\r\nPatient2,SCN1A\r\n"
+
+    compressed = client.post("/export_csv", data=data, headers={"Accept-Encoding": "gzip, deflate"})
+    assert compressed.headers["Content-Encoding"] == "gzip"
+    assert "Accept-Encoding" in compressed.headers["Vary"]
+    assert gzip.decompress(compressed.data).decode("utf-8") == csv_text
+
+    uncompressed = client.post("/export_csv", data=data)
+    assert "Content-Encoding" not in uncompressed.headers
+    assert uncompressed.get_data(as_text=True) == csv_text
+
+def test_export_csv_larger_than_form_field_default(client):
+    """
+    This function tests that the export_csv() function in app.py exports a table larger than the 500 kB that Flask
+    allows a form field to be by default, as the table of a large gene query can be.
+
+    :param: client: A fake test client generated by the 'client' pytest fixture.
+
+    :test outcome: Test that a response status code of 200 is returned with every row in the CSV.
+    """
+    rows = [[f"Patient{i}", "x" * 50] for i in range(20000)]
+
+    response = client.post(
+        "/export_csv",
+        data={"columns": json.dumps(["patient_ID", "gene"]), "rows": json.dumps(rows), "db_name": "test.db"},
+    )
+
+    assert response.status_code == 200
+    assert len(response.get_data(as_text=True).splitlines()) == 20001
+
+def test_export_csv_rejects_oversized_table(client, monkeypatch):
+    """
+    This function tests that the export_csv() function in app.py rejects a table larger than MAX_EXPORT_BYTES before
+    the JSON is parsed.
+
+    :param: client: A fake test client generated by the 'client' pytest fixture.
+       monkeypatch: An in-built pytest fixture that allows attributes and variables used in a software to be altered
+                    without changing the original attributes and variables being used.
+
+    :test outcome: Test that "The table is too large to export" is returned.
+    """
+    monkeypatch.setattr("app.app.MAX_EXPORT_BYTES", 100)
+
+    response = client.post(
+        "/export_csv",
+        data={"columns": json.dumps(["a"]), "rows": json.dumps([["1"]] * 100), "db_name": "test.db"},
+        follow_redirects=True,
+    )
+
+    assert response.status_code == 200
+    assert b"The table is too large to export" in response.data
+
 # ----------------------------------------------------------------------------
 # Test CSV Export-POST: Unsuccessful JSON table conversion.
 # ----------------------------------------------------------------------------
@@ -1676,6 +2371,30 @@ def test_export_csv_row_length_mismatch_is_skipped(client):
     # Test that the values from the mismatched row do not appear in the encoded response proving that it was skipped.
     assert "1," not in content
 
+@pytest.mark.parametrize("rows", [5, [1, 2], {"a": 1}])
+def test_export_csv_malformed_rows(client, rows):
+    """
+    This function tests if the export_csv() function in app.py reports an error to the User when the rows sent from the
+    table are not a list of lists, instead of starting a download that breaks part of the way through.
+
+    :param: client: A fake test client generated by the 'client' pytest fixture.
+              rows: A value sent as the rows of the table, which is not a list of lists.
+
+    :test outcome: Test that the error message, "CSV Export Error: Failed to prepare CSV. CSV cannot be exported", is
+                   returned instead of a CSV.
+    """
+    response = client.post(
+        "/export_csv",
+        data={
+            "columns": json.dumps(["a", "b"]),
+            "rows": json.dumps(rows),
+            "db_name": "test.db",
+        },
+    )
+
+    assert response.mimetype != "text/csv"
+    assert b"CSV Export Error: Failed to prepare CSV. CSV cannot be exported" in response.data
+
 def test_export_csv_generic_exception(client, monkeypatch):
     """
     This function tests if the export_csv() function in app.py can appropriately handle an Exception being raised as a
@@ -1693,9 +2412,9 @@ def test_export_csv_generic_exception(client, monkeypatch):
                    Test that the error message, "CSV Export Error: Failed to prepare CSV. CSV cannot be exported", is
                    returned.
     """
-    # Monkeypatch simulates the generic Exception error which is raised when the send_file function is executed in
-    # app.py.
-    monkeypatch.setattr("app.app.send_file", raise_generic)
+    # Monkeypatch simulates the generic Exception error which is raised when the stream_with_context function is
+    # executed in app.py.
+    monkeypatch.setattr("app.app.stream_with_context", raise_generic)
     # The fake test client and request POST are used to submit a fake dataset to the app, to raise the Exception error.
     response = client.post(
         "/export_csv",
@@ -1786,17 +2505,13 @@ def test_dropdown_success(client, monkeypatch):
 
         def fetchall(self):
             """
-            Depending on the number of self.calls, this function returns a corresponding list of tuples.
+            This function returns the patient IDs, variants and gene symbols from the single dropdown query, each
+            tagged with the dropdown menu that it belongs to.
             """
-            # If self.calls is 1, the patient_ID column is being queried and 2 patient IDs are returned.
+            # If self.calls is 1, the dropdown query is being run: 2 patient IDs, a variant and a gene symbol are
+            # returned, ordered by tag.
             if self.calls == 1:
-                return [("Patient1",), ("Patient2",)]
-            # If self.calls is 2, the variants column is being queried and a variant is returned.
-            elif self.calls == 2:
-                return [("NC_000019.10:g.1",)]
-            # If self.calls is 3, the genes column is being queried and a gene symbol is returned.
-            elif self.calls == 3:
-                return [("ATP1A3",)]
+                return [("g", "ATP1A3"), ("p", "Patient1"), ("p", "Patient2"), ("v", "NC_000019.10:g.1")]
             # Otherwise no queries are being conducted and an empty list should be returned.
             return []
 
@@ -1823,11 +2538,17 @@ def test_dropdown_success(client, monkeypatch):
             """
             return DummyCursor()
 
+        def close(self):
+            """
+            Simulates closing the connection to the SQLite3 database.
+            """
+            pass
+
     # Monkeypatch also simulates a fake check to determine if the SQLite3 database exists using the os.path.exists
     # function from app.py.
     monkeypatch.setattr("app.app.os.path.exists", lambda *_: True)
     # Monkeypatch simulates the sqlite3.connect function from app.py to create a fake connection to a fake database.
-    monkeypatch.setattr("app.app.sqlite3.connect", lambda *_: DummyConnection())
+    monkeypatch.setattr("app.app.sqlite3.connect", lambda *_, **__: DummyConnection())
     # Use request GET to submit a request to generate dropdown menus on the query page for a selected database.
     response = client.get("/api/dropdown/test.db")
     # Test that a successful request and response were generated without breaking the app, denoted by a response status
@@ -1836,13 +2557,13 @@ def test_dropdown_success(client, monkeypatch):
     # Assign the responses from DummyCursor into the corresponding key values named after the column headers that were
     # queried.
     data = response.get_json()
-    # Test that the values from when self.call = 1 are assigned to the "patients" key, signifying the values that would
+    # Test that the values tagged 'p' are assigned to the "patients" key, signifying the values that would
     # be in the patient query dropdown menu.
     assert data["patients"] == ["Patient1", "Patient2"]
-    # Test that the values from when self.call = 2 are assigned to the "variants" key, signifying the values that would
+    # Test that the values tagged 'v' are assigned to the "variants" key, signifying the values that would
     # be in the variant query dropdown menu.
     assert data["variants"] == ["NC_000019.10:g.1"]
-    # Test that the values from when self.call = 3 are assigned to the "genes" key, signifying the values that would
+    # Test that the values tagged 'g' are assigned to the "genes" key, signifying the values that would
     # be in the gene query dropdown menu.
     assert data["genes"] == ["ATP1A3"]
 
@@ -1910,4 +2631,270 @@ def test_dropdown_generic_exception(client, monkeypatch):
     assert response.status_code == 200
     # Test that the corresponding error message is returned when the Exception error is raised while generating the
     # dropdown menus.
-    assert b"Dropdown Menu Error: Dropdown menus do not work" in response.data
\ No newline at end of file
+    assert b"Dropdown Menu Error: Dropdown menus do not work" in response.data
+# ----------------------------------------------------------------------------------------
+# Test Query page-GET: Dropdown menus are cached until the database file is modified.
+# ----------------------------------------------------------------------------------------
+def test_dropdown_cached_until_db_modified(client, monkeypatch, tmp_path):
+    """
+    This function tests if the dropdown_data() function in app.py reuses the dropdown menus of a database that has not
+    been modified, and reads them from the database again once it has been modified.
+
+    :param: client: A fake test client generated by the 'client' pytest fixture.
+       monkeypatch: An in-built pytest fixture that allows attributes and variables used in a software to be altered
+                    without changing the original attributes and variables being used.
+          tmp_path: An in-built pytest fixture that provides a temporary directory for the test database.
+
+    :test outcome: Test that the database is only read once while it is unchanged.
+                   Test that a patient added to the database appears in the dropdown menu.
+    """
+    # Create a database with one patient, in a temporary 'databases' folder.
+    db_path = tmp_path / "test.db"
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE patient_variant (patient_ID TEXT, variant TEXT)")
+    conn.execute("CREATE TABLE variant_annotations (variant_NC TEXT, gene TEXT)")
+    conn.execute("INSERT INTO patient_variant VALUES ('Patient1', 'NC_1')")
+    conn.execute("INSERT INTO variant_annotations VALUES ('NC_1', 'GRN')")
+    conn.commit()
+    conn.close()
+    monkeypatch.setitem(app.config, "db_upload_folder", str(tmp_path))
+
+    # Count the number of times that the database is read.
+    reads = []
+    real_read_connection = app_module.read_connection
+
+    def counting_read_connection(path):
+        reads.append(path)
+        return real_read_connection(path)
+
+    monkeypatch.setattr(app_module, "read_connection", counting_read_connection)
+
+    # The database is only read the first time the dropdown menus are requested.
+    assert client.get("/api/dropdown/test.db").get_json()["patients"] == ["Patient1"]
+    assert client.get("/api/dropdown/test.db").get_json()["patients"] == ["Patient1"]
+    assert len(reads) == 1
+
+    # Add a patient to the database and change the modification time of the database file.
+    conn = sqlite3.connect(db_path)
+    conn.execute("INSERT INTO patient_variant VALUES ('Patient2', 'NC_1')")
+    conn.commit()
+    conn.close()
+    os.utime(db_path, ns=(0, 0))
+
+    # The dropdown menus are read from the modified database.
+    assert client.get("/api/dropdown/test.db").get_json()["patients"] == ["Patient1", "Patient2"]
+    assert len(reads) == 2
+
+# ----------------------------------------------------------------------------------------
+# Test Display page-GET: Filter values are retrieved for every column with one query.
+# ----------------------------------------------------------------------------------------
+def test_display_filter_values_single_query(client, monkeypatch, tmp_path):
+    """
+    This function tests if the display_database() function in app.py retrieves the distinct filter values under every
+    column with a single query, in the same order as each column would be ordered on its own.
+
+    :param: client: A fake test client generated by the 'client' pytest fixture.
+       monkeypatch: An in-built pytest fixture that allows attributes and variables used in a software to be altered
+                    without changing the original attributes and variables being used.
+          tmp_path: An in-built pytest fixture that provides a temporary directory for the test database.
+
+    :test outcome: Test that only one query is executed to retrieve the filter values.
+                   Test that the distinct values under each column are listed once, in ascending order.
+    """
+    # Create a database with two patients who share a variant.
+    db_path = tmp_path / "test.db"
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE patient_variant (No INTEGER PRIMARY KEY, patient_ID TEXT, variant TEXT)")
+    conn.execute("CREATE TABLE variant_annotations (No INTEGER PRIMARY KEY, variant_NC TEXT, variant_NM TEXT, "
+                 "variant_NP TEXT, gene TEXT, HGNC_ID INTEGER, Classification TEXT, Conditions TEXT, Stars TEXT, "
+                 "Review_status TEXT)")
+    conn.executemany("INSERT INTO patient_variant (patient_ID, variant) VALUES (?, ?)",
+                     [("Patient2", "NC_1"), ("Patient1", "NC_1"), ("Patient1", "NC_2")])
+    conn.executemany("INSERT INTO variant_annotations (variant_NC, variant_NM, variant_NP, gene, HGNC_ID, "
+                     "Classification, Conditions, Stars, Review_status) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                     [("NC_1", "NM_1", "NP_1", "GRN", 4601, "Pathogenic", "FTD", "★", "single submitter"),
+                      ("NC_2", "NM_2", "NP_2", "ATP1A3", 801, "Benign", None, "★★", "multiple submitters")])
+    conn.commit()
+    conn.close()
+    monkeypatch.setitem(app.config, "db_upload_folder", str(tmp_path))
+
+    # Capture the filter values passed to the template.
+    captured = {}
+
+    def fake_render_template(template, **context):
+        captured.update(context)
+        return ""
+
+    monkeypatch.setattr(app_module, "stream_template", fake_render_template)
+
+    # Count the number of queries executed to retrieve the filter values.
+    executed = []
+    real_read_connection = app_module.read_connection
+
+    class CountingConn:
+        def __init__(self, conn):
+            self.conn = conn
+
+        def cursor(self):
+            cur = self.conn.cursor()
+            real_execute = cur.execute
+
+            class CountingCursor:
+                def execute(self, *args):
+                    executed.append(args[0])
+                    return real_execute(*args)
+
+                def fetchall(self):
+                    return cur.fetchall()
+
+            return CountingCursor()
+
+    class counting_read_connection:
+        def __init__(self, path):
+            self.context = real_read_connection(path)
+
+        def __enter__(self):
+            return CountingConn(self.context.__enter__())
+
+        def __exit__(self, *exc):
+            return self.context.__exit__(*exc)
+
+    monkeypatch.setattr(app_module, "read_connection", counting_read_connection)
+
+    client.get("/display/test.db")
+
+    filter_values = captured["filter_values"]
+    assert len(executed) == 1
+    assert filter_values["patient_ID"] == ["Patient1", "Patient2"]
+    assert filter_values["gene"] == ["ATP1A3", "GRN"]
+    assert filter_values["HGNC_ID"] == [801, 4601]
+    assert filter_values["Conditions"] == ["FTD"]
+
+# ----------------------------------------------------------------------------------------
+# Test Display page-Export: The filtered table is streamed into a CSV.
+# ----------------------------------------------------------------------------------------
+def test_export_display_csv_streams_filtered_rows(client, monkeypatch, tmp_path):
+    """
+    This function tests if the export_display_csv() function in app.py exports the rows of the display page table
+    that match the filter selected by the User, sorted by the selected column, in CSV format.
+
+    :param: client: A fake test client generated by the 'client' pytest fixture.
+       monkeypatch: An in-built pytest fixture that allows attributes and variables used in a software to be altered
+                    without changing the original attributes and variables being used.
+          tmp_path: An in-built pytest fixture that provides a temporary directory for the test database.
+
+    :test outcome: Test that a CSV attachment is returned (status code 200).
+                   Test that the CSV starts with the Byte Order Mark and the column headers.
+                   Test that only the filtered rows are exported, in the sorted order.
+    """
+    # Create a database with three patients, two of whom have a pathogenic variant.
+    db_path = tmp_path / "test.db"
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE patient_variant (No INTEGER PRIMARY KEY, patient_ID TEXT, variant TEXT)")
+    conn.execute("CREATE TABLE variant_annotations (No INTEGER PRIMARY KEY, variant_NC TEXT, variant_NM TEXT, "
+                 "variant_NP TEXT, gene TEXT, HGNC_ID INTEGER, Classification TEXT, Conditions TEXT, Stars TEXT, "
+                 "Review_status TEXT)")
+    conn.executemany("INSERT INTO patient_variant (patient_ID, variant) VALUES (?, ?)",
+                     [("Patient3", "NC_1"), ("Patient1", "NC_1"), ("Patient2", "NC_2")])
+    conn.executemany("INSERT INTO variant_annotations (variant_NC, variant_NM, variant_NP, gene, HGNC_ID, "
+                     "Classification, Conditions, Stars, Review_status) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                     [("NC_1", "NM_1", "NP_1", "GRN", 4601, "Pathogenic", "FTD, type 2", "★", "single submitter"),
+                      ("NC_2", "NM_2", "NP_2", "ATP1A3", 801, "Benign", "None", "★★", "multiple submitters")])
+    conn.commit()
+    conn.close()
+    monkeypatch.setitem(app.config, "db_upload_folder", str(tmp_path))
+
+    response = client.get(
+        "/export/test.db.csv",
+        query_string={"filter_column": "Classification", "filter_value": "Pathogenic", "sort_column": "patient_ID"},
+    )
+
+    assert response.status_code == 200
+    assert response.mimetype == "text/csv"
+    assert "attachment" in response.headers["Content-Disposition"]
+
+    lines = response.get_data(as_text=True).splitlines()
+    assert lines[0] == ("\ufeffpatient_ID,variant_NC,variant_NM,variant_NP,gene,HGNC_ID,Classification,Conditions,"
+                        "Stars,Review_status")
+    assert lines[1].startswith('Patient1,NC_1,NM_1,NP_1,GRN,4601,Pathogenic,"FTD, type 2"')
+    assert lines[2].startswith("Patient3,")
+    assert len(lines) == 3
+
+def test_export_display_csv_applies_read_pragmas(client, monkeypatch, tmp_path):
+    """
+    This function tests that the export_display_csv() function in app.py applies the READ_PRAGMAS to the connection
+    that it opens for the export, before the table is queried.
+
+    :param: client: A fake test client generated by the 'client' pytest fixture.
+       monkeypatch: An in-built pytest fixture that allows attributes and variables used in a software to be altered
+                    without changing the original attributes and variables being used.
+          tmp_path: An in-built pytest fixture that provides a temporary directory for the test database.
+
+    :test outcome: Test that every statement in READ_PRAGMAS is run on the export connection before the SELECT.
+    """
+    # Create an empty database with the tables of the display page.
+    conn = sqlite3.connect(tmp_path / "test.db")
+    conn.execute("CREATE TABLE patient_variant (No INTEGER PRIMARY KEY, patient_ID TEXT, variant TEXT)")
+    conn.execute("CREATE TABLE variant_annotations (No INTEGER PRIMARY KEY, variant_NC TEXT, variant_NM TEXT, "
+                 "variant_NP TEXT, gene TEXT, HGNC_ID INTEGER, Classification TEXT, Conditions TEXT, Stars TEXT, "
+                 "Review_status TEXT)")
+    conn.commit()
+    conn.close()
+    monkeypatch.setitem(app.config, "db_upload_folder", str(tmp_path))
+
+    # Record every statement run on the connection opened by the export.
+    statements = []
+    real_connect = sqlite3.connect
+
+    def traced_connect(*args, **kwargs):
+        traced = real_connect(*args, **kwargs)
+        traced.set_trace_callback(statements.append)
+        return traced
+
+    monkeypatch.setattr("app.app.sqlite3.connect", traced_connect)
+
+    response = client.get("/export/test.db.csv")
+    assert response.status_code == 200
+    response.get_data()
+
+    # The PRAGMAs are run first, in order, followed by the query.
+    assert statements[:len(READ_PRAGMAS)] == list(READ_PRAGMAS)
+    assert statements[len(READ_PRAGMAS)].lstrip().upper().startswith("SELECT")
+
+
+def test_export_display_csv_not_modified(client, monkeypatch, tmp_path):
+    """
+    This function tests that the export_display_csv() function in app.py tells the User's browser to reuse a CSV it
+    has already downloaded, when neither the database nor the query have changed since.
+
+    :param: client: A fake test client generated by the 'client' pytest fixture.
+       monkeypatch: An in-built pytest fixture that allows attributes and variables used in a software to be altered
+                    without changing the original attributes and variables being used.
+          tmp_path: An in-built pytest fixture that provides a temporary directory for the test database.
+
+    :test outcome: Test that the export has an ETag, that the same export with that ETag returns the status code 304
+                   without a body, and that a different query returns the CSV again.
+    """
+    # Create an empty database with the tables of the display page.
+    conn = sqlite3.connect(tmp_path / "test.db")
+    conn.execute("CREATE TABLE patient_variant (No INTEGER PRIMARY KEY, patient_ID TEXT, variant TEXT)")
+    conn.execute("CREATE TABLE variant_annotations (No INTEGER PRIMARY KEY, variant_NC TEXT, variant_NM TEXT, "
+                 "variant_NP TEXT, gene TEXT, HGNC_ID INTEGER, Classification TEXT, Conditions TEXT, Stars TEXT, "
+                 "Review_status TEXT)")
+    conn.commit()
+    conn.close()
+    monkeypatch.setitem(app.config, "db_upload_folder", str(tmp_path))
+
+    first = client.get("/export/test.db.csv")
+    etag = first.headers["ETag"]
+    assert first.status_code == 200
+    assert first.get_data(as_text=True).startswith("\ufeffpatient_ID")
+
+    repeat = client.get("/export/test.db.csv", headers={"If-None-Match": etag})
+    assert repeat.status_code == 304
+    assert repeat.data == b""
+
+    sorted_export = client.get("/export/test.db.csv", query_string={"sort_column": "gene"},
+                               headers={"If-None-Match": etag})
+    assert sorted_export.status_code == 200
+    assert sorted_export.get_data(as_text=True).startswith("\ufeffpatient_ID")
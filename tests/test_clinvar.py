@@ -1341,4 +1341,53 @@ def test_unexpected_exception(tmp_path, monkeypatch, caplog):
     assert any(
         f"ClinVar_Download: Failed to download variant summary records from" in rec.message
         for rec in caplog.records
-    )
\ No newline at end of file
+    )
+
+# ----------------------------------------------------------------------------------------------
+# clinvar_annotations with a shared connection from connect_clinvar_db
+# ----------------------------------------------------------------------------------------------
+def test_clinvar_annotations_shared_connection(tmp_path, monkeypatch):
+    """
+    This function tests that clinvar_annotations uses the connection passed to it, instead of connecting to clinvar.db
+    itself, and that the connection is left open so that it can be used for the next variant.
+    """
+    # Create a fake clinvar.db with a single record.
+    conn = sqlite3.connect(tmp_path / "clinvar.db")
+    conn.execute("CREATE TABLE clinvar (nc_accession TEXT, nm_hgvs TEXT, clinical_significance TEXT, "
+                 "conditions TEXT, stars TEXT, review_status TEXT)")
+    conn.execute("INSERT INTO clinvar VALUES (?, ?, ?, ?, ?, ?)",
+                 ("NC_000011.10", "NM_000360.4:c.1442G>A", "Pathogenic", "Condition1", "★",
+                  "criteria provided, single submitter"))
+    conn.commit()
+
+    # Fail the test if clinvar_annotations tries to open its own connection.
+    def fail_connect(*args, **kwargs):
+        raise AssertionError("sqlite3.connect should not be called")
+
+    monkeypatch.setattr(mod.sqlite3, "connect", fail_connect)
+
+    # Query clinvar.db twice using the same connection.
+    first = clinvar_annotations("NC_000011.10:g.2164285C>T", "NM_000360.4:c.1442G>A", conn=conn)
+    second = clinvar_annotations("NC_000011.10:g.2164285C>T", "NM_000360.4:c.1442G>A", conn=conn)
+
+    # Test that both queries returned the record.
+    assert first["classification"] == "Pathogenic"
+    assert second == first
+
+    # Test that the connection is still open.
+    assert conn.execute("SELECT COUNT(*) FROM clinvar").fetchone()[0] == 1
+    conn.close()
+
+
+def test_connect_clinvar_db_missing_database(tmp_path, monkeypatch):
+    """
+    This function tests that connect_clinvar_db returns None, without creating an empty database, when clinvar.db has
+    not been downloaded.
+    """
+    # Redirect clinvar_functions.py to a fake directory without clinvar.db.
+    fake_file = tmp_path / "tools" / "modules" / "clinvar_functions.py"
+    monkeypatch.setattr(mod, "__file__", str(fake_file))
+
+    # Test that no connection is returned and clinvar.db was not created.
+    assert mod.connect_clinvar_db() is None
+    assert not (tmp_path / "app" / "clinvar" / "clinvar.db").exists()
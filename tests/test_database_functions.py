@@ -13,10 +13,12 @@ subsequently refined by the developer.
 
 import os
 import sqlite3
+import time
 import pytest
 from unittest.mock import patch, MagicMock
 from flask import Flask, get_flashed_messages
 import tools.modules.database_functions as db_mod
+import tools.utils.vv_cache as vv_cache
 from tools.modules.database_functions import query_db
 from tools.modules.database_functions import patient_variant_table
 from tools.modules.database_functions import variant_annotations_table
@@ -35,6 +37,23 @@ def app():
     return app
 
 
+@pytest.fixture(autouse=True)
+def vv_cache_path(tmp_path, monkeypatch):
+    """Store the VariantValidator cache in a temporary directory for each test."""
+    path = tmp_path / "cache" / "vv_cache.db"
+    monkeypatch.setattr(vv_cache, "VV_CACHE_PATH", str(path))
+    return path
+
+
+@pytest.fixture(autouse=True)
+def no_vv_batch(monkeypatch):
+    """
+    Stop fetch_vv_batch from querying VariantValidator, so that every
+    variant is passed to the (mocked) fetch_vv.
+    """
+    monkeypatch.setattr(db_mod, "fetch_vv_batch", lambda variants: {})
+
+
 @pytest.fixture
 def temp_variants_dir(tmp_path):
     """Temporary directory that will act as the 'temp' upload folder."""
@@ -243,6 +262,35 @@ def test_query_db_returns_all_rows(tmp_path):
     assert rows[0]["name"] == "Alice"
     assert rows[1]["name"] == "Bob"
 
+def test_query_db_returns_tuples(tmp_path):
+    """
+    Test that `query_db` returns plain tuples when `as_tuples=True`, and
+    that the reused connection still returns sqlite3.Row objects to the
+    next query.
+
+    Parameters
+    ----------
+    tmp_path : pathlib.Path
+        Temporary path provided by pytest for creating test files.
+    """
+    # Create a temporary database file with two rows
+    db_file = tmp_path / "q_tuples.db"
+    conn = sqlite3.connect(db_file)
+    conn.execute("CREATE TABLE t (id INTEGER PRIMARY KEY, name TEXT)")
+    conn.executemany("INSERT INTO t (name) VALUES (?)", [("Alice",), ("Bob",)])
+    conn.commit()
+    conn.close()
+
+    # Query all rows as tuples
+    rows = db_mod.query_db(str(db_file), "SELECT id, name FROM t ORDER BY id", as_tuples=True)
+
+    # Assert that the rows are tuples in column order
+    assert rows == [(1, "Alice"), (2, "Bob")]
+
+    # Assert that the next query still returns sqlite3.Row objects
+    row = db_mod.query_db(str(db_file), "SELECT name FROM t ORDER BY id", one=True)
+    assert isinstance(row, sqlite3.Row)
+
 def test_query_db_returns_one_row(tmp_path):
     """
     Test that `query_db` returns a single sqlite3.Row when `one=True`.
@@ -497,7 +545,7 @@ def test_variant_annotations_table_inserts_annotations(
     monkeypatch.setattr(
         db_mod,
         "clinvar_annotations",
-        lambda nc, nm: {
+        lambda nc, nm, conn=None: {
             "classification": "Pathogenic",
             "conditions": "Some condition",
             "stars": "★★",
@@ -623,7 +671,7 @@ def test_full_flow_creates_valid_schema_and_query(
     monkeypatch.setattr(db_mod, "fetch_vv", fake_fetch_vv)
 
     # Mock clinvar_annotations to return controlled annotation data
-    def fake_clinvar_annotations(nc, nm):
+    def fake_clinvar_annotations(nc, nm, conn=None):
         return {
             "classification": "Benign",
             "conditions": "Unknown",
@@ -974,18 +1022,17 @@ def test_patient_variant_table_generic_exception_on_insert(tmp_path):
         mock_connect.return_value = fake_conn
 
         # Side effect function to control cursor.execute behaviour
-        # - Raise a generic Exception on INSERT
         # - Simulate an empty table when SELECT COUNT is executed
         def execute_side_effect(*args, **kwargs):
-            if "INSERT" in args[0]:
-                raise Exception("generic insert fail")
-            elif "SELECT COUNT" in args[0]:
+            if "SELECT COUNT" in args[0]:
                 fake_cursor.fetchone.return_value = [0]
                 return
             return None
 
         # Apply the side effect to cursor.execute
         fake_cursor.execute.side_effect = execute_side_effect
+        # The variants from each file are inserted together with executemany
+        fake_cursor.executemany.side_effect = Exception("generic insert fail")
 
         # Run the function under test
         result = db_mod.patient_variant_table(str(temp_dir), db_name)
@@ -997,10 +1044,13 @@ def test_patient_variant_table_generic_exception_on_insert(tmp_path):
         # describing the failed insert attempt
         flash_messages = [call[0][0] for call in mock_flash.call_args_list]
         assert any(
-            "Could not add Patient2 and NC_000001.1:g.123A>G" in msg
+            "Could not add Patient2 and the variants from Patient2.vcf" in msg
             for msg in flash_messages
         )
 
+        # The variants from the file are discarded
+        fake_conn.rollback.assert_called_once()
+
 
 @pytest.mark.parametrize("exception_type, expected_flash", [
     (sqlite3.OperationalError, "❌ patient_variant_table: SQLite3 Error"),
@@ -1049,6 +1099,10 @@ def test_patient_variant_table_db_check_exceptions(app, tmp_path, monkeypatch, e
                 raise exception_type("Simulated exception for testing")
             return None
 
+        # Accept the variants added to the patient_variant table
+        def executemany(self, *args, **kwargs):
+            return None
+
         # Return zero rows if fetchone is called (defensive fallback)
         def fetchone(self):
             return [0]
@@ -1115,7 +1169,7 @@ def test_variant_annotations_table_db_creation_exceptions(app, tmp_path, monkeyp
     monkeypatch.setattr(
         db_mod,
         "clinvar_annotations",
-        lambda nc, nm: {
+        lambda nc, nm, conn=None: {
             "classification": "Pathogenic",
             "conditions": "TestCond",
             "stars": "★",
@@ -1239,8 +1293,8 @@ def test_variant_annotations_table_fetch_vv_exceptions(app, tmp_path, fetch_vv_s
 
 @pytest.mark.parametrize("clinvar_side_effect, expected_flash", [
     (Exception("clinvar failed"), "❌ Unable to query clinvar.db"),
-    (lambda nc, nm: None, "❌ Variant summary record could not be found in clinvar.db"),
-    (lambda nc, nm: "Invalid string response", "Variant not added to"),
+    (lambda nc, nm, conn=None: None, "❌ Variant summary record could not be found in clinvar.db"),
+    (lambda nc, nm, conn=None: "Invalid string response", "Variant not added to"),
 ])
 def test_variant_annotations_table_clinvar_exceptions(app, tmp_path, clinvar_side_effect, expected_flash):
     """
@@ -1313,8 +1367,8 @@ def test_variant_annotations_table_clinvar_exceptions(app, tmp_path, clinvar_sid
     "clinvar_side_effect, expected_fragment",
     [
         (Exception("clinvar_annotations failed"), "❌ Unable to query clinvar.db"),
-        (lambda nc, nm: {}, "❌ Variant summary record could not be found in clinvar.db"),
-        (lambda nc, nm: "Invalid string response", "Invalid string response"),
+        (lambda nc, nm, conn=None: {}, "❌ Variant summary record could not be found in clinvar.db"),
+        (lambda nc, nm, conn=None: "Invalid string response", "Invalid string response"),
     ]
 )
 
@@ -1519,6 +1573,32 @@ def test_validate_database_success(app, tmp_path):
         # Assert that no flash messages were triggered
         assert get_flashed_messages() == []
 
+
+def test_validate_database_creates_indexes(app, tmp_path):
+    """
+    Test that `validate_database` adds the indexes used by the flask app
+    queries to an uploaded database, and runs ANALYZE.
+    """
+    db_path = tmp_path / "valid.db"
+    create_db(db_path, {
+        "patient_variant": {"No", "patient_ID", "variant"},
+        "variant_annotations": {
+            "No", "variant_NC", "variant_NM", "variant_NP", "gene", "HGNC_ID",
+            "Classification", "Conditions", "Stars", "Review_status"
+        }
+    })
+
+    with app.test_request_context("/"):
+        assert validate_database(str(db_path)) is True
+
+    conn = sqlite3.connect(db_path)
+    indexes = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type='index'")}
+    tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+    conn.close()
+
+    assert {"idx_pv_variant", "idx_pv_patient", "idx_va_nc", "idx_va_gene", "idx_va_hgnc"} <= indexes
+    assert "sqlite_stat1" in tables
+
 def test_validate_database_missing_headers(app, tmp_path):
     """
     Test that `validate_database` returns False and flashes a warning
@@ -1558,6 +1638,31 @@ def test_validate_database_missing_headers(app, tmp_path):
         # Assert that a flash message contains the expected warning about missing headers
         assert any("⚠ Inappropriate headers" in msg for msg in flashes)
 
+def test_validate_database_rejects_non_sqlite_file(app, tmp_path):
+    """
+    Test that `validate_database` returns False and flashes a warning,
+    without connecting to the file, when the uploaded file has a '.db'
+    extension but does not begin with the SQLite3 header.
+
+    Args:
+        app: Flask app fixture, used to provide a test request context for flashing messages.
+        tmp_path: pytest temporary path fixture for creating temporary files.
+    """
+    # Write a text file with a '.db' extension
+    db_path = tmp_path / "not_a_database.db"
+    db_path.write_text("patient_ID,variant\n")
+
+    # Fail the test if the file is opened with SQLite3
+    with patch("tools.modules.database_functions.sqlite3.connect") as mock_connect:
+        with app.test_request_context("/"):
+            result = validate_database(str(db_path))
+            flashes = get_flashed_messages()
+
+    # Assert that the file is rejected before it is opened as a database
+    assert result is False
+    mock_connect.assert_not_called()
+    assert any("is not an SQLite3 database" in msg for msg in flashes)
+
 def test_validate_database_sqlite_exceptions(app, tmp_path):
     """
     Test that `validate_database` handles SQLite exceptions gracefully.
@@ -1618,4 +1723,546 @@ def test_validate_database_generic_exception(app, tmp_path):
             assert result is False
 
             # Assert that a flash message indicates a generic database validation error
-            assert any("Database Validation Error" in msg for msg in flashes)
\ No newline at end of file
+            assert any("Database Validation Error" in msg for msg in flashes)
+
+# -------------------------------------------------------------------------
+# Unit tests for fetch_vv_concurrently
+# -------------------------------------------------------------------------
+
+
+def test_fetch_vv_concurrently_returns_response_per_variant(monkeypatch):
+    """
+    Test that `fetch_vv_concurrently` queries each distinct variant once
+    and returns the response from fetch_vv for every variant.
+
+    Exceptions raised by fetch_vv should be returned in place of the
+    response, rather than being raised.
+    """
+    # Record the variants that fetch_vv was called with
+    calls = []
+
+    # Mock fetch_vv to return a tuple, or raise an exception for 'bad'
+    def fake_fetch_vv(variant):
+        calls.append(variant)
+        if variant == "bad":
+            raise ConnectionError("VariantValidator down")
+        return (f"NC_{variant}", "NM_", "NP_", "GENE", 1)
+
+    monkeypatch.setattr(db_mod, "fetch_vv", fake_fetch_vv)
+
+    # Run the function with a duplicated variant
+    result = db_mod.fetch_vv_concurrently(["varA", "bad", "varB", "varA"])
+
+    # Each distinct variant should only be queried once
+    assert sorted(calls) == ["bad", "varA", "varB"]
+
+    # Responses should be keyed by variant
+    assert result["varA"][0] == "NC_varA"
+    assert result["varB"][0] == "NC_varB"
+
+    # The exception should be stored, not raised
+    assert isinstance(result["bad"], ConnectionError)
+
+
+def test_fetch_vv_concurrently_keeps_flash_messages(app, monkeypatch):
+    """
+    Test that flash messages sent by fetch_vv from the worker threads
+    are available to the request that called `fetch_vv_concurrently`.
+    """
+    # Mock fetch_vv to flash a message, as fetch_vv does for irregular responses
+    def fake_fetch_vv(variant):
+        db_mod.flash(f"{variant}: warning")
+        return "warning"
+
+    monkeypatch.setattr(db_mod, "fetch_vv", fake_fetch_vv)
+
+    # Run the function inside a Flask test request context
+    with app.test_request_context("/"):
+        db_mod.fetch_vv_concurrently(["varA", "varB"])
+        messages = get_flashed_messages()
+
+    # Both flash messages should be present
+    assert sorted(messages) == ["varA: warning", "varB: warning"]
+
+
+def test_fetch_vv_concurrently_flashes_every_worker_message(app, monkeypatch):
+    """
+    Test that no flash messages are lost when many worker threads flash
+    at the same time, including from a fetch_vv call that then raises,
+    and that the messages are flashed in the order of the variants.
+    """
+    variants = [f"var{i}" for i in range(12)]
+
+    # Mock fetch_vv to wait and then flash a message, with the first variants waiting longest, so that the workers
+    # overlap and finish in the reverse order
+    def fake_fetch_vv(variant):
+        time.sleep((12 - int(variant[3:])) * 0.005)
+        db_mod.flash(f"{variant}: warning")
+        if variant == "var3":
+            raise ConnectionError("VariantValidator down")
+        return "warning"
+
+    monkeypatch.setattr(db_mod, "fetch_vv", fake_fetch_vv)
+
+    with app.test_request_context("/"):
+        result = db_mod.fetch_vv_concurrently(variants)
+        messages = get_flashed_messages()
+
+    assert messages == [f"{variant}: warning" for variant in variants]
+    assert isinstance(result["var3"], ConnectionError)
+
+
+def test_fetch_vv_concurrently_uses_cache(monkeypatch):
+    """
+    Test that `fetch_vv_concurrently` does not query VariantValidator
+    again for a variant whose response has been stored in the cache,
+    and that error messages are not stored.
+    """
+    # Record the variants that fetch_vv was called with
+    calls = []
+
+    # Mock fetch_vv to return a tuple for 'varA' and an error message otherwise
+    def fake_fetch_vv(variant):
+        calls.append(variant)
+        if variant == "varA":
+            return ("NC_000001.1:g.1A>G", "NM_dummy", "NP_dummy", "GENE1", 1111)
+        return "VariantValidator unavailable"
+
+    monkeypatch.setattr(db_mod, "fetch_vv", fake_fetch_vv)
+
+    # The first call queries both variants
+    first = db_mod.fetch_vv_concurrently(["varA", "varB"])
+    assert sorted(calls) == ["varA", "varB"]
+
+    # The second call only queries the variant whose response was an error
+    calls.clear()
+    second = db_mod.fetch_vv_concurrently(["varA", "varB"])
+    assert calls == ["varB"]
+
+    # The cached response is identical to the original response
+    assert second["varA"] == first["varA"]
+
+
+def test_patient_variant_table_queries_all_files_in_one_pool(
+    app, temp_variants_dir, db_name, db_path, monkeypatch
+):
+    """
+    Test that `patient_variant_table` sends the variants from every
+    uploaded file to `fetch_vv_concurrently` in a single call, and
+    still attributes each variant to the correct patient.
+    """
+    # Create two dummy variant files
+    (temp_variants_dir / "Patient1.vcf").write_text("## dummy content\n")
+    (temp_variants_dir / "Patient2.vcf").write_text("## dummy content\n")
+
+    # Mock variant_parser to return a different variant for each file
+    monkeypatch.setattr(
+        db_mod, "variant_parser",
+        lambda path: ["varA"] if path.endswith("Patient1.vcf") else ["varB"],
+    )
+
+    # Record each call to fetch_vv_concurrently
+    calls = []
+
+    def fake_fetch_vv_concurrently(variant_list):
+        calls.append(sorted(variant_list))
+        return {
+            "varA": ("NC_000001.1:g.1A>G", "NM_dummy", "NP_dummy", "GENE1", 1111),
+            "varB": ("NC_000002.1:g.2C>T", "NM_dummy2", "NP_dummy2", "GENE2", 2222),
+        }
+
+    monkeypatch.setattr(db_mod, "fetch_vv_concurrently", fake_fetch_vv_concurrently)
+
+    # Remove existing database if it exists
+    if os.path.exists(db_path):
+        os.remove(db_path)
+
+    # Run patient_variant_table inside a Flask test request context
+    with app.test_request_context("/"):
+        db_mod.patient_variant_table(str(temp_variants_dir), db_name)
+
+    # Both files' variants are sent together
+    assert calls == [["varA", "varB"]]
+
+    # Each variant is stored against the patient it was parsed from
+    conn = sqlite3.connect(db_path)
+    rows = conn.execute("SELECT patient_ID, variant FROM patient_variant ORDER BY patient_ID").fetchall()
+    conn.close()
+    os.remove(db_path)
+
+    assert rows == [("Patient1", "NC_000001.1:g.1A>G"), ("Patient2", "NC_000002.1:g.2C>T")]
+
+
+def test_fetch_vv_concurrently_only_queries_unresolved_variants(monkeypatch):
+    """
+    Test that variants resolved by `fetch_vv_batch` are not sent to
+    `fetch_vv`, and that the remaining variants are.
+    """
+    # Mock fetch_vv_batch to resolve 'varA' only
+    monkeypatch.setattr(
+        db_mod, "fetch_vv_batch",
+        lambda variants: {"varA": ("NC_000001.1:g.1A>G", "NM_dummy", "NP_dummy", "GENE1", 1111)},
+    )
+
+    # Record the variants that fetch_vv was called with
+    calls = []
+
+    def fake_fetch_vv(variant):
+        calls.append(variant)
+        return "VariantValidator unavailable"
+
+    monkeypatch.setattr(db_mod, "fetch_vv", fake_fetch_vv)
+
+    result = db_mod.fetch_vv_concurrently(["varA", "varB"])
+
+    # Only the unresolved variant is queried individually
+    assert calls == ["varB"]
+    assert result["varA"][0] == "NC_000001.1:g.1A>G"
+    assert result["varB"] == "VariantValidator unavailable"
+
+
+def test_patient_variant_table_commits_after_each_file(
+    app, temp_variants_dir, db_name, db_path, monkeypatch
+):
+    """
+    Test that `patient_variant_table` commits the variants from each
+    file as soon as that file has been processed, so that completed
+    files are kept if a later file cannot be processed.
+    """
+    # Create two dummy variant files
+    (temp_variants_dir / "Patient1.vcf").write_text("## dummy content\n")
+    (temp_variants_dir / "Patient2.vcf").write_text("## dummy content\n")
+
+    # Mock variant_parser to return a different variant for each file
+    monkeypatch.setattr(
+        db_mod, "variant_parser",
+        lambda path: ["varA"] if path.endswith("Patient1.vcf") else ["varB"],
+    )
+    monkeypatch.setattr(db_mod, "fetch_vv_concurrently", lambda variant_list: {
+        "varA": ("NC_000001.1:g.1A>G", "NM_dummy", "NP_dummy", "GENE1", 1111),
+        "varB": ("NC_000002.1:g.2C>T", "NM_dummy2", "NP_dummy2", "GENE2", 2222),
+    })
+
+    # Wrap the real connection to record the number of rows stored at each commit
+    real_connect = sqlite3.connect
+    committed = []
+
+    class RecordingConn:
+        def __init__(self, *args, **kwargs):
+            self._conn = real_connect(*args, **kwargs)
+
+        def commit(self):
+            self._conn.commit()
+            committed.append(self._conn.execute("SELECT COUNT(*) FROM patient_variant").fetchone()[0])
+
+        def __getattr__(self, name):
+            return getattr(self._conn, name)
+
+    monkeypatch.setattr(db_mod.sqlite3, "connect", RecordingConn)
+
+    # Remove existing database if it exists
+    if os.path.exists(db_path):
+        os.remove(db_path)
+
+    with app.test_request_context("/"):
+        db_mod.patient_variant_table(str(temp_variants_dir), db_name)
+
+    monkeypatch.undo()
+    os.remove(db_path)
+
+    # One commit after each file, then the final commit
+    assert committed == [1, 2, 2]
+
+
+def test_patient_variant_table_indexes_after_insert(
+    app, temp_variants_dir, db_name, db_path, monkeypatch
+):
+    """
+    Test that `patient_variant_table` creates the indexes on a new
+    patient_variant table after its rows have been inserted, and that
+    the indexes are saved to the database.
+    """
+    (temp_variants_dir / "Patient1.vcf").write_text("## dummy content\n")
+
+    monkeypatch.setattr(db_mod, "variant_parser", lambda path: ["varA"])
+    monkeypatch.setattr(db_mod, "fetch_vv_concurrently", lambda variant_list: {
+        "varA": ("NC_000001.1:g.1A>G", "NM_dummy", "NP_dummy", "GENE1", 1111),
+    })
+
+    # Record every statement run on the connection
+    real_connect = sqlite3.connect
+    statements = []
+
+    def traced_connect(*args, **kwargs):
+        conn = real_connect(*args, **kwargs)
+        conn.set_trace_callback(statements.append)
+        return conn
+
+    monkeypatch.setattr(db_mod.sqlite3, "connect", traced_connect)
+
+    # Remove existing database if it exists
+    if os.path.exists(db_path):
+        os.remove(db_path)
+
+    with app.test_request_context("/"):
+        db_mod.patient_variant_table(str(temp_variants_dir), db_name)
+
+    monkeypatch.undo()
+    conn = sqlite3.connect(db_path)
+    indexes = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type='index'")}
+    conn.close()
+    os.remove(db_path)
+
+    # The indexes are created after the rows are inserted, and are kept in the database
+    insert = next(i for i, s in enumerate(statements) if s.startswith("INSERT"))
+    create = next(i for i, s in enumerate(statements) if s.startswith("CREATE INDEX"))
+    assert insert < create
+    assert {"idx_pv_variant", "idx_pv_patient"} <= indexes
+
+
+def test_patient_variant_table_applies_write_pragmas(
+    app, temp_variants_dir, db_name, db_path, monkeypatch
+):
+    """
+    Test that `patient_variant_table` applies the WRITE_PRAGMAS to
+    its connection before the variants are added to the database.
+    """
+    (temp_variants_dir / "Patient1.vcf").write_text("## dummy content\n")
+    monkeypatch.setattr(db_mod, "variant_parser", lambda path: ["varA"])
+    monkeypatch.setattr(db_mod, "fetch_vv_concurrently", lambda variant_list: {
+        "varA": ("NC_000001.1:g.1A>G", "NM_dummy", "NP_dummy", "GENE1", 1111),
+    })
+
+    # Wrap the real cursor to record the statements that are executed
+    real_connect = sqlite3.connect
+    executed = []
+
+    class RecordingCursor:
+        def __init__(self, cursor):
+            self._cursor = cursor
+
+        def execute(self, sql, *args):
+            executed.append(sql)
+            return self._cursor.execute(sql, *args)
+
+        def __getattr__(self, name):
+            return getattr(self._cursor, name)
+
+    class RecordingConn:
+        def __init__(self, *args, **kwargs):
+            self._conn = real_connect(*args, **kwargs)
+
+        def cursor(self):
+            return RecordingCursor(self._conn.cursor())
+
+        def __getattr__(self, name):
+            return getattr(self._conn, name)
+
+    monkeypatch.setattr(db_mod.sqlite3, "connect", RecordingConn)
+
+    if os.path.exists(db_path):
+        os.remove(db_path)
+
+    with app.test_request_context("/"):
+        db_mod.patient_variant_table(str(temp_variants_dir), db_name)
+
+    monkeypatch.undo()
+    os.remove(db_path)
+
+    # The PRAGMA statements are the first statements executed
+    assert executed[:len(db_mod.WRITE_PRAGMAS)] == list(db_mod.WRITE_PRAGMAS)
+
+
+def test_variant_annotations_table_queries_clinvar_once_per_variant(
+    app, temp_variants_dir, db_name, db_path, monkeypatch
+):
+    """
+    Test that `variant_annotations_table` only looks up each pair of
+    HGVS descriptions in clinvar.db once, even when the same variant
+    appears in several uploaded files.
+    """
+    # Two patients with the same variant
+    (temp_variants_dir / "Patient1.vcf").write_text("## dummy content\n")
+    (temp_variants_dir / "Patient2.vcf").write_text("## dummy content\n")
+
+    monkeypatch.setattr(db_mod, "variant_parser", lambda path: ["varA"])
+    monkeypatch.setattr(db_mod, "fetch_vv_concurrently", lambda variant_list: {
+        "varA": ("NC_000003.1:g.123A>G", "NM_000003.1:c.123A>G", "NP_000003.1:p.(Lys41Arg)", "GENE3", 3333),
+    })
+
+    # Record each call to clinvar_annotations
+    calls = []
+
+    def fake_clinvar_annotations(nc, nm, conn=None):
+        calls.append((nc, nm))
+        return {
+            "classification": "Pathogenic",
+            "conditions": "Some condition",
+            "stars": "★★",
+            "reviewstatus": "criteria provided, multiple submitters, no conflicts",
+        }
+
+    monkeypatch.setattr(db_mod, "clinvar_annotations", fake_clinvar_annotations)
+
+    # Remove existing database if it exists
+    if os.path.exists(db_path):
+        os.remove(db_path)
+
+    with app.test_request_context("/"):
+        db_mod.variant_annotations_table(str(temp_variants_dir), db_name)
+
+    if os.path.exists(db_path):
+        os.remove(db_path)
+
+    assert calls == [("NC_000003.1:g.123A>G", "NM_000003.1:c.123A>G")]
+
+
+def test_tables_share_parsed_variants(
+    app, temp_variants_dir, db_name, db_path, monkeypatch
+):
+    """
+    Test that when `patient_variant_table` and `variant_annotations_table`
+    are given the same `prepared` dictionary, each file is parsed once and
+    VariantValidator is queried once for the whole upload.
+    """
+    (temp_variants_dir / "Patient1.vcf").write_text("## dummy content\n")
+    (temp_variants_dir / "Patient2.vcf").write_text("## dummy content\n")
+
+    # Record each call to variant_parser and fetch_vv_concurrently
+    parsed = []
+    queried = []
+
+    def fake_variant_parser(path):
+        parsed.append(os.path.basename(path))
+        return ["varA"]
+
+    def fake_fetch_vv_concurrently(variant_list):
+        queried.append(variant_list)
+        return {"varA": ("NC_000003.1:g.123A>G", "NM_000003.1:c.123A>G", "NP_000003.1:p.(Lys41Arg)", "GENE3", 3333)}
+
+    monkeypatch.setattr(db_mod, "variant_parser", fake_variant_parser)
+    monkeypatch.setattr(db_mod, "fetch_vv_concurrently", fake_fetch_vv_concurrently)
+    monkeypatch.setattr(db_mod, "clinvar_annotations", lambda nc, nm, conn=None: {
+        "classification": "Pathogenic",
+        "conditions": "Some condition",
+        "stars": "★★",
+        "reviewstatus": "criteria provided, multiple submitters, no conflicts",
+    })
+
+    if os.path.exists(db_path):
+        os.remove(db_path)
+
+    prepared = {}
+    with app.test_request_context("/"):
+        db_mod.patient_variant_table(str(temp_variants_dir), db_name, prepared)
+        db_mod.variant_annotations_table(str(temp_variants_dir), db_name, prepared)
+
+    conn = sqlite3.connect(db_path)
+    patients = conn.execute("SELECT patient_ID FROM patient_variant ORDER BY patient_ID").fetchall()
+    annotations = conn.execute("SELECT variant_NC FROM variant_annotations").fetchall()
+    conn.close()
+    os.remove(db_path)
+
+    assert sorted(parsed) == ["Patient1.vcf", "Patient2.vcf"]
+    assert queried == [["varA", "varA"]]
+    assert patients == [("Patient1",), ("Patient2",)]
+    assert annotations == [("NC_000003.1:g.123A>G",)]
+
+
+def test_read_connection_reuses_connection(tmp_path):
+    """
+    Test that `read_connection` returns the same read-only connection
+    for repeated queries to an unchanged database, and opens a new one
+    once the database file has changed.
+    """
+    db_path = tmp_path / "reuse.db"
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE t (x INTEGER)")
+    conn.commit()
+    conn.close()
+
+    with db_mod.read_connection(str(db_path)) as first:
+        # The connection cannot be used to change the database
+        with pytest.raises(sqlite3.OperationalError):
+            first.execute("INSERT INTO t VALUES (1)")
+
+    with db_mod.read_connection(str(db_path)) as second:
+        assert second is first
+
+    # Change the database file
+    conn = sqlite3.connect(db_path)
+    conn.execute("INSERT INTO t VALUES (1)")
+    conn.commit()
+    conn.close()
+    os.utime(db_path, ns=(0, 0))
+
+    with db_mod.read_connection(str(db_path)) as third:
+        assert third is not first
+        assert third.execute("SELECT COUNT(*) FROM t").fetchone()[0] == 1
+
+
+def test_read_connection_pool_shared_between_threads(tmp_path):
+    """
+    Test that `read_connection` gives threads reading the same database
+    at the same time their own connections, and that a connection to a
+    database file which has since changed is only closed once it has
+    been returned.
+    """
+    db_path = tmp_path / "pool.db"
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE t (x INTEGER)")
+    conn.commit()
+    conn.close()
+
+    # Two connections are used at the same time.
+    with db_mod.read_connection(str(db_path)) as first:
+        with db_mod.read_connection(str(db_path)) as second:
+            assert second is not first
+
+            # Change the database file while both connections are being used
+            os.utime(db_path, ns=(0, 0))
+            with db_mod.read_connection(str(db_path)) as third:
+                assert third is not first and third is not second
+
+            # The connections to the previous database file can still be used
+            assert first.execute("SELECT COUNT(*) FROM t").fetchone()[0] == 0
+
+    # Once returned, the connections to the previous database file are closed
+    with pytest.raises(sqlite3.ProgrammingError):
+        first.execute("SELECT 1")
+
+
+def test_read_connection_missing_database(tmp_path):
+    """
+    Test that `read_connection` does not create an empty database when
+    the database file cannot be found.
+    """
+    db_path = tmp_path / "missing.db"
+
+    with pytest.raises(sqlite3.OperationalError):
+        with db_mod.read_connection(str(db_path)) as conn:
+            conn.execute("SELECT 1")
+
+    assert not db_path.exists()
+
+
+def test_read_only_uri_does_not_create_database(tmp_path):
+    """
+    Test that a connection opened with `read_only_uri` reads an existing
+    database, and raises an OperationalError for a missing database
+    instead of creating an empty one.
+    """
+    db_path = tmp_path / "existing.db"
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE t (x INTEGER)")
+    conn.commit()
+    conn.close()
+
+    conn = sqlite3.connect(db_mod.read_only_uri(str(db_path)), uri=True)
+    assert conn.execute("SELECT COUNT(*) FROM t").fetchone()[0] == 0
+    conn.close()
+
+    missing_path = tmp_path / "missing.db"
+    with pytest.raises(sqlite3.OperationalError):
+        sqlite3.connect(db_mod.read_only_uri(str(missing_path)), uri=True)
+    assert not missing_path.exists()
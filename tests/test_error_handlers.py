@@ -18,6 +18,8 @@ import pytest
 from http.client import RemoteDisconnected
 
 from tools.utils.error_handlers import (
+    MAX_RETRY_DELAY,
+    retry_delay,
     request_status_codes,
     connection_error,
     json_decoder_error,
@@ -38,10 +40,13 @@ class DummyResponse:
     ----------
     status_code : int
         HTTP status code to simulate in tests.
+    headers : dict
+        HTTP headers to simulate in tests.
     """
 
-    def __init__(self, status_code):
+    def __init__(self, status_code, headers=None):
         self.status_code = status_code
+        self.headers = headers or {}
 
 
 class DummyHTTPError(requests.exceptions.HTTPError):
@@ -55,11 +60,11 @@ class DummyHTTPError(requests.exceptions.HTTPError):
         A dummy response containing the simulated HTTP status code.
     """
 
-    def __init__(self, status_code):
+    def __init__(self, status_code, headers=None):
         # Initialize the parent HTTPError with a message
         super().__init__(f"HTTP {status_code}")
         # Attach a dummy response object
-        self.response = DummyResponse(status_code)
+        self.response = DummyResponse(status_code, headers)
 
 
 # ---------------------------------------------------------------------
@@ -72,8 +77,6 @@ class DummyHTTPError(requests.exceptions.HTTPError):
         (400, "HTTPError 400"),
         (404, "HTTPError 404"),
         (500, "HTTPError 500"),
-        (503, "HTTPError 503"),
-        (504, "HTTPError 504"),
     ],
 )
 
@@ -167,6 +170,89 @@ def test_request_status_codes_429_final_attempt(monkeypatch):
     assert "HTTPError 429" in msg
 
 
+@pytest.mark.parametrize("status_code", [502, 503, 504])
+def test_request_status_codes_5xx_retried(monkeypatch, status_code):
+    """
+    Test that `request_status_codes` waits and returns None for
+    temporary 5xx errors before the final attempt, so the request is sent again.
+    """
+    # Record the delays instead of sleeping
+    delays = []
+    monkeypatch.setattr("time.sleep", lambda s: delays.append(s))
+
+    msg = request_status_codes(
+        DummyHTTPError(status_code),
+        variant="VAR",
+        url="http://example.com",
+        API="TestAPI",
+        attempt=1,
+    )
+
+    # No message means the caller should try again
+    assert msg is None
+    # One delay of between 2 and 3 seconds (2 ** 1 plus jitter)
+    assert len(delays) == 1
+    assert 2 <= delays[0] <= 3
+
+
+@pytest.mark.parametrize("status_code", [502, 503, 504])
+def test_request_status_codes_5xx_final_attempt(monkeypatch, status_code):
+    """
+    Test that `request_status_codes` returns a message for temporary 5xx
+    errors on the final attempt.
+    """
+    monkeypatch.setattr("time.sleep", lambda *_: None)
+
+    msg = request_status_codes(
+        DummyHTTPError(status_code),
+        variant="VAR",
+        url="http://example.com",
+        API="TestAPI",
+        attempt=4,
+    )
+
+    assert f"HTTPError {status_code}" in msg
+    assert "VAR" in msg
+
+
+def test_retry_delay_honours_retry_after_seconds():
+    """
+    Test that `retry_delay` waits for the number of seconds in the Retry-After header.
+    """
+    e = DummyHTTPError(429, headers={"Retry-After": "7"})
+    assert retry_delay(e, 0) == 7
+
+
+def test_retry_delay_honours_retry_after_date():
+    """
+    Test that `retry_delay` waits until the HTTP date in the Retry-After header.
+    """
+    from email.utils import format_datetime
+    from datetime import datetime, timedelta, timezone
+
+    date = format_datetime(datetime.now(timezone.utc) + timedelta(seconds=10), usegmt=True)
+    e = DummyHTTPError(503, headers={"Retry-After": date})
+
+    assert 0 < retry_delay(e, 0) <= 10
+
+
+def test_retry_delay_is_capped():
+    """
+    Test that `retry_delay` never waits longer than MAX_RETRY_DELAY.
+    """
+    assert retry_delay(DummyHTTPError(429, headers={"Retry-After": "3600"}), 0) == MAX_RETRY_DELAY
+    assert retry_delay(DummyHTTPError(503), 10) == MAX_RETRY_DELAY
+
+
+def test_retry_delay_invalid_retry_after_uses_backoff():
+    """
+    Test that `retry_delay` falls back to exponential backoff when the
+    Retry-After header cannot be read.
+    """
+    delay = retry_delay(DummyHTTPError(429, headers={"Retry-After": "soon"}), 2)
+    assert 4 <= delay <= 5
+
+
 # ---------------------------------------------------------------------
 # connection_error tests
 # ---------------------------------------------------------------------
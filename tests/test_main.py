@@ -282,4 +282,40 @@ def test_main_clinvar_failure_exits(monkeypatch):
         # Application cannot be started. ClinVar failure"
         mock_logger.critical.assert_any_call(
             "ClinVar database download check failed. Application cannot be started. ClinVar failure"
-        )
\ No newline at end of file
+        )
+
+def test_main_reloader_process_skips_startup_checks(monkeypatch):
+    """
+    This function tests that the run_app() function from main.py does not check for clinvar.db or open the web browser
+    again in the child process started by Flask's reloader, which sets WERKZEUG_RUN_MAIN to "true".
+    """
+    import main
+
+    # Record which startup steps were run.
+    called = []
+
+    monkeypatch.setenv("WERKZEUG_RUN_MAIN", "true")
+    monkeypatch.setattr(main, "clinvar_db_check", lambda _: called.append("clinvar_db_check"))
+    monkeypatch.setattr(main, "Timer", lambda *args: called.append("Timer"))
+    monkeypatch.setattr(main.app, "run", lambda **kwargs: called.append(("run", kwargs["port"])))
+
+    main.run_app(port=8080)
+
+    # Only app.run() should have been called, on the requested port.
+    assert called == [("run", 8080)]
+
+
+def test_parse_args_defaults_and_options():
+    """
+    This function tests that the parse_args() function from main.py reads the --port and --no-debug options, and keeps
+    the previous defaults (debug mode on port 5000) when no options are given.
+    """
+    from main import parse_args
+
+    args = parse_args([])
+    assert args.debug is True
+    assert args.port == 5000
+
+    args = parse_args(["--port", "8080", "--no-debug"])
+    assert args.debug is False
+    assert args.port == 8080
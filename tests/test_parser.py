@@ -12,7 +12,7 @@ import textwrap
 import pytest
 from flask import Flask
 from unittest.mock import patch
-from tools.utils.parser import variant_parser
+from tools.utils.parser import variant_parser, iter_variants
 
 def test_variant_parser_vcf_basic(tmp_path):
     """
@@ -219,4 +219,108 @@ def test_variant_parser_csv_insufficient_columns(tmp_path):
         result = variant_parser(str(csv_file))
 
     # Expect parser to return None since no valid variants exist
-    assert result is None
\ No newline at end of file
+    assert result is None
+
+# -----------------------------
+# iter_variants generator
+# -----------------------------
+def test_iter_variants_yields_lazily(tmp_path):
+    """
+    Test that `iter_variants` yields variants one at a time, in the
+    same format as `variant_parser`.
+    """
+    # Create a VCF file with two variant records
+    vcf_file = tmp_path / "Patient1.vcf"
+    vcf_file.write_text(
+        "##fileformat=VCFv4.2\n"
+        "chr17\t45983420\trs1\tG\tT\n"
+        "chr4\t89822305\trs2\tC\tG\n"
+    )
+
+    # The generator does not read anything until it is iterated
+    variants = iter_variants(str(vcf_file))
+    assert next(variants) == "17-45983420-G-T"
+
+    # The remaining variant is yielded and the generator is exhausted
+    assert list(variants) == ["4-89822305-C-G"]
+
+
+def test_variant_parser_vcf_with_info_and_sample_columns(tmp_path):
+    """
+    Test that `variant_parser` only uses the first five columns of a
+    full VCF line, ignoring the QUAL, FILTER, INFO, FORMAT and sample columns.
+    """
+    vcf_file = tmp_path / "Patient1.vcf"
+    vcf_file.write_text(
+        "##fileformat=VCFv4.2\n"
+        "#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\tPatient1\n"
+        "chr17\t45983420\trs1\tG\tT\t50\tPASS\tDP=20\tGT\t0/1\n"
+    )
+
+    assert variant_parser(str(vcf_file)) == ["17-45983420-G-T"]
+
+
+def test_iter_variants_logs_summary_not_each_variant(tmp_path):
+    """
+    Test that `iter_variants` logs the number of variants parsed once
+    the file has been read, rather than logging every variant.
+    """
+    vcf_file = tmp_path / "Patient1.vcf"
+    vcf_file.write_text(
+        "##fileformat=VCFv4.2\n"
+        + "".join(f"chr1\t{pos}\t.\tA\tG\n" for pos in range(1, 101))
+    )
+
+    with patch("tools.utils.parser.logger") as mock_logger:
+        variants = list(iter_variants(str(vcf_file)))
+
+    assert len(variants) == 100
+    assert variants[-1] == "1-100-A-G"
+    # One message for the file type and one for the summary
+    assert mock_logger.info.call_count == 2
+    assert "Parsed: 100; Skipped: 0" in mock_logger.info.call_args[0][0]
+
+
+def test_iter_variants_missing_file_raises(tmp_path):
+    """
+    Test that `iter_variants` raises FileNotFoundError for a missing
+    file, which `variant_parser` reports to the User.
+    """
+    with pytest.raises(FileNotFoundError):
+        list(iter_variants(str(tmp_path / "missing.vcf")))
+
+
+# -----------------------------
+# Compressed variant files
+# -----------------------------
+def test_variant_parser_gzip_vcf(tmp_path):
+    """
+    Test that `variant_parser` decompresses a gzip-compressed VCF file
+    while parsing it, producing the same variants as the plain file.
+    """
+    import gzip
+
+    # Write a gzip-compressed VCF file
+    vcf_file = tmp_path / "Patient1.vcf.gz"
+    with gzip.open(vcf_file, "wt") as f:
+        f.write("##fileformat=VCFv4.2\nchr17\t45983420\trs1\tG\tT\n")
+
+    result = variant_parser(str(vcf_file))
+
+    assert result == ["17-45983420-G-T"]
+
+
+def test_variant_parser_corrupt_gzip_returns_none(tmp_path):
+    """
+    Test that `variant_parser` returns None and notifies the User when
+    a compressed variant file cannot be decompressed.
+    """
+    # Write a file with the gzip magic bytes followed by garbage
+    vcf_file = tmp_path / "Broken.vcf.gz"
+    vcf_file.write_bytes(b"\x1f\x8bnot really gzip")
+
+    with patch("tools.utils.parser.flash") as mock_flash:
+        result = variant_parser(str(vcf_file))
+
+    assert result is None
+    assert "could not be decompressed" in mock_flash.call_args[0][0]
@@ -0,0 +1,80 @@
+"""
+Unit tests for vv_cache (tools/utils/vv_cache.py).
+
+This module contains pytest-based tests that verify correct behaviour
+and error handling for functions in vv_cache. The cache database is
+redirected to a temporary directory using monkeypatch.
+"""
+
+import sqlite3
+import pytest
+import tools.utils.vv_cache as vv_cache
+from tools.utils.vv_cache import read_vv_cache, write_vv_cache
+
+# A complete response from fetch_vv
+RESPONSE = ("NC_000017.11:g.45983420G>T", "NM_001377265.1:c.841G>T",
+            "NP_001364194.1:p.(Val281Phe)", "MAPT", "HGNC:6893")
+
+
+@pytest.fixture(autouse=True)
+def cache_path(tmp_path, monkeypatch):
+    """Store the VariantValidator cache in a temporary directory."""
+    path = tmp_path / "cache" / "vv_cache.db"
+    monkeypatch.setattr(vv_cache, "VV_CACHE_PATH", str(path))
+    return path
+
+
+def test_write_then_read_round_trip():
+    """
+    Test that a response stored by `write_vv_cache` is returned by
+    `read_vv_cache` as the same tuple.
+    """
+    write_vv_cache({"17-45983420-G-T": RESPONSE})
+
+    assert read_vv_cache(["17-45983420-G-T", "4-89822305-C-G"]) == {"17-45983420-G-T": RESPONSE}
+
+
+def test_write_skips_error_responses(cache_path):
+    """
+    Test that error messages and exceptions returned in place of a
+    response are not stored in the cache.
+    """
+    write_vv_cache({"a": "VariantValidator unavailable", "b": ConnectionError("down")})
+
+    assert read_vv_cache(["a", "b"]) == {}
+
+    # The cache database should not have been created
+    assert not cache_path.exists()
+
+
+def test_read_ignores_expired_responses(monkeypatch):
+    """
+    Test that responses stored longer than VV_CACHE_EXPIRY are not
+    returned.
+    """
+    write_vv_cache({"17-45983420-G-T": RESPONSE})
+
+    # Move the clock forward beyond the expiry time
+    now = vv_cache.time.time()
+    monkeypatch.setattr(vv_cache.time, "time", lambda: now + vv_cache.VV_CACHE_EXPIRY + 1)
+
+    assert read_vv_cache(["17-45983420-G-T"]) == {}
+
+
+def test_read_returns_empty_dict_on_sqlite_error(monkeypatch, caplog):
+    """
+    Test that `read_vv_cache` logs a warning and returns an empty
+    dictionary if the cache database cannot be read.
+    """
+    # Create the cache database so that it is opened by read_vv_cache
+    write_vv_cache({"17-45983420-G-T": RESPONSE})
+
+    def raise_error(*args, **kwargs):
+        raise sqlite3.OperationalError("database is locked")
+
+    monkeypatch.setattr(vv_cache.sqlite3, "connect", raise_error)
+
+    with caplog.at_level("WARNING"):
+        assert read_vv_cache(["17-45983420-G-T"]) == {}
+
+    assert any("Could not read VariantValidator cache" in r.message for r in caplog.records)
@@ -23,6 +23,15 @@ from unittest.mock import patch, MagicMock
 app = Flask(__name__)
 app.secret_key = "test"
 
+
+@pytest.fixture(autouse=True)
+def clear_mane_nc_cache():
+    """
+    Clear the HGVS genomic descriptions stored by get_mane_nc before each test, so that each test queries the mocked
+    VariantValidator response.
+    """
+    vv._MANE_NC_CACHE.clear()
+
 def test_input_ENST_integration():
     """
     Test for get_mane_nc using a real VariantValidator API call.
@@ -280,8 +289,8 @@ def test_get_mane_nc_invalid_gene_symbol(monkeypatch):
         def json(self):
             return {"transcripts": []}  # No transcripts found
 
-    # Patch requests.get and time.sleep to avoid real API calls and delays
-    monkeypatch.setattr(vv.requests, "get", lambda url: FakeResponse())
+    # Patch vv_session.get and time.sleep to avoid real API calls and delays
+    monkeypatch.setattr(vv.vv_session, "get", lambda url: FakeResponse())
     monkeypatch.setattr(vv.time, "sleep", lambda *_: None)
 
     # Flask context is required for flashing
@@ -321,8 +330,8 @@ def test_get_mane_nc_gene_symbol_with_g(monkeypatch):
                 ]
             }
 
-    # Patch requests.get and time.sleep to avoid real API calls and delays
-    monkeypatch.setattr(vv.requests, "get", lambda url: FakeResponse())
+    # Patch vv_session.get and time.sleep to avoid real API calls and delays
+    monkeypatch.setattr(vv.vv_session, "get", lambda url: FakeResponse())
     monkeypatch.setattr(vv.time, "sleep", lambda *_: None)
 
     # Flask context required for flashing
@@ -358,8 +367,8 @@ def test_get_mane_nc_lrg_transcript(monkeypatch):
                 }
             }
 
-    # Patch requests.get and time.sleep to avoid real API calls and delays
-    monkeypatch.setattr(vv.requests, "get", lambda url: FakeResponse())
+    # Patch vv_session.get and time.sleep to avoid real API calls and delays
+    monkeypatch.setattr(vv.vv_session, "get", lambda url: FakeResponse())
     monkeypatch.setattr(vv.time, "sleep", lambda *_: None)
 
     # Call the function with the LRG variant
@@ -372,6 +381,63 @@ def test_get_mane_nc_lrg_transcript(monkeypatch):
     assert ":g." in output or ":c." in output
 
 
+def test_get_mane_nc_cached(monkeypatch):
+    """
+    Test that get_mane_nc only queries VariantValidator once for a variant that is searched for twice, and that search
+    terms that fail are not stored.
+    """
+    # Count the number of requests sent to VariantValidator.
+    calls = []
+
+    class FakeResponse:
+        def raise_for_status(self):
+            pass
+
+        def json(self):
+            return {
+                "LRG_123.1:c.123A>T": {
+                    "primary_assembly_loci": {
+                        "grch38": {
+                            "hgvs_genomic_description": "NC_000001.11:g.123A>T"
+                        }
+                    }
+                }
+            }
+
+    monkeypatch.setattr(vv.vv_session, "get", lambda url: calls.append(url) or FakeResponse())
+    monkeypatch.setattr(vv.time, "sleep", lambda *_: None)
+
+    # The second search is answered from the cache.
+    assert vv.get_mane_nc("LRG_123.1:c.123A>T") == "NC_000001.11:g.123A>T"
+    assert vv.get_mane_nc("LRG_123.1:c.123A>T") == "NC_000001.11:g.123A>T"
+    assert len(calls) == 1
+
+    # Search terms that fail validation are not stored.
+    with app.test_request_context():
+        assert vv.get_mane_nc("LRG_123.1") is None
+    assert "LRG_123.1" not in vv._MANE_NC_CACHE
+
+
+def test_get_mane_nc_cache_concurrent_eviction(monkeypatch):
+    """
+    Test that searches handled by different threads at the same time
+    can remove the oldest search terms from a full cache without
+    raising an error, and that the cache does not grow past
+    MANE_NC_CACHE_SIZE.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    monkeypatch.setattr(vv, "MANE_NC_CACHE_SIZE", 4)
+    monkeypatch.setattr(vv, "_fetch_mane_nc", lambda variant: f"NC_000001.11:g.{variant}A>T")
+
+    variants = [str(i) for i in range(200)]
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(vv.get_mane_nc, variants))
+
+    assert results == [f"NC_000001.11:g.{i}A>T" for i in variants]
+    assert len(vv._MANE_NC_CACHE) <= 4
+
+
 def test_get_mane_nc_invalid_c_variant_pattern(monkeypatch):
     """
     Test get_mane_nc with an invalid c. variant pattern.
@@ -517,7 +583,7 @@ def test_get_mane_nc_generic_exception(monkeypatch):
     def fake_get(*args, **kwargs):
         raise ValueError("something went wrong")
 
-    monkeypatch.setattr(vv.requests, "get", fake_get)
+    monkeypatch.setattr(vv.vv_session, "get", fake_get)
 
     # Execute within Flask request context (needed if flash is called)
     with app.test_request_context():
@@ -614,7 +680,7 @@ def test_get_mane_nc_flashes_and_logging(
          patch("tools.modules.vv_functions.logger.error") as mock_error, \
          patch("tools.modules.vv_functions.logger.info") as mock_info, \
          patch("tools.modules.vv_functions.logger.debug") as mock_debug, \
-         patch("tools.modules.vv_functions.requests.get") as mock_requests_get:
+         patch("tools.modules.vv_functions.vv_session.get") as mock_requests_get:
 
         # Mock API call to return the specified response
         mock_response = mock_requests_get.return_value
@@ -673,7 +739,7 @@ def test_get_mane_nc_keyerror_branches(variant, data, missing_key):
     with patch("tools.modules.vv_functions.flash", lambda msg: flashed.append(msg)), \
          patch("tools.modules.vv_functions.logger.error") as mock_error, \
          patch("tools.modules.vv_functions.logger.debug") as mock_debug, \
-         patch("tools.modules.vv_functions.requests.get") as mock_get:
+         patch("tools.modules.vv_functions.vv_session.get") as mock_get:
 
         # Mock the API call to return the test data missing expected keys
         mock_get.return_value.json.return_value = data
@@ -723,7 +789,7 @@ def test_get_mane_nc_generic_exception_branches(variant, exception):
     with patch("tools.modules.vv_functions.flash", lambda msg: flashed.append(msg)), \
          patch("tools.modules.vv_functions.logger.error") as mock_error, \
          patch("tools.modules.vv_functions.logger.debug") as mock_debug, \
-         patch("tools.modules.vv_functions.requests.get") as mock_get:
+         patch("tools.modules.vv_functions.vv_session.get") as mock_get:
 
         # Make the API's json() method raise the test exception
         mock_get.return_value.json.side_effect = exception
@@ -768,7 +834,7 @@ def test_get_mane_nc_unrecognised_gene_symbol(variant):
     # Patch `flash` to capture messages and logger.warning to verify warning logging
     with patch("tools.modules.vv_functions.flash", lambda msg: flashed.append(msg)), \
          patch("tools.modules.vv_functions.logger.warning") as mock_warn, \
-         patch("tools.modules.vv_functions.requests.get") as mock_get:
+         patch("tools.modules.vv_functions.vv_session.get") as mock_get:
 
         # Simulate VariantValidator returning an empty response (unrecognised gene symbol)
         mock_get.return_value.json.return_value = {}
@@ -792,8 +858,8 @@ def test_fetch_vv_success(monkeypatch):
     Ensures fetch_vv parses the JSON correctly and returns expected values.
     """
 
-    # Patch requests.get to return the fake response
-    monkeypatch.setattr(vv.requests, "get", lambda *_: FakeResponse())
+    # Patch vv_session.get to return the fake response
+    monkeypatch.setattr(vv.vv_session, "get", lambda *_: FakeResponse())
     # Patch time.sleep to avoid delays in testing
     monkeypatch.setattr(vv.time, "sleep", lambda *_: None)
 
@@ -828,8 +894,8 @@ def test_fetch_vv_none_response(monkeypatch):
             """Return None to simulate missing API data"""
             return None
 
-    # Patch requests.get to return the fake response
-    monkeypatch.setattr(vv.requests, "get", lambda url: FakeResponse())
+    # Patch vv_session.get to return the fake response
+    monkeypatch.setattr(vv.vv_session, "get", lambda url: FakeResponse())
     # Patch time.sleep to skip delays during testing
     monkeypatch.setattr(vv.time, "sleep", lambda *_: None)
 
@@ -858,8 +924,8 @@ def test_fetch_vv_empty_result(monkeypatch):
             """Return a dictionary indicating empty result"""
             return {"flag": "empty_result"}
 
-    # Patch requests.get to return the fake response
-    monkeypatch.setattr(vv.requests, "get", lambda url: FakeResponse())
+    # Patch vv_session.get to return the fake response
+    monkeypatch.setattr(vv.vv_session, "get", lambda url: FakeResponse())
     # Patch time.sleep to skip delays during testing
     monkeypatch.setattr(vv.time, "sleep", lambda *_: None)
 
@@ -888,8 +954,8 @@ def test_fetch_vv_validation_warning(monkeypatch):
             """Return a dictionary simulating a validation warning"""
             return {"validation_warning_1": {"validation_warnings": ["Test warning"]}}
 
-    # Patch requests.get to return the fake response
-    monkeypatch.setattr(vv.requests, "get", lambda url: FakeResponse())
+    # Patch vv_session.get to return the fake response
+    monkeypatch.setattr(vv.vv_session, "get", lambda url: FakeResponse())
     # Patch time.sleep to skip delays during testing
     monkeypatch.setattr(vv.time, "sleep", lambda *_: None)
 
@@ -967,7 +1033,7 @@ def test_fetch_vv_error_handlers(monkeypatch, exception, handler_name, handler_r
     def raise_exception(*args, **kwargs):
         raise exception
 
-    monkeypatch.setattr(vv.requests, "get", raise_exception)
+    monkeypatch.setattr(vv.vv_session, "get", raise_exception)
 
     # Mock the specific handler to return a known value
     monkeypatch.setattr(vv, handler_name, lambda *args, **kwargs: handler_return)
@@ -1047,7 +1113,7 @@ def test_fetch_vv_regex_branches(mock_data, expected_return, expected_flash):
 
     # Patch flash to capture messages and requests.get to mock API calls
     with patch("tools.modules.vv_functions.flash", lambda msg: flashed.append(msg)):
-        with patch("tools.modules.vv_functions.requests.get") as mock_get:
+        with patch("tools.modules.vv_functions.vv_session.get") as mock_get:
             # Mock response object returned by requests.get
             mock_resp = MagicMock()
             mock_resp.json.return_value = mock_data
@@ -1086,8 +1152,8 @@ def test_fetch_vv_non_dict_response(monkeypatch):
             """Return a list instead of a dict to simulate an invalid response."""
             return ["not", "a", "dict"]
 
-    # Patch requests.get to return the fake response
-    monkeypatch.setattr(vv.requests, "get", lambda url: FakeResponse())
+    # Patch vv_session.get to return the fake response
+    monkeypatch.setattr(vv.vv_session, "get", lambda url: FakeResponse())
 
     # Patch time.sleep to skip actual delays during testing
     monkeypatch.setattr(vv.time, "sleep", lambda *_: None)
@@ -1119,8 +1185,8 @@ def test_fetch_vv_missing_keys(monkeypatch):
             """Return a dictionary missing the expected variant keys."""
             return {"X": {"primary_assembly_loci": {}}}
 
-    # Patch requests.get to return the fake response
-    monkeypatch.setattr(vv.requests, "get", lambda url: FakeResponse())
+    # Patch vv_session.get to return the fake response
+    monkeypatch.setattr(vv.vv_session, "get", lambda url: FakeResponse())
 
     # Patch time.sleep to skip delays during testing
     monkeypatch.setattr(vv.time, "sleep", lambda *_: None)
@@ -1144,8 +1210,8 @@ def test_fetch_vv_timeout(monkeypatch):
         """Simulate a requests.get call that raises a Timeout exception."""
         raise requests.exceptions.Timeout("timeout")
 
-    # Patch requests.get to simulate the timeout
-    monkeypatch.setattr(vv.requests, "get", fake_get)
+    # Patch vv_session.get to simulate the timeout
+    monkeypatch.setattr(vv.vv_session, "get", fake_get)
 
     # Patch time.sleep to avoid delays during testing
     monkeypatch.setattr(vv.time, "sleep", lambda *_: None)
@@ -1177,8 +1243,8 @@ def test_fetch_vv_http_error(monkeypatch):
             """Return a dummy JSON object (not used in this test)."""
             return {}
 
-    # Patch requests.get to simulate an HTTP error
-    monkeypatch.setattr(vv.requests, "get", lambda url: FakeResponse())
+    # Patch vv_session.get to simulate an HTTP error
+    monkeypatch.setattr(vv.vv_session, "get", lambda url: FakeResponse())
 
     # Patch time.sleep to avoid delays during testing
     monkeypatch.setattr(vv.time, "sleep", lambda *_: None)
@@ -1211,8 +1277,8 @@ def test_get_mane_nc_connection_error_no_internet(monkeypatch):
     def fake_connection_error(e, variant, api_name, url):
         return "problem connecting to the internet"
 
-    # Patch requests.get and the connection_error function in vv
-    monkeypatch.setattr(vv.requests, "get", fake_get)
+    # Patch vv_session.get and the connection_error function in vv
+    monkeypatch.setattr(vv.vv_session, "get", fake_get)
     monkeypatch.setattr(vv, "connection_error", fake_connection_error)
 
     variant = "ENST00000338639.10:c.515T>A"
@@ -1278,8 +1344,8 @@ def test_fetch_vv_retry_then_success(monkeypatch):
             raise requests.exceptions.HTTPError("408 Request Timeout", response=response)
         return FakeResponse()
 
-    # Patch requests.get and time.sleep to avoid delays
-    monkeypatch.setattr(vv.requests, "get", fake_get)
+    # Patch vv_session.get and time.sleep to avoid delays
+    monkeypatch.setattr(vv.vv_session, "get", fake_get)
     monkeypatch.setattr(vv.time, "sleep", lambda *_: None)
 
     # Call fetch_vv and check result
@@ -1333,8 +1399,8 @@ def test_fetch_vv_protein_regex_error(monkeypatch):
         # Prevent real delays during retry logic
         monkeypatch.setattr(vv.time, "sleep", lambda *_: None)
 
-        # Patch requests.get to return a mocked successful API response
-        monkeypatch.setattr(vv.requests, "get", lambda *_: FakeResponse())
+        # Patch vv_session.get to return a mocked successful API response
+        monkeypatch.setattr(vv.vv_session, "get", lambda *_: FakeResponse())
 
         # Override re.match again to force a guaranteed regex failure
         # during protein variant validation
@@ -1348,3 +1414,108 @@ def test_fetch_vv_protein_regex_error(monkeypatch):
 
         # Assert that a regex-related internal error message is returned
         assert "Internal Error: Regex validation failed." in result
+
+
+# ---------------- fetch_vv_batch ---------------- #
+
+def test_fetch_vv_batch_matches_submitted_variants(monkeypatch):
+    """
+    Test that fetch_vv_batch sends every variant in one request and
+    matches each record to its submitted variant.
+
+    Variants with a validation warning are left out, so that they can
+    be queried individually through fetch_vv.
+    """
+    record = FakeResponse().json()["NM_000360.4:c.1442G>A"]
+
+    class FakeBatchResponse:
+        def raise_for_status(self):
+            """No-op for successful status"""
+            pass
+
+        def json(self):
+            """Return one resolved variant and one validation warning"""
+            return {
+                "NM_000360.4:c.1442G>A": dict(record, submitted_variant="11-2164285-C-T"),
+                "validation_warning_1": {
+                    "submitted_variant": "1-1-A-T",
+                    "validation_warnings": ["Invalid variant"],
+                },
+                "flag": "gene_variant",
+                "metadata": {},
+            }
+
+    # Record the URLs requested
+    urls = []
+
+    def fake_get(url):
+        urls.append(url)
+        return FakeBatchResponse()
+
+    monkeypatch.setattr(vv.vv_session, "get", fake_get)
+
+    result = vv.fetch_vv_batch(["11-2164285-C-T", "1-1-A-T"])
+
+    # Both variants are sent in a single request
+    assert len(urls) == 1
+    assert "11-2164285-C-T|1-1-A-T" in urls[0]
+
+    # Only the resolved variant is returned
+    assert result == {
+        "11-2164285-C-T": (
+            "NC_000011.10:g.2164285C>T",
+            "NM_000360.4:c.1442G>A",
+            "NP_000351.2:p.(Gly481Asp)",
+            "TH",
+            "11782",
+        )
+    }
+
+
+def test_fetch_vv_batch_request_failure_returns_empty(monkeypatch):
+    """
+    Test that fetch_vv_batch returns an empty dictionary if the batch
+    request fails, so that every variant falls back to fetch_vv.
+    """
+    def fake_get(url):
+        raise requests.exceptions.ConnectionError("no connection")
+
+    monkeypatch.setattr(vv.vv_session, "get", fake_get)
+
+    assert vv.fetch_vv_batch(["11-2164285-C-T", "1-1-A-T"]) == {}
+
+
+def test_fetch_vv_batch_single_variant_not_requested(monkeypatch):
+    """
+    Test that fetch_vv_batch does not send a request for a single
+    variant, which is queried through fetch_vv instead.
+    """
+    def fake_get(url):
+        raise AssertionError("requests.get should not be called")
+
+    monkeypatch.setattr(vv.vv_session, "get", fake_get)
+
+    assert vv.fetch_vv_batch(["11-2164285-C-T"]) == {}
+
+
+def test_wait_for_vv_spaces_requests_across_threads(monkeypatch):
+    """
+    Test that requests sent to VariantValidator at the same time, from
+    different worker threads, are spaced VV_MIN_INTERVAL seconds apart.
+    """
+    import threading
+
+    # Freeze the clock and record the delays instead of sleeping
+    delays = []
+    monkeypatch.setattr(vv.time, "monotonic", lambda: 100.0)
+    monkeypatch.setattr(vv.time, "sleep", lambda s: delays.append(s))
+    monkeypatch.setattr(vv, "_vv_next_request", 0.0)
+
+    threads = [threading.Thread(target=vv._wait_for_vv) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # The first request is sent straight away and each of the others waits for its own turn
+    assert sorted(delays) == [vv.VV_MIN_INTERVAL, 2 * vv.VV_MIN_INTERVAL, 3 * vv.VV_MIN_INTERVAL]
@@ -28,6 +28,12 @@ The functions included in this script are:
         - Logs the function's activity.
         - Handles Errors related to querying SQL databases.
 
+    - connect_clinvar_db:
+        - Opens a single connection to clinvar.db that can be
+          shared by every call to clinvar_annotations while a
+          variant database is being built, instead of connecting
+          to clinvar.db once per variant.
+
 No patient data is processed here.
 Some of the code used in this script derived from ChatGPT.
 """
@@ -40,7 +46,7 @@ import sqlite3
 import requests
 from tools.utils.timer import timer
 from tools.utils.logger import logger
-from tools.utils.error_handlers import request_status_codes, connection_error, sqlite_error
+from tools.utils.error_handlers import RETRY_STATUS_CODES, request_status_codes, connection_error, sqlite_error
 
 @timer
 def clinvar_vs_download():
@@ -60,7 +66,7 @@ def clinvar_vs_download():
     # The url to the database where the variant summary records are downloaded from.
     url =  'https://ftp.ncbi.nlm.nih.gov/pub/clinvar/tab_delimited/variant_summary.txt.gz'
 
-    # For loop enables 5 attempts to query ClinVar API, in case 408 or 429 request errors occur.
+    # For loop enables 5 attempts to query ClinVar API, in case 408, 429, 502, 503 or 504 request errors occur.
     for attempt in range(5):
         # Test if the url is OK to request a response from.
         try:
@@ -85,13 +91,13 @@ def clinvar_vs_download():
         except requests.exceptions.HTTPError as e:
 
             # Handle HTTP errors that need to be tried again.
-            if e.response.status_code in [408, 429]:
+            if e.response.status_code in RETRY_STATUS_CODES:
                 error_message = request_status_codes(e, 'ClinVar_Download', url, 'ClinVar', attempt)
 
                 # Once the error message has been received, return.
                 if error_message:
                     return
-                # Move to the next attempt to see if the 408 or 429 error response can be avoided.
+                # Move to the next attempt to see if the error response can be avoided.
                 continue
 
             # Handle HTTP errors that do not need to be tried again.
@@ -414,7 +420,42 @@ def clinvar_vs_download():
     os.remove(clinvar_file_path)
 
 
-def clinvar_annotations(nc_variant, nm_variant):
+def connect_clinvar_db():
+    """
+    This function opens a connection to clinvar.db, so that it can be passed to clinvar_annotations for every variant
+    in the uploaded variant files, rather than connecting to clinvar.db once per variant.
+
+    :output: conn: A connection to clinvar.db, or None if clinvar.db does not exist or could not be opened. When None is
+                   returned, clinvar_annotations connects to clinvar.db itself and reports any errors to the User.
+
+    :command: conn = connect_clinvar_db()
+              clinvar_annotations('NC_000011.10:g.2164285C>T', 'NM_000360.4:c.1442G>A', conn=conn)
+              conn.close()
+    """
+
+    # Retrieve the path to this script and create a relative path to clinvar.db.
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    clinvar_db = os.path.abspath(os.path.join(script_dir, "..", "..", "app", "clinvar", "clinvar.db"))
+
+    # Do not create an empty clinvar.db if it has not been downloaded.
+    if not os.path.exists(clinvar_db):
+        logger.warning(f'connect_clinvar_db: clinvar.db not found at {clinvar_db}.')
+        return None
+
+    try:
+        # Connect to clinvar.db. The connection is only used by the thread that opened it.
+        conn = sqlite3.connect(clinvar_db)
+        # Log that the shared connection is open.
+        logger.debug(f'connect_clinvar_db: Connected to clinvar.db at {clinvar_db}')
+        return conn
+
+    # If clinvar.db cannot be opened, clinvar_annotations will connect to clinvar.db for each variant instead.
+    except Exception as e:
+        logger.warning(f'connect_clinvar_db: Could not connect to clinvar.db: {e}')
+        return None
+
+
+def clinvar_annotations(nc_variant, nm_variant, conn=None):
     '''
     This function retrieves variant information from the clinvar.db database. It uses the HGVS transcript description
     and the Refseq NC_ accession number to find the corresponding variant summary record in the database. It then
@@ -427,6 +468,9 @@ def clinvar_annotations(nc_variant, nm_variant):
              nm_variant: The HGVS transcript description, using the RefSeq NM_ accession number.
                    E.g.: 'NM_000360.4:c.1442G>A'
 
+                   conn: An optional connection to clinvar.db from connect_clinvar_db. If provided, it is used instead of
+                         opening a new connection and is left open for the next variant.
+
     :output: clinvar_output: A python dictionary containing the variant classification, associated conditions,
                              star-rating and Review status from that record.
 
@@ -443,9 +487,6 @@ def clinvar_annotations(nc_variant, nm_variant):
     # Isolate the NC_ accession number from the NC_ HGVS nomenclature to find the corresponding variant summary record.
     vv_nc_accession = nc_variant.split(":")[0]
 
-    # Creates a python dictionary to store the variant information from ClinVar.
-    clinvar_output = {}
-
     # Retrieve the path to this script and create a relative path to clinvar.db.
     script_dir = os.path.dirname(os.path.abspath(__file__))
     clinvar_db = os.path.abspath(os.path.join(script_dir, "..", "..", "app", "clinvar", "clinvar.db"))
@@ -458,8 +499,10 @@ def clinvar_annotations(nc_variant, nm_variant):
         # Log which variant is being searched for in clinvar.db.
         logger.info(f'Searching for {nc_variant}/{nm_variant} in clinvar.db...')
 
-        # Connect to clinvar.db.
-        conn = sqlite3.connect(clinvar_db)
+        # Connect to clinvar.db, unless a connection has been provided.
+        shared_conn = conn is not None
+        if not shared_conn:
+            conn = sqlite3.connect(clinvar_db)
         cursor = conn.cursor()
 
         # Retrieve the required variant information from the record where the inputs to this function match the
@@ -474,7 +517,9 @@ def clinvar_annotations(nc_variant, nm_variant):
 
         # Assign the variant information the variable 'record'
         record = cursor.fetchone()
-        conn.close()
+        # The shared connection is left open to be used for the next variant.
+        if not shared_conn:
+            conn.close()
 
     # Error handler executed when exceptions related to sqlite3 are raised.
     except (sqlite3.OperationalError, sqlite3.DatabaseError, sqlite3.ProgrammingError) as e:
@@ -502,11 +547,13 @@ def clinvar_annotations(nc_variant, nm_variant):
         # Parse the variant information out of the record.
         clinical_significance, conditions, stars, review_status = record
 
-        # Compiles clinvar_out dictionary with variant information.
-        clinvar_output['classification'] = clinical_significance
-        clinvar_output['conditions'] = conditions
-        clinvar_output['stars'] = stars
-        clinvar_output['reviewstatus'] = review_status
+        # Compiles clinvar_out dictionary with variant information, in a single dictionary literal.
+        clinvar_output = {
+            'classification': clinical_significance,
+            'conditions': conditions,
+            'stars': stars,
+            'reviewstatus': review_status,
+        }
 
         # Returns the clinvar_output dictionary, even if length is 0.
         return clinvar_output
\ No newline at end of file
@@ -23,6 +23,8 @@ The functions included in this script are:
         - Store the outputs from fetch_vv and clinvar_annotations
           into the table, for each distinct variant in each
           patient's variant file.
+        - Reuse the variants parsed by patient_variant_table, and
+          their VariantValidator responses, for the same upload.
         - Log the function's activity.
         - Handle Errors related to building and adding to the
           variant_annotations table.
@@ -34,6 +36,27 @@ The functions included in this script are:
         - Log the function's activity.
         - Handle Errors related to validating variant databases.
 
+    - fetch_vv_concurrently:
+        - Query VariantValidator for every variant parsed from the
+          uploaded variant files at the same time, using a bounded pool of
+          worker threads, rather than one variant after another.
+        - Skip variants with a response already stored in the
+          VariantValidator cache, and store the new responses.
+        - Send variants to VariantValidator in batches first, and
+          query the remaining variants individually.
+        - Return the response from fetch_vv for each variant, so
+          that patient_variant_table and variant_annotations_table
+          can process them in the order they were parsed.
+
+    - read_only_uri:
+        - Convert the filepath to a variant database into a URI that
+          opens it read-only, without creating a missing database.
+
+    - read_connection:
+        - Reuse a small pool of read-only connections to each
+          variant database between requests, rather than opening a
+          new connection for every query.
+
     -query_db:
         - Query the variant database using the patient/variant/
           gene queries entered by Users on the flask app and
@@ -50,16 +73,233 @@ Some of the code used in this script derived from ChatGPT.
 
 import os
 import time
+import pathlib
 import sqlite3
-from flask import flash
+import threading
+from contextlib import contextmanager
+from flask import flash, has_request_context
+from flask.globals import request_ctx
+from flask.sessions import SecureCookieSession
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from tools.utils.logger import logger
-from tools.utils.parser import variant_parser
-from tools.modules.vv_functions import fetch_vv
+from tools.utils.parser import variant_parser, VARIANT_FILE_EXTENSIONS
+from tools.modules.vv_functions import fetch_vv, fetch_vv_batch, VV_BATCH_SIZE
 from tools.utils.error_handlers import sqlite_error
-from tools.modules.clinvar_functions import clinvar_annotations
+from tools.utils.vv_cache import read_vv_cache, write_vv_cache
+from tools.modules.clinvar_functions import clinvar_annotations, connect_clinvar_db
+
+# The maximum number of requests that can be sent to VariantValidator at the same time. This is kept small so that
+# VariantValidator is not overloaded with requests. However many workers are used, the requests are also spaced at least
+# VV_MIN_INTERVAL seconds apart (vv_functions.py), so the overall rate stays within VariantValidator's fair-use limit.
+VV_MAX_WORKERS = 4
+
+# The indexes created on each table of a variant database, so that the patient, variant and gene queries and the join
+# between the two tables look up rows instead of scanning each table. idx_pv_patient also holds the variant, so that the
+# patient query reads a patient's variants from the index alone, in databases uploaded without the UNIQUE constraint
+# that patient_variant_table adds.
+DATABASE_INDEXES = {
+    "patient_variant": (
+        "CREATE INDEX IF NOT EXISTS idx_pv_variant ON patient_variant(variant)",
+        "CREATE INDEX IF NOT EXISTS idx_pv_patient ON patient_variant(patient_ID, variant)",
+    ),
+    "variant_annotations": (
+        "CREATE INDEX IF NOT EXISTS idx_va_nc ON variant_annotations(variant_NC)",
+        "CREATE INDEX IF NOT EXISTS idx_va_gene ON variant_annotations(gene)",
+        "CREATE INDEX IF NOT EXISTS idx_va_hgnc ON variant_annotations(HGNC_ID)",
+    ),
+}
+
+# The maximum number of connections that read_connection keeps open to each variant database. Each connection is used
+# by one thread at a time, so up to this many requests can read from the same database at once.
+READ_POOL_SIZE = 4
+
+# The connections opened by read_connection, which are reused between requests. Each database file has a pool with:
+#   - idle: the connections that are not being used by a thread.
+#   - open: the number of connections in the pool, including those that are being used.
+#   - stale: set when the database file has changed, so that its connections are closed once they are returned.
+_READ_CONNECTIONS = {}
+# Condition used while a pool is looked up in, or added to, _READ_CONNECTIONS and while a connection is taken from, or
+# returned to, a pool. Threads waiting for a connection are woken up when one is returned.
+_READ_CONNECTIONS_LOCK = threading.Condition()
+
+# PRAGMA statements applied once, when a connection is opened by read_connection:
+#   - cache_size: keep up to 64 MB of the database in memory, so that repeated queries do not read from disk.
+#   - temp_store: build the temporary tables used by DISTINCT and ORDER BY in memory.
+#   - mmap_size: read the database file through up to 256 MB of memory-mapped I/O.
+#   - query_only: the connection can never be used to change the database.
+READ_PRAGMAS = (
+    "PRAGMA cache_size = -65536",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA mmap_size = 268435456",
+    "PRAGMA query_only = ON",
+)
+
+# PRAGMA statements applied when patient_variant_table and variant_annotations_table connect to a variant database:
+#   - synchronous: only wait for the journal to reach the disk at the end of each file's transaction, rather than at
+#                  every step of the commit.
+#   - temp_store: build the temporary tables and indexes used while inserting in memory.
+#   - cache_size: keep up to 64 MB of the database in memory while the variants are added.
+# The journal mode is left as the default, so that each database stays a single .db file that can be downloaded and
+# uploaded again.
+WRITE_PRAGMAS = (
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA cache_size = -65536",
+)
+
+# The first 16 bytes of every SQLite3 database file, used to reject uploaded files that are not SQLite3 databases before
+# they are opened by validate_database.
+SQLITE_HEADER = b'SQLite format 3\x00'
+
+
+def fetch_vv_concurrently(variant_list):
+    """
+    This function queries VariantValidator for every variant in a list (usually the variants parsed from every uploaded
+    variant file) at the same time, through fetch_vv, using a bounded pool of worker threads. Variants with a response
+    stored in the VariantValidator cache (vv_cache.py) are not sent to VariantValidator again. The remaining variants
+    are first sent in batches through fetch_vv_batch, and only the variants that the batches could not resolve are sent
+    to fetch_vv individually. Every request waits for its turn through the rate limit shared by the worker threads
+    (VV_MIN_INTERVAL in vv_functions.py), so the workers overlap the time spent waiting for each response, while the
+    overall rate of requests stays within VariantValidator's fair-use limit.
+    Exceptions raised by fetch_vv are caught and stored in place of the response, so that they can be handled for each
+    variant by the function that called fetch_vv_concurrently.
+
+    :params: variant_list: A list of variants parsed from the variant files by variant_parser.
+
+                     E.g.: ['17-45983420-G-T', '4-89822305-C-G']
+
+    :output: vv_responses: A dictionary where each variant is a key and its value is the output from fetch_vv, or the
+                           exception raised by fetch_vv.
+
+                     E.g.: {'17-45983420-G-T': ('NC_000017.11:g.45983420G>T', 'NM_001377265.1:c.841G>T',
+                                                'NP_001364194.1:p.(Val281Phe)', 'MAPT', 'HGNC:6893'),
+                            '4-89822305-C-G': ConnectionError(...)}
+
+    :command: vv_responses = fetch_vv_concurrently(['17-45983420-G-T', '4-89822305-C-G'])
+    """
+
+    # Responses already stored in the VariantValidator cache do not need to be requested again.
+    cached_responses = read_vv_cache(variant_list)
+
+    # Create a dictionary to store the response from fetch_vv for each variant.
+    vv_responses = {}
+
+    # Each variant only needs to be queried once, even if it appears multiple times in the list.
+    unique_variants = [variant for variant in dict.fromkeys(variant_list) if variant not in cached_responses]
+
+    # Log the number of variants being sent to VariantValidator.
+    logger.info(f'fetch_vv_concurrently: Querying VariantValidator for {len(unique_variants)} variants, '
+                f'{VV_MAX_WORKERS} at a time...')
+
+    # Start the timer.
+    start = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=VV_MAX_WORKERS) as executor:
+        # The variants are first sent to VariantValidator in batches of up to VV_BATCH_SIZE variants.
+        batches = [unique_variants[i:i + VV_BATCH_SIZE] for i in range(0, len(unique_variants), VV_BATCH_SIZE)]
+        batch_futures = [executor.submit(fetch_vv_batch, batch) for batch in batches]
+
+        # Store the variants that were resolved by the batch requests.
+        for future in as_completed(batch_futures):
+            try:
+                vv_responses.update(future.result())
+
+            # If a batch fails, its variants are queried individually below.
+            except Exception as e:
+                logger.warning(f'fetch_vv_concurrently: fetch_vv_batch raised an exception: {e}')
+
+        # Log the number of variants that still need to be queried individually.
+        logger.info(f'fetch_vv_concurrently: {len(vv_responses)} variants resolved in batches; '
+                    f'{len(unique_variants) - len(vv_responses)} will be queried individually.')
+
+        # Create a dictionary to keep track of the variant that each request belongs to.
+        futures = {}
+
+        # fetch_vv sends flash messages to the User, which requires the request context from the flask app. Each worker
+        # thread is given its own copy of the request context with its own session, so that threads flashing at the
+        # same time do not overwrite each other's messages in the shared session. The messages are flashed again from
+        # this thread once every variant has been queried.
+        with_request_context = has_request_context()
+        flashed = {}
+
+        # Variants that were not resolved by the batch requests are queried individually through fetch_vv, which
+        # reports any problems with the variant to the User.
+        for variant in [variant for variant in unique_variants if variant not in vv_responses]:
+            if with_request_context:
+                future = executor.submit(_fetch_vv_in_context, request_ctx.copy(), variant)
+            else:
+                future = executor.submit(fetch_vv, variant)
+            futures[future] = variant
+
+        # Store each response as soon as it has been received.
+        for future in as_completed(futures):
+            variant = futures[future]
+            try:
+                if with_request_context:
+                    vv_responses[variant], flashed[variant] = future.result()
+                else:
+                    vv_responses[variant] = future.result()
+
+            # Store the exception so that it can be handled by the function processing this variant.
+            except Exception as e:
+                logger.error(f'fetch_vv_concurrently: fetch_vv raised an exception for {variant}: {e}')
+                vv_responses[variant] = e
+
+        # Flash the messages from the worker threads to the User, in the order that the variants were parsed.
+        for variant in unique_variants:
+            for category, message in flashed.get(variant, ()):
+                flash(message, category)
+
+    # Log how long it took to query VariantValidator for all of the variants.
+    logger.info(f'fetch_vv_concurrently: {len(unique_variants)} variants queried in '
+                f'{time.perf_counter() - start:.4f} seconds.')
+
+    # Store the new responses so that they do not need to be requested again.
+    write_vv_cache(vv_responses)
+
+    # Add the responses that were retrieved from the cache.
+    vv_responses.update(cached_responses)
+
+    return vv_responses
+
+
+def _fetch_vv_in_context(ctx, variant):
+    """
+    This function runs fetch_vv for fetch_vv_concurrently in a worker thread, inside a copy of the request context that
+    has its own session. The flash messages sent by fetch_vv are collected from that session and returned, so that they
+    can be flashed to the User from the thread handling the request.
+
+    :params: ctx: A copy of the request context from the flask app.
+
+         variant: A variant parsed from a variant file by variant_parser.
+
+            E.g.: '17-45983420-G-T'
+
+    :output: vv_response: The output from fetch_vv, or the exception raised by fetch_vv.
+
+             flashed: A list of the (category, message) pairs flashed by fetch_vv.
+
+               E.g.: [('message', '17-45983420-G-T: ⚠ VariantValidator Warning: ...')]
 
+    :command: vv_response, flashed = _fetch_vv_in_context(request_ctx.copy(), '17-45983420-G-T')
+    """
+
+    # Give the copy of the request context its own session, so that flash() does not write to the session shared with
+    # the other worker threads.
+    ctx.session = SecureCookieSession()
+
+    with ctx:
+        # Store the exception, so that the messages flashed before it was raised are still returned.
+        try:
+            vv_response = fetch_vv(variant)
+        except Exception as e:
+            logger.error(f'fetch_vv_concurrently: fetch_vv raised an exception for {variant}: {e}')
+            vv_response = e
 
-def patient_variant_table(filepath, db_name):
+        return vv_response, ctx.session.get('_flashes', [])
+
+
+def patient_variant_table(filepath, db_name, prepared=None):
     """
     This function creates a database, if it doesn't already exist.
     It creates or updates a table in the database called 'patient_variant', which is populated by patients and their
@@ -78,6 +318,13 @@ def patient_variant_table(filepath, db_name):
 
                  E.g.: 'my_database'
 
+             prepared: An optional dictionary shared between patient_variant_table and variant_annotations_table, for
+                       the same upload. patient_variant_table stores the variants it parsed from each file and the
+                       responses from VariantValidator in it, so that variant_annotations_table does not parse the
+                       files or query VariantValidator again.
+
+                 E.g.: {}
+
     :output: A database containing the patient_variant table.
              The database will be saved at: '/<path>/<from>/<root>/<to>/<base>/<directory>/<of>/
                                               Software_Engineering_Assessment_2025_AR_RW_RS/database/my_database.db'
@@ -111,10 +358,10 @@ def patient_variant_table(filepath, db_name):
     # Create a list of the filepaths to all the variant files in the 'temp' subdirectory.
     variant_paths = []
 
-    # Iterate through the files in the filepath provided by the user and add the files with a .vcf or .csv extension to
-    # the vcf_paths list.
+    # Iterate through the files in the filepath provided by the user and add the files with a .vcf or .csv extension
+    # (including compressed .vcf.gz files, in upper or lower case) to the vcf_paths list.
     for file in os.listdir(filepath):
-        if file.endswith('.vcf') or file.endswith('.csv'):
+        if file.lower().endswith(VARIANT_FILE_EXTENSIONS):
             variant_paths.append(f'{filepath}/{file}')
         else:
             continue
@@ -152,6 +399,10 @@ def patient_variant_table(filepath, db_name):
         # Log the filepath to the database.
         logger.info(f'patient_variant_table: Connected to {db_name}.db: {db_path}')
 
+        # Apply the PRAGMA statements that speed up adding variants to the database.
+        for pragma in WRITE_PRAGMAS:
+            cursor.execute(pragma)
+
         # Create the patient_variant table if it does not already exist. UNIQUE groups the patient_ID and variant
         # together to ensure that they can only appear together, once, in the table.
         cursor.execute("""
@@ -190,6 +441,10 @@ def patient_variant_table(filepath, db_name):
         # Return an 'error' message to be processed by app.py.
         return 'error'
 
+    # Create a list to store the variants parsed from each file, so that the variants from every file can be sent to
+    # VariantValidator together.
+    parsed_files = []
+
     # Iterate through the absolute filepaths to the .vcf files.
     for path in variant_paths:
 
@@ -236,19 +491,37 @@ def patient_variant_table(filepath, db_name):
             # Log the list of variants that were parsed.
             logger.debug(f'patient_variant_table: Variant list: {variant_list}')
 
-        # VariantValidator is queried through fetch_vv to retrieve the NC_ genomic description of each
-        # variant in the variant_list, in HGVS nomenclature.
+        # Store the file and the variants parsed from it.
+        parsed_files.append((file, patient_name, variant_list))
+
+    # VariantValidator is queried through fetch_vv to retrieve the NC_ genomic description of each variant, in HGVS
+    # nomenclature. The variants from every file are queried concurrently, in a single pool.
+    vv_responses = fetch_vv_concurrently(
+        [variant for _, _, variant_list in parsed_files for variant in variant_list])
+
+    # Share the parsed variants and the VariantValidator responses with variant_annotations_table.
+    if prepared is not None:
+        prepared['parsed_files'] = parsed_files
+        prepared['vv_responses'] = vv_responses
+
+    # Iterate through the variants parsed from each file.
+    for file, patient_name, variant_list in parsed_files:
+
+        # Create a list to store the patient ID and HGVS genomic description of each variant in this file, so that they
+        # are added to the patient_variant table together.
+        patient_variant_rows = []
+
         for variant in variant_list:
-            # Log the file and variant that is being queried on VariantValidator.
-            logger.info(f"patient_variant_table: Querying VariantValidator for {file}: {variant}")
+            # Log the file and variant that was queried on VariantValidator.
+            logger.info(f"patient_variant_table: Processing VariantValidator response for {file}: {variant}")
 
-            # Check that the HGVS genomic description can be retrieved from VariantValidator.
+            # Check that the HGVS genomic description was retrieved from VariantValidator.
             try:
-                # Use the fetch_vv function to get the HGVS genomic description.
-                variant_info = fetch_vv(variant)
-                # The time module creates a 0.5s delay after each request to VariantValidator , so that VV is not
-                # overloaded with requests.
-                time.sleep(0.5)
+                # Get the HGVS genomic description returned by fetch_vv.
+                variant_info = vv_responses[variant]
+                # Raise the exception again if fetch_vv failed, so that it is handled below.
+                if isinstance(variant_info, Exception):
+                    raise variant_info
 
             # Raise an exception if fetch_vv is not working.
             except Exception as e:
@@ -292,36 +565,58 @@ def patient_variant_table(filepath, db_name):
                     logger.info(
                         f'patient_variant_table: {file}: {variant}: VariantValidator returned {variant_info[0]}.')
 
-                # Check that the patient ID and corresponding variant can be added to the patient_variant table.
-                try:
-                    cursor.execute("INSERT OR IGNORE INTO patient_variant (patient_ID, variant) VALUES (?, ?)",
-                                   (patient_name, variant_info[0]))
+                # Store the patient ID and corresponding variant, to be added to the patient_variant table.
+                patient_variant_rows.append((patient_name, variant_info[0]))
 
-                    logger.info(f'{file}: {variant}: {patient_name} and {variant_info[0]} '
-                                f'successfully added to patient_variant table.')
+        # If none of the variants from this file can be added to the patient_variant table, move on to the next file.
+        if not patient_variant_rows:
+            continue
 
-                # Error handler executed when exceptions related to sqlite3 are raised.
-                except (sqlite3.OperationalError, sqlite3.DatabaseError, sqlite3.ProgrammingError) as e:
-                    # sqlite_error function logs the errors appropriately.
-                    sqlite_error(e, f'{db_name}.db')
-                    logger.error(
-                        f'patient_variant_table SQLite3 Error: '
-                        f'Failed to enter {patient_name} and {variant_info[0]} into patient_variant table.')
-                    flash(f'❌ patient_variant_table: SQLite3 Error: '
-                          f'Could not add {patient_name} and {variant_info[0]} to {db_name}.db.')
-                    # Continue to the next variant.
-                    continue
+        # Check that the patient ID and the variants from this file can be added to the patient_variant table. The
+        # variants are added with a single executemany, rather than one INSERT per variant.
+        try:
+            cursor.executemany("INSERT OR IGNORE INTO patient_variant (patient_ID, variant) VALUES (?, ?)",
+                               patient_variant_rows)
 
-                # Raise an exception if the patient ID and/or variant description cannot be added to the
-                # patient_variant table.
-                except Exception as e:
-                    logger.error(f'patient_variant_table Error: Failed to enter {patient_name} and {variant_info[0]} '
-                                 f'into patient_variant table: {e}')
-                    # Notify the user of that there was an error while preparing the database.
-                    flash(f'❌ patient_variant_table Error: '
-                          f'Could not add {patient_name} and {variant_info[0]} to {db_name}.db.')
-                    # Continue to the next variant.
-                    continue
+            logger.info(f'{file}: {len(patient_variant_rows)} variants from {patient_name} '
+                        f'successfully added to patient_variant table.')
+
+        # Error handler executed when exceptions related to sqlite3 are raised.
+        except (sqlite3.OperationalError, sqlite3.DatabaseError, sqlite3.ProgrammingError) as e:
+            # sqlite_error function logs the errors appropriately.
+            sqlite_error(e, f'{db_name}.db')
+            logger.error(
+                f'patient_variant_table SQLite3 Error: '
+                f'Failed to enter {patient_name} and the variants from {file} into patient_variant table.')
+            flash(f'❌ patient_variant_table: SQLite3 Error: '
+                  f'Could not add {patient_name} and the variants from {file} to {db_name}.db.')
+            # Discard any variants from this file that were added before the error, then continue to the next file.
+            conn.rollback()
+            continue
+
+        # Raise an exception if the patient ID and/or variant descriptions cannot be added to the patient_variant
+        # table.
+        except Exception as e:
+            logger.error(f'patient_variant_table Error: Failed to enter {patient_name} and the variants from {file} '
+                         f'into patient_variant table: {e}')
+            # Notify the user of that there was an error while preparing the database.
+            flash(f'❌ patient_variant_table Error: '
+                  f'Could not add {patient_name} and the variants from {file} to {db_name}.db.')
+            # Discard any variants from this file that were added before the error, then continue to the next file.
+            conn.rollback()
+            continue
+
+        # Save (commit) the variants from this file before moving on to the next file, so that the variants that have
+        # already been processed are kept in {db_name}.db if a later file cannot be processed.
+        try:
+            conn.commit()
+            logger.info(f'patient_variant_table: Variants from {file} committed to patient_variant table.')
+
+        # Error handler executed when exceptions related to sqlite3 are raised.
+        except (sqlite3.OperationalError, sqlite3.DatabaseError, sqlite3.ProgrammingError) as e:
+            # sqlite_error function logs the errors appropriately.
+            sqlite_error(e, f'{db_name}.db')
+            logger.error(f'patient_variant_table SQLite3 Error: Failed to commit variants from {file} to patient_variant table.')
 
     # Save (commit) changes to the database.
     conn.commit()
@@ -346,6 +641,11 @@ def patient_variant_table(filepath, db_name):
             # Return an 'error' message to be processed by app.py.
             return 'error'
         else:
+            # Create the indexes on the patient_variant table if they do not already exist. They are created after the
+            # variants have been added, so that the indexes of a new database are built once from every row, instead
+            # of being updated as each row is inserted. The indexes of an existing database are kept and updated.
+            for statement in DATABASE_INDEXES["patient_variant"]:
+                cursor.execute(statement)
             # A message is logged and shown to the user to indicate that the database was successfully created or
             # updated.
             logger.info(f'Patient_variant table in {db_name}.db created/updated successfully!')
@@ -377,7 +677,7 @@ def patient_variant_table(filepath, db_name):
         return 'error'
 
 
-def variant_annotations_table(filepath, db_name):
+def variant_annotations_table(filepath, db_name, prepared=None):
     """
     This function creates a database, if it doesn't already exist.
     It then creates or updates a table in the database called 'variant_annotations', which is populated by variants
@@ -399,6 +699,13 @@ def variant_annotations_table(filepath, db_name):
 
                  E.g.: 'my_database'
 
+             prepared: An optional dictionary shared between patient_variant_table and variant_annotations_table, for
+                       the same upload. patient_variant_table stores the variants it parsed from each file and the
+                       responses from VariantValidator in it, so that variant_annotations_table does not parse the
+                       files or query VariantValidator again.
+
+                 E.g.: {}
+
     :output: A database containing the variant_annotations table.
              The database will be saved at: '/<path>/<from>/<root>/<to>/<base>/<directory>/<of>/
                                               Software_Engineering_Assessment_2025_AR_RW_RS/database/my_database.db'
@@ -435,10 +742,10 @@ def variant_annotations_table(filepath, db_name):
     # Create a list of the filepaths to all the variant files in the 'temp' subdirectory.
     vcf_paths = []
 
-    # Iterate through the files in the filepath provided by the user and add the files with a .vcf or .csv extension to
-    # the vcf_paths list.
+    # Iterate through the files in the filepath provided by the user and add the files with a .vcf or .csv extension
+    # (including compressed .vcf.gz files, in upper or lower case) to the vcf_paths list.
     for file in os.listdir(filepath):
-        if file.endswith('.vcf') or file.endswith('.csv'):
+        if file.lower().endswith(VARIANT_FILE_EXTENSIONS):
             vcf_paths.append(f'{filepath}/{file}')
         else:
             continue
@@ -476,6 +783,10 @@ def variant_annotations_table(filepath, db_name):
         # Log the filepath to the database.
         logger.debug(f'variant_annotations_table: Connected to database: {db_path}')
 
+        # Apply the PRAGMA statements that speed up adding variants to the database.
+        for pragma in WRITE_PRAGMAS:
+            cursor.execute(pragma)
+
         # Create the variant_annotations table if it does not already exist. UNIQUE groups the variant_NC, variant_NM,
         # and variant_NP together to ensure that they can only appear once in the table together.
         cursor.execute("""
@@ -521,52 +832,87 @@ def variant_annotations_table(filepath, db_name):
         # Return an 'error' message to be processed by app.py.
         return 'error'
 
-    # Iterate through the absolute filepaths to the .vcf files.
-    for path in vcf_paths:
+    # If patient_variant_table has already parsed the files and queried VariantValidator for this upload, reuse the
+    # variants and responses instead of doing it again.
+    if prepared and 'parsed_files' in prepared:
+        parsed_files = prepared['parsed_files']
+        vv_responses = prepared['vv_responses']
+        logger.info(f'variant_annotations_table: Reusing the variants parsed from {len(parsed_files)} files and their '
+                    f'VariantValidator responses.')
 
-        # Take the file name from the filepath to annotate the flash messages and logs.
-        file = path.split('/')[-1]
+    else:
+        # Create a list to store the variants parsed from each file, so that the variants from every file can be sent
+        # to VariantValidator together.
+        parsed_files = []
 
-        # The patient's ID appears in the filepath, after the final directory, which ends in a '/', and before the
-        # .vcf file extension.
-        patient_name = path.split('/')[-1].split('.')[0]
+        # Iterate through the absolute filepaths to the .vcf files.
+        for path in vcf_paths:
 
-        # Log the patient's name being added to the table.
-        logger.info(f'variant_annotations_table: Processing variants from {patient_name}...')
-        # Log the file path where the variants derive from.
-        logger.debug(f'variant_annotations_table: Parsing variants from {path}...')
+            # Take the file name from the filepath to annotate the flash messages and logs.
+            file = path.split('/')[-1]
 
-        try:
-            # Apply the variant_parser function to extract the variants listed in the files.
-            variant_list = variant_parser(path)
+            # The patient's ID appears in the filepath, after the final directory, which ends in a '/', and before
+            # the .vcf file extension.
+            patient_name = path.split('/')[-1].split('.')[0]
 
-            # Log how many variants were parsed and from which file.
-            logger.info(f'variant_annotations_table: {len(variant_list)} variants parsed from {file}')
+            # Log the patient's name being added to the table.
+            logger.info(f'variant_annotations_table: Processing variants from {patient_name}...')
+            # Log the file path where the variants derive from.
+            logger.debug(f'variant_annotations_table: Parsing variants from {path}...')
 
-            # Log which variants have been parsed.
-            logger.debug(f'variant_annotations_table: Parsed from {file}: {variant_list}')
+            try:
+                # Apply the variant_parser function to extract the variants listed in the files.
+                variant_list = variant_parser(path)
 
-        # Raise an exception if variant_parser failed.
-        except Exception as e:
-            logger.error(f'variant_annotations_table: Failed to parse variants from {file}: {e}')
-            # Notify the User f variants could not be parsed.
-            flash(f"❌ Could not parse variants from {file}. Please check the file format or path to 'temp' directory.")
-            continue
+                # Log how many variants were parsed and from which file.
+                logger.info(f'variant_annotations_table: {len(variant_list)} variants parsed from {file}')
+
+                # Log which variants have been parsed.
+                logger.debug(f'variant_annotations_table: Parsed from {file}: {variant_list}')
+
+            # Raise an exception if variant_parser failed.
+            except Exception as e:
+                logger.error(f'variant_annotations_table: Failed to parse variants from {file}: {e}')
+                # Notify the User f variants could not be parsed.
+                flash(f"❌ Could not parse variants from {file}. "
+                      f"Please check the file format or path to 'temp' directory.")
+                continue
+
+            # Store the file and the variants parsed from it.
+            parsed_files.append((file, patient_name, variant_list))
 
         # Data is then assigned to each header:
 
         # VariantValidator is queried through fetchVV to retrieve the NC_, NM_ and NP_ accession numbers of each
-        # variant in the variant_list, in HGVS nomenclature.
+        # variant, in HGVS nomenclature. The variants from every file are queried concurrently, in a single pool.
+        vv_responses = fetch_vv_concurrently(
+            [variant for _, _, variant_list in parsed_files for variant in variant_list])
+
+    # Open one connection to clinvar.db, to be used for every variant.
+    clinvar_conn = connect_clinvar_db()
+
+    # Store the response from clinvar_annotations for each pair of HGVS descriptions, so that variants that are
+    # described the same way by VariantValidator (e.g. the same variant uploaded for several patients) are only looked
+    # up in clinvar.db once.
+    clinvar_responses = {}
+
+    # Iterate through the variants parsed from each file.
+    for file, patient_name, variant_list in parsed_files:
+
+        # Create a list to store the HGVS descriptions, gene symbol, HGNC ID and ClinVar annotations of each variant in
+        # this file, so that they are added to the variant_annotations table together.
+        annotation_rows = []
+
         for variant in variant_list:
 
-            # Log when VariantValidator is being queried.
-            logger.info(f'variant_annotations_table: {file}: Querying VariantValidator for {variant}...')
+            # Log when the response from VariantValidator is being processed.
+            logger.info(f'variant_annotations_table: {file}: Processing VariantValidator response for {variant}...')
 
             try:
-                vv_response = fetch_vv(variant)
-                # The time module creates a 0.5s delay after each request to Variant Validator (VV), so that VV is not
-                # overloaded with requests.
-                time.sleep(0.5)
+                vv_response = vv_responses[variant]
+                # Raise the exception again if fetch_vv failed, so that it is handled below.
+                if isinstance(vv_response, Exception):
+                    raise vv_response
 
             # Raise an exception if fetch_vv is not working.
             except Exception as e:
@@ -619,7 +965,14 @@ def variant_annotations_table(filepath, db_name):
             logger.info(f'variant_annotations_table: {file}: {variant}: Querying clinvar.db for {nc_variant}...')
 
             try:
-                clinvar_response = clinvar_annotations(nc_variant, nm_variant)
+                # Reuse the response if these HGVS descriptions have already been looked up.
+                if (nc_variant, nm_variant) in clinvar_responses:
+                    clinvar_response = clinvar_responses[(nc_variant, nm_variant)]
+                    logger.debug(f'variant_annotations_table: {file}: {variant}: '
+                                 f'Reusing clinvar.db response for {nc_variant}.')
+                else:
+                    clinvar_response = clinvar_annotations(nc_variant, nm_variant, conn=clinvar_conn)
+                    clinvar_responses[(nc_variant, nm_variant)] = clinvar_response
 
             # Raise an exception if clinvar_annotations is not working.
             except Exception as e:
@@ -654,58 +1007,13 @@ def variant_annotations_table(filepath, db_name):
                     stars = clinvar_response['stars']
                     review_status = clinvar_response['reviewstatus']
 
-                    # The HGVS nomenclatures, gene symbol, HGNC ID and ClinVar annotations for each variant are added
-                    # to the variant_annotations table. If the HGVS descriptions already exist in the table as a set,
-                    # another entry will not be created in the table.
-                    try:
-                        cursor.execute("""
-                                       INSERT INTO variant_annotations
-                                       (variant_NC, variant_NM, variant_NP, gene, HGNC_ID, 
-                                        classification, conditions, stars, review_status)
-                                       VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-                                       ON CONFLICT(variant_NC, variant_NM, variant_NP)
-                                       DO UPDATE SET
-                                           gene = excluded.gene,
-                                           HGNC_ID = excluded.HGNC_ID,
-                                           classification = excluded.classification,
-                                           conditions = excluded.conditions,
-                                           stars = excluded.stars,
-                                          review_status = excluded.review_status
-                                       """, (
-                                           nc_variant, nm_variant, np_variant,
-                                           gene_symbol, hgnc_id,
-                                           classification, conditions, stars, review_status
-                        ))
-
-                        # Log that the variant_annotations table exists and can be populated.
-                        logger.info(f'{file}: {variant}: Successfully populated variant_annotations table with ClinVar '
-                                    f'annotations.')
-
-                    # Error handler executed when exceptions related to sqlite3 are raised.
-                    except (sqlite3.OperationalError, sqlite3.DatabaseError, sqlite3.ProgrammingError) as e:
-                        # sqlite_error function logs the errors appropriately and returns an error message which can be
-                        # implemented into a flash message, on the homepage page.
-                        sqlite_error(e, db_name)
-                        logger.error(f'variant_annotations_table SQLite3 Error: Failed to populate variant_annotations '
-                                     f'table with {variant} from {patient_name} and {clinvar_response}: {e}')
-                        flash(f'❌ variant_annotations_table SQLite3 Error: Variant annotations could be not be added '
-                              f'to variant_annotations table. Variant not added to {db_name}.db.')
-                        # Close the connection to the database.
-                        conn.close()
-                        continue
-
-                    # Raise an exception if the patient name and variant could not be entered into the
-                    # variant_annotations table.
-                    except Exception as e:
-                        logger.error(
-                            f'variant_annotations_table Error: Failed to populate variant_annotations table with '
-                            f'{variant} from {patient_name} and {clinvar_response}: {e}')
-                        # Notify the user of that there was an error while preparing the database.
-                        flash(f'❌ variant_annotations_table Error: Variant annotations could be not be added to '
-                              f'variant_annotations table. Variant not added to {db_name}.db.')
-                        # Close the connection to the database.
-                        conn.close()
-                        continue
+                    # Store the HGVS nomenclatures, gene symbol, HGNC ID and ClinVar annotations for the variant, to
+                    # be added to the variant_annotations table.
+                    annotation_rows.append((
+                        nc_variant, nm_variant, np_variant,
+                        gene_symbol, hgnc_id,
+                        classification, conditions, stars, review_status
+                    ))
 
             # Raise an exception if an error is not caught within the try statement.
             except Exception as e:
@@ -718,6 +1026,75 @@ def variant_annotations_table(filepath, db_name):
                     f'{file}: {variant}: ❌ Unable to query clinvar.db for this variant. Variant not added to {db_name}.db.')
                 continue
 
+        # If none of the variants from this file can be added to the variant_annotations table, move on to the next
+        # file.
+        if not annotation_rows:
+            continue
+
+        # The HGVS nomenclatures, gene symbol, HGNC ID and ClinVar annotations for the variants in this file are added
+        # to the variant_annotations table with a single executemany, rather than one INSERT per variant. If the HGVS
+        # descriptions already exist in the table as a set, another entry will not be created in the table.
+        try:
+            cursor.executemany("""
+                               INSERT INTO variant_annotations
+                               (variant_NC, variant_NM, variant_NP, gene, HGNC_ID, 
+                                classification, conditions, stars, review_status)
+                               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                               ON CONFLICT(variant_NC, variant_NM, variant_NP)
+                               DO UPDATE SET
+                                   gene = excluded.gene,
+                                   HGNC_ID = excluded.HGNC_ID,
+                                   classification = excluded.classification,
+                                   conditions = excluded.conditions,
+                                   stars = excluded.stars,
+                                   review_status = excluded.review_status
+                               """, annotation_rows)
+
+            # Log that the variant_annotations table was populated with the variants from this file.
+            logger.info(f'{file}: Successfully populated variant_annotations table with ClinVar annotations for '
+                        f'{len(annotation_rows)} variants.')
+
+        # Error handler executed when exceptions related to sqlite3 are raised.
+        except (sqlite3.OperationalError, sqlite3.DatabaseError, sqlite3.ProgrammingError) as e:
+            # sqlite_error function logs the errors appropriately and returns an error message which can be
+            # implemented into a flash message, on the homepage page.
+            sqlite_error(e, db_name)
+            logger.error(f'variant_annotations_table SQLite3 Error: Failed to populate variant_annotations '
+                         f'table with the variants from {patient_name}: {e}')
+            flash(f'❌ variant_annotations_table SQLite3 Error: Variant annotations could be not be added '
+                  f'to variant_annotations table. Variants from {file} not added to {db_name}.db.')
+            # Discard any variants from this file that were added before the error, then continue to the next file.
+            conn.rollback()
+            continue
+
+        # Raise an exception if the variants could not be entered into the variant_annotations table.
+        except Exception as e:
+            logger.error(
+                f'variant_annotations_table Error: Failed to populate variant_annotations table with '
+                f'the variants from {patient_name}: {e}')
+            # Notify the user of that there was an error while preparing the database.
+            flash(f'❌ variant_annotations_table Error: Variant annotations could be not be added to '
+                  f'variant_annotations table. Variants from {file} not added to {db_name}.db.')
+            # Discard any variants from this file that were added before the error, then continue to the next file.
+            conn.rollback()
+            continue
+
+        # Save (commit) the variants from this file before moving on to the next file, so that the variants that have
+        # already been processed are kept in {db_name}.db if a later file cannot be processed.
+        try:
+            conn.commit()
+            logger.info(f'variant_annotations_table: Variants from {file} committed to variant_annotations table.')
+
+        # Error handler executed when exceptions related to sqlite3 are raised.
+        except (sqlite3.OperationalError, sqlite3.DatabaseError, sqlite3.ProgrammingError) as e:
+            # sqlite_error function logs the errors appropriately.
+            sqlite_error(e, f'{db_name}.db')
+            logger.error(f'variant_annotations_table SQLite3 Error: Failed to commit variants from {file} to variant_annotations table.')
+
+    # Close the connection to clinvar.db.
+    if clinvar_conn is not None:
+        clinvar_conn.close()
+
     # Save (commit) changes.
     conn.commit()
 
@@ -742,6 +1119,11 @@ def variant_annotations_table(filepath, db_name):
             return 'error'
 
         else:
+            # Create the indexes on the variant_annotations table if they do not already exist. They are created after
+            # the variants have been added, so that the indexes of a new database are built once from every row, instead
+            # of being updated as each row is inserted. The indexes of an existing database are kept and updated.
+            for statement in DATABASE_INDEXES["variant_annotations"]:
+                cursor.execute(statement)
             # A message is logged and shown to the user to indicate that the database was successfully created or
             # updated.
             logger.info(f'variant_annotations table in {db_name}.db created/updated successfully!')
@@ -814,14 +1196,36 @@ def validate_database(db_path):
 
     # Check if the database specified in this function's argument can be connected to and queried using SQLite3.
     try:
+        # Every SQLite3 database begins with the same 16-byte header. Reading it first rejects a file that has been
+        # given a '.db' extension but is not an SQLite3 database, without opening it as a database.
+        if os.path.isfile(db_path):
+            with open(db_path, 'rb') as db_file:
+                header = db_file.read(16)
+            if header != SQLITE_HEADER:
+                # Log that the uploaded file is not an SQLite3 database.
+                logger.warning(f'{db_name} is not an SQLite3 database: it does not begin with the SQLite3 header.')
+                # Notify the User that the uploaded file is not an SQLite3 database.
+                flash(f'⚠ {db_name} is not an SQLite3 database.')
+                # Return False. False will delete the uploaded database from this software package's 'databases'
+                # folder, using a boolean in app.py.
+                return False
+
         # The 'with' keyword opens a connection to the uploaded database and closes it automatically after the
         # validation check has been performed.
         with sqlite3.connect(db_path) as conn:
             cur = conn.cursor()
-            # Find the names of the tables in the database.
-            cur.execute("SELECT name FROM sqlite_master WHERE type='table';")
-            # Return the name of each table in the database.
-            tables = {row[0] for row in cur.fetchall()}
+            # Find the headers of the 'patient_variant' and 'variant_annotations' tables with a single query, which
+            # joins the list of tables in the database to the headers of each table. A table that is missing from the
+            # database will not be returned.
+            placeholders = ', '.join('?' * len(EXPECTED_SCHEMA))
+            cur.execute(f"SELECT m.name, p.name FROM sqlite_master AS m JOIN pragma_table_info(m.name) AS p "
+                        f"WHERE m.type = 'table' AND m.name IN ({placeholders});", tuple(EXPECTED_SCHEMA))
+            # Sort the headers into the table that they belong to.
+            columns = {table: set() for table in EXPECTED_SCHEMA}
+            for table, column in cur.fetchall():
+                columns[table].add(column)
+            # The expected tables that were found in the database.
+            tables = {table for table, cols in columns.items() if cols}
 
             # Check that the uploaded database contains a table called 'patient_variant' and another called
             # 'variant_annotations'.
@@ -837,10 +1241,8 @@ def validate_database(db_path):
 
             # Iterate through the expected tables (table) and respective headers in each table (expected_cols).
             for table, expected_cols in EXPECTED_SCHEMA.items():
-                # Find the headers of the 'patient_variant' and 'variant_annotations' tables in the database.
-                cur.execute(f"PRAGMA table_info({table});")
-                # Return the name of each header in the aforementioned tables.
-                cols = {row[1] for row in cur.fetchall()}
+                # The headers found in the table.
+                cols = columns[table]
                 # Check that the uploaded database contains the expected headers in its 'patient_variant' and
                 # 'variant_annotations' tables.
                 if not expected_cols <= cols:
@@ -852,6 +1254,21 @@ def validate_database(db_path):
                     # folder, using a boolean in app.py.
                     return False
 
+            # Create the indexes that the queries on the flask app rely on, if the uploaded database does not already
+            # have them, then update the statistics used by SQLite3 to plan queries. The database can still be queried
+            # without them, so an error here does not fail the validation.
+            try:
+                for statements in DATABASE_INDEXES.values():
+                    for statement in statements:
+                        cur.execute(statement)
+                cur.execute("ANALYZE;")
+                conn.commit()
+                # Log that the indexes were created.
+                logger.info(f'Indexes created on {db_name}.')
+            except (sqlite3.OperationalError, sqlite3.DatabaseError) as e:
+                # Log that the indexes could not be created.
+                logger.warning(f'Could not create indexes on {db_name}: {e}')
+
         # If the uploaded database consists of the expected schema, return True. True will pass the validation check
         # and enable the database to be queried.
         return True
@@ -878,7 +1295,141 @@ def validate_database(db_path):
         return False
 
 
-def query_db(db_path, query, args=(), one=False):
+def read_only_uri(db_path):
+    """
+    This function converts the filepath to a variant database into an SQLite3 URI that opens the database read-only.
+    Unlike a filepath, the URI cannot be used to create a new database: sqlite3.connect raises an OperationalError if
+    the database file does not exist.
+
+    :params: db_path: The filepath to the variant database.
+               E.g.: '/<path>/<to>/Software_Engineering_Assessment_2025_AR_RW_RS/databases/my_database.db'
+
+    :output: The URI of the database, to be passed to sqlite3.connect with uri=True.
+       E.g.: 'file:///<path>/<to>/Software_Engineering_Assessment_2025_AR_RW_RS/databases/my_database.db?mode=ro'
+
+    :command: conn = sqlite3.connect(read_only_uri(db_path), uri=True)
+    """
+
+    return f'{pathlib.Path(os.path.abspath(db_path)).as_uri()}?mode=ro'
+
+
+def _open_read_connection(db_path):
+    """
+    This function opens a read-only connection to a variant database for the pool in read_connection, that returns
+    sqlite3.Row objects and has the READ_PRAGMAS applied. The database is opened with read_only_uri, so that a missing database file is not created.
+
+    :params: db_path: The absolute filepath to the variant database.
+               E.g.: '/<path>/<to>/Software_Engineering_Assessment_2025_AR_RW_RS/databases/my_database.db'
+
+    :output: conn: A read-only sqlite3 connection to the database.
+
+    :command: conn = _open_read_connection(db_path)
+    """
+
+    # check_same_thread=False allows the connection to be used by the thread handling a later request.
+    conn = sqlite3.connect(read_only_uri(db_path), uri=True, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    for pragma in READ_PRAGMAS:
+        conn.execute(pragma)
+
+    return conn
+
+
+@contextmanager
+def read_connection(db_path):
+    """
+    This function provides a connection to a variant database that is only used to read from it. Instead of opening a
+    new connection for every query, each connection is opened once, with the READ_PRAGMAS applied, and kept in a pool
+    of up to READ_POOL_SIZE connections to the database, which are reused by later requests to the flask app. Each
+    connection is only used by one thread at a time, and a thread only waits when every connection in the pool is in
+    use.
+
+    Pools are stored against the filepath, inode and modification time of the database file, so that a database which
+    is changed, or deleted and uploaded again with the same name, is connected to again. The connections to the
+    previous database file are closed once they are no longer being used. If the database file cannot be found, a new
+    connection is opened and closed as before.
+
+    :params: db_path: The absolute filepath to the variant database.
+               E.g.: '/<path>/<to>/Software_Engineering_Assessment_2025_AR_RW_RS/databases/my_database.db'
+
+    :output: conn: A sqlite3 connection to the database, that returns sqlite3.Row objects.
+
+    :command: with read_connection(db_path) as conn:
+                  rows = conn.execute("SELECT DISTINCT gene FROM variant_annotations").fetchall()
+    """
+
+    # Identify the database file.
+    try:
+        stat = os.stat(db_path)
+
+    # If the database file cannot be found, the connection is not reused. It is still opened read-only, so that an
+    # empty database is not created at the filepath.
+    except OSError:
+        conn = sqlite3.connect(read_only_uri(db_path), uri=True)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+        return
+
+    key = (os.path.abspath(db_path), stat.st_dev, stat.st_ino, stat.st_mtime_ns)
+
+    with _READ_CONNECTIONS_LOCK:
+        pool = _READ_CONNECTIONS.get(key)
+
+        # Create a pool for the database, if one has not already been created.
+        if pool is None:
+            # Retire the pools for any previous database file with the same filepath. Their idle connections are
+            # closed now, and the connections still being used are closed when they are returned.
+            for old_key in [k for k in _READ_CONNECTIONS if k[0] == key[0]]:
+                old_pool = _READ_CONNECTIONS.pop(old_key)
+                old_pool['stale'] = True
+                for old_conn in old_pool['idle']:
+                    old_conn.close()
+                old_pool['open'] -= len(old_pool['idle'])
+                old_pool['idle'].clear()
+
+            pool = {'idle': [], 'open': 0, 'stale': False}
+            _READ_CONNECTIONS[key] = pool
+
+        # Wait for a connection to be returned, if every connection in the pool is being used.
+        while not pool['idle'] and pool['open'] >= READ_POOL_SIZE:
+            _READ_CONNECTIONS_LOCK.wait()
+
+        # Reuse an idle connection, or reserve a place in the pool for a new connection.
+        conn = pool['idle'].pop() if pool['idle'] else None
+        if conn is None:
+            pool['open'] += 1
+
+    # Open the new connection outside of the lock, so that other threads are not held up.
+    if conn is None:
+        try:
+            conn = _open_read_connection(db_path)
+        except Exception:
+            # Give the reserved place in the pool back.
+            with _READ_CONNECTIONS_LOCK:
+                pool['open'] -= 1
+                _READ_CONNECTIONS_LOCK.notify()
+            raise
+        # Log that a connection to the database was opened.
+        logger.debug(f'read_connection: Opened a read-only connection to {db_path}')
+
+    try:
+        yield conn
+    finally:
+        with _READ_CONNECTIONS_LOCK:
+            # Close the connection if the database file has changed while it was being used, otherwise return it to
+            # the pool for the next thread.
+            if pool['stale']:
+                conn.close()
+                pool['open'] -= 1
+            else:
+                pool['idle'].append(conn)
+            _READ_CONNECTIONS_LOCK.notify_all()
+
+
+def query_db(db_path, query, args=(), one=False, as_tuples=False):
     """
     This function is applied on the query page of this software packages flask app (app.py).
     This function applies the SQLite3 query formulated by the User when they query their selected database on the flask
@@ -920,6 +1471,12 @@ def query_db(db_path, query, args=(), one=False):
                       True returns only the first row returned from the query or None. None type returns are error
                       handled in a particular, in app.py
 
+           as_tuples: This boolean flag indicates whether the rows are returned as tuples rather than sqlite3.Row
+                      objects. It is set to False by default. Tuples use less memory than sqlite3.Row objects, which
+                      matters when every row in a large database is returned, but the values can only be accessed in
+                      the order that the columns were selected in the query.
+                E.g.: True returns [('Patient1', 'NC_000019.10:g.41968837C>G', ...), ...]
+
     :output: rv: A list of sqlite3.Row objects. Each object represents a response from the query. Values held within the
                  object are in dictionary format, where the headers that they were stored under are assigned as the key
                  to the value.
@@ -942,15 +1499,17 @@ def query_db(db_path, query, args=(), one=False):
 
     # Check that the SQLite3 query can be applied to the specified database.
     try:
-        # The 'with' keyword opens a connection to the database being queried and closes it automatically after the
-        # query has been applied.
-        with sqlite3.connect(db_path) as conn:
+        # read_connection provides the connection to the database being queried, which is reused between queries.
+        with read_connection(db_path) as conn:
             # Converts each row in the database into a dictionary type, where each value is assigned to a key named
             # after the respective header that it was under.
             conn.row_factory = sqlite3.Row
             # Apply the query to the database and return the entries returned by the query to the object 'cur'.
             # args inserts the search term entered by the User into the query.
             cur = conn.execute(query, args)
+            # Return each row as a plain tuple, rather than an sqlite3.Row object, if requested.
+            if as_tuples:
+                cur.row_factory = None
             # Fetch all the results returned by the query.
             rv = cur.fetchall()
             # 'one' is automatically set to False when query_db() starts.
@@ -14,15 +14,30 @@ The functions included in this script are:
         - Logs the function's activity.
         - Handles Errors related to querying VariantValidator API.
 
+    - fetch_vv_batch:
+        - Takes in a list of variants described in VCF format.
+        - Queries the VariantValidator API for the whole list in
+          one request, by separating the variants with '|'.
+        - Returns the HGVS nomenclatures, gene symbol and HGNC ID
+          for every variant that was resolved cleanly, so that
+          only the remaining variants are sent to fetch_vv.
+
     - get_mane_nc:
         - Processes the variant queries made through the flask app.
         - Queries the VariantValidator API.
         - Contextualises the variant within the GRCh38 MANE select
           transcript.
         - Returns the HGVS transcript description of the variant.
+        - Stores the HGVS genomic description against the search
+          term, so that repeated searches do not query
+          VariantValidator again.
         - Logs the function's activity.
         - Handles Errors related to querying VariantValidator API.
 
+All requests to VariantValidator are sent through vv_session, so that
+connections are reused between requests, and are spaced at least
+VV_MIN_INTERVAL seconds apart by _wait_for_vv, across every thread.
+
 No patient data is processed here.
 Some of the code used in this script derived from ChatGPT.
 """
@@ -30,11 +45,60 @@ Some of the code used in this script derived from ChatGPT.
 import re
 import time
 import json
+import threading
 import requests
+from requests.adapters import HTTPAdapter
 from flask import flash
 from tools.utils.timer import timer
 from tools.utils.logger import logger
-from tools.utils.error_handlers import request_status_codes, connection_error, json_decoder_error, regex_error
+from tools.utils.error_handlers import RETRY_STATUS_CODES, request_status_codes, connection_error, json_decoder_error, regex_error
+
+# Regex patterns used to check that the HGVS genomic (NC_), transcript (NM_) and protein (NP_) descriptions returned by
+# VariantValidator are in valid HGVS nomenclature.
+NC_REGEX = r'^NC_\d+.\d{1,2}:g[.]([-]*\d+|[-]*\d+_[-]*\d+|[-]*\d+[+-]\d+)([ACGT]+>[ACGT]+|delins[ACGT]*(>[ACGT]+)*|del[ACGT]*|ins[ACGT]*|dup[ACGT]*|inv[ACGT]*)'
+NM_REGEX = r'^NM_\d+.\d{1,2}:c[.]([-]*\d+|[-]*\d+_[-]*\d+|[-]*\d+[+-]\d+)([ACGT]+>[ACGT]+|delins[ACGT]*(>[ACGT]+)*|del[ACGT]*|ins[ACGT]*|dup[ACGT]*|inv[ACGT]*)'
+NP_REGEX = r'^NP_\d+.\d{1,2}:p[.](\()*(0)*(\?)*[*]*[?]*(\d*[a-zA-Z]{3})*(\d+[a-zA-Z]{3}(fs)*[*]*(\d+)*|\d*_[a-zA-Z]{3}\d+(ins)*[a-zA-Z]*|\d*_[a-zA-Z]{3}\d+(delins)*[a-zA-Z]*|\d+=|\d+[*]|ext\d*)*(\))*'
+
+# The maximum number of variants sent to VariantValidator in a single batch request.
+VV_BATCH_SIZE = 50
+
+# A single HTTP session shared by every request to VariantValidator. The session keeps connections to
+# rest.variantvalidator.org open (keep-alive) so that the TCP and TLS handshakes are only made once per connection,
+# rather than once per variant. The pool is large enough for the worker threads in fetch_vv_concurrently.
+vv_session = requests.Session()
+vv_session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=16))
+
+# The minimum number of seconds between the start of two requests to VariantValidator, shared by every thread sending
+# requests, so that no more than 2 requests are sent to the public VariantValidator API each second however many worker
+# threads are used by fetch_vv_concurrently.
+VV_MIN_INTERVAL = 0.5
+# Lock used while the time of the next request to VariantValidator is reserved.
+_VV_RATE_LOCK = threading.Lock()
+# The earliest time (from time.monotonic) that the next request to VariantValidator can be sent.
+_vv_next_request = 0.0
+
+
+def _wait_for_vv():
+    """
+    This function is called before every request to VariantValidator. It reserves the next free time for a request,
+    VV_MIN_INTERVAL seconds after the previous one, and waits until that time, so that the requests sent by every
+    thread stay within the fair-use limit of the VariantValidator API.
+
+    :command: _wait_for_vv()
+    """
+
+    global _vv_next_request
+
+    # Reserve the next free time for a request, so that each thread waits for its own turn.
+    with _VV_RATE_LOCK:
+        now = time.monotonic()
+        wait = _vv_next_request - now
+        _vv_next_request = max(now, _vv_next_request) + VV_MIN_INTERVAL
+
+    # Wait outside of the lock, so that other threads can reserve the following times.
+    if wait > 0:
+        time.sleep(wait)
+
 
 @timer
 def fetch_vv(variant: str):
@@ -72,21 +136,21 @@ def fetch_vv(variant: str):
                 f'HGNC ID from VariantValidator @ {url_vv}')
 
     try:
-        # For loop enables 5 attempts to query VariantValidator API, in case 408 or 429 request errors occur.
+        # For loop enables 5 attempts to query VariantValidator API, in case 408, 429, 502, 503 or 504 request errors occur.
         for attempt in range(5):
 
             # Test the query.
             try:
+                # Wait for the next free time to send a request, so that VariantValidator (VV) is not overloaded with
+                # requests.
+                _wait_for_vv()
+
                 # Send an HTTP GET request to the API.
-                response = requests.get(url_vv)
+                response = vv_session.get(url_vv)
 
                 # Raise an exception if the HTTP status code is not 200 (OK).
                 response.raise_for_status()
 
-                # The time module creates a 0.5s delay after each request to VariantValidator (VV), so that
-                # VariantValidator is not overloaded with requests.
-                time.sleep(0.5)
-
                 # Access the API response like its a Python dictionary.
                 data = response.json()
 
@@ -94,7 +158,7 @@ def fetch_vv(variant: str):
             except requests.exceptions.HTTPError as e:
 
                 # Handle HTTP errors that need to be tried again, through the attempt loop.
-                if e.response.status_code in [408, 429]:
+                if e.response.status_code in RETRY_STATUS_CODES:
                     error_message = request_status_codes(e, variant, url_vv, 'VariantValidator', attempt)
 
                     # Once received, return any flash messages to the function in database_functions.py, so that it can
@@ -102,7 +166,7 @@ def fetch_vv(variant: str):
                     # process failed.
                     if error_message:
                         return error_message
-                    # Move to the next attempt to see if the 408 or 429 error response can be avoided.
+                    # Move to the next attempt to see if the error response can be avoided.
                     continue
 
                 # Handle HTTP errors that do not need to be tried again.
@@ -233,7 +297,7 @@ def fetch_vv(variant: str):
                 # Checking the values from the dictionary.
                 try:
                     # Use Regex to detect if anything but the HGVS genomic description was returned.
-                    if not re.match(r'^NC_\d+.\d{1,2}:g[.]([-]*\d+|[-]*\d+_[-]*\d+|[-]*\d+[+-]\d+)([ACGT]+>[ACGT]+|delins[ACGT]*(>[ACGT]+)*|del[ACGT]*|ins[ACGT]*|dup[ACGT]*|inv[ACGT]*)', nc_variant):
+                    if not re.match(NC_REGEX, nc_variant):
 
                         # Log the error if anything but the HGVS genomic description was returned.
                         logger.warning(f'{variant}: Genomic variant description from VariantValidator is not in valid '
@@ -247,7 +311,7 @@ def fetch_vv(variant: str):
                                 f'HGVS nomenclature.')
 
                     # Use Regex to detect if an anything but the HGVS transcript description was returned.
-                    elif not re.match(r'^NM_\d+.\d{1,2}:c[.]([-]*\d+|[-]*\d+_[-]*\d+|[-]*\d+[+-]\d+)([ACGT]+>[ACGT]+|delins[ACGT]*(>[ACGT]+)*|del[ACGT]*|ins[ACGT]*|dup[ACGT]*|inv[ACGT]*)', nm_variant):
+                    elif not re.match(NM_REGEX, nm_variant):
 
                         # Log the error if anything but the HGVS transcript description was returned.
                         logger.warning(
@@ -262,7 +326,7 @@ def fetch_vv(variant: str):
                                 f'HGVS nomenclature.')
 
                     # Use Regex to detect if an anything but the HGVS protein description was returned.
-                    elif not re.match(r'^NP_\d+.\d{1,2}:p[.](\()*(0)*(\?)*[*]*[?]*(\d*[a-zA-Z]{3})*(\d+[a-zA-Z]{3}(fs)*[*]*(\d+)*|\d*_[a-zA-Z]{3}\d+(ins)*[a-zA-Z]*|\d*_[a-zA-Z]{3}\d+(delins)*[a-zA-Z]*|\d+=|\d+[*]|ext\d*)*(\))*', np_variant):
+                    elif not re.match(NP_REGEX, np_variant):
 
                         # Log the warning if anything but the HGVS protein description was returned.
                         # A warning is logged because the protein description is not essential to this software
@@ -371,6 +435,131 @@ def fetch_vv(variant: str):
         # name where the queried variant comes from. This will help the User.
         return f'{variant}: ❌ VariantValidator unavailable. Try again later.'
 
+def _parse_vv_record(record):
+    """
+    This function extracts the HGVS genomic, transcript and protein descriptions, gene symbol and HGNC ID from a single
+    variant record in a VariantValidator response. It only accepts records that fetch_vv would accept without any
+    warnings, so that any irregular record can be handled by fetch_vv instead.
+
+    :params: record: The dictionary describing one variant in a VariantValidator response.
+
+    :output: (nc_variant, nm_variant, np_variant, gene_symbol, hgnc_id), or None if the record is irregular.
+
+       E.g.: ('NC_000011.10:g.2164285C>T', 'NM_000360.4:c.1442G>A, 'NP_000351.2:p.(Gly481Asp)', 'TH', '11782')
+    """
+
+    try:
+        # Extract the information from the record.
+        nm_variant = record['hgvs_transcript_variant']
+        nc_variant = record['primary_assembly_loci']['grch38']['hgvs_genomic_description']
+        np_variant = record['hgvs_predicted_protein_consequence']['tlr']
+        gene_symbol = record['gene_symbol']
+        hgnc_id = record['gene_ids']['hgnc_id'].split(':')[1]
+
+        # Check that every value is as fetch_vv expects it to be.
+        if (re.match(NC_REGEX, nc_variant) and re.match(NM_REGEX, nm_variant) and re.match(NP_REGEX, np_variant)
+                and re.match(r'^[A-Za-z0-9]{1,9}$', gene_symbol) and re.match(r'^\d+', hgnc_id)):
+            return (nc_variant, nm_variant, np_variant, gene_symbol, hgnc_id)
+
+    # Any missing or irregular values are handled by fetch_vv.
+    except (KeyError, IndexError, TypeError, AttributeError):
+        pass
+
+    return None
+
+
+@timer
+def fetch_vv_batch(variants: list):
+    """
+    Query the VariantValidator REST API for a list of variants in VCF format with a single request, by separating the
+    variants with '|'. Records in the response are matched to the variants that were submitted using the
+    'submitted_variant' key.
+    Only variants that were resolved cleanly are returned. Variants that VariantValidator could not resolve, raised a
+    warning for, or returned an irregular record for, are left out so that they can be queried individually through
+    fetch_vv, which reports the problem to the User.
+    If the request fails, an empty dictionary is returned and every variant is queried through fetch_vv.
+
+    :params: variants: A list of variants in VCF format: {chromosome}-{position}-{ref}-{alt}
+                 E.g.: ['17-45983420-G-T', '4-89822305-C-G']
+
+    :output: resolved: A dictionary where each variant that was resolved is a key and its value is the same tuple that
+                       fetch_vv returns.
+
+               E.g.: {'17-45983420-G-T': ('NC_000017.11:g.45983420G>T', 'NM_001377265.1:c.841G>T',
+                                          'NP_001364194.1:p.(Val281Phe)', 'MAPT', '6893')}
+    """
+
+    # Create a dictionary to store the variants that were resolved.
+    resolved = {}
+
+    # A single variant is sent straight to fetch_vv.
+    if len(variants) < 2:
+        return resolved
+
+    # Construct the API request URL for the batch, in the same way as fetch_vv.
+    base_url_vv = "https://rest.variantvalidator.org/VariantValidator/variantvalidator/GRCh38/"
+    url_vv = f"{base_url_vv}{'|'.join(variants)}/mane?content-type=application%2Fjson"
+
+    # Log the start of the query.
+    logger.info(f'fetch_vv_batch: Retrieving variant information for {len(variants)} variants from VariantValidator.')
+
+    try:
+        # Wait for the next free time to send a request, so that VariantValidator is not overloaded with requests.
+        _wait_for_vv()
+
+        # Send an HTTP GET request to the API.
+        response = vv_session.get(url_vv)
+
+        # Raise an exception if the HTTP status code is not 200 (OK).
+        response.raise_for_status()
+
+        # Access the API response like its a Python dictionary.
+        data = response.json()
+
+    # If the batch request fails for any reason, the variants are queried individually.
+    except (requests.exceptions.RequestException, ValueError) as e:
+        logger.warning(f'fetch_vv_batch: Batch request to VariantValidator failed. '
+                       f'Variants will be queried individually: {e}')
+        return resolved
+
+    # Handle unexpected responses from the VariantValidator API.
+    if not isinstance(data, dict):
+        logger.warning('fetch_vv_batch: VariantValidator did not return a dictionary. '
+                       'Variants will be queried individually.')
+        return resolved
+
+    for key, record in data.items():
+        # Skip the metadata and the records for variants that VariantValidator could not validate.
+        if key.startswith('validation_warning_') or not isinstance(record, dict):
+            continue
+
+        # Match the record to the variant that was submitted. Only the first record for each variant is used, in the
+        # same way as fetch_vv.
+        variant = record.get('submitted_variant')
+        if variant not in variants or variant in resolved:
+            continue
+
+        # Store the variant information if the record is regular.
+        variant_info = _parse_vv_record(record)
+        if variant_info:
+            resolved[variant] = variant_info
+
+    # Log the number of variants that were resolved from the batch.
+    logger.info(f'fetch_vv_batch: {len(resolved)} of {len(variants)} variants resolved by VariantValidator.')
+
+    return resolved
+
+
+# The HGVS genomic descriptions retrieved by get_mane_nc, stored against the variant search term entered by the User, so
+# that searching for the same variant again does not query VariantValidator again. The oldest search terms are removed
+# once MANE_NC_CACHE_SIZE search terms are stored.
+_MANE_NC_CACHE = {}
+MANE_NC_CACHE_SIZE = 1024
+# Lock used while _MANE_NC_CACHE is read from or added to, because searches from different Users are handled by
+# different threads of the flask app.
+_MANE_NC_CACHE_LOCK = threading.Lock()
+
+
 @timer
 def get_mane_nc(variant: str):
     """
@@ -402,6 +591,42 @@ def get_mane_nc(variant: str):
               get_mane_nc(variant)
     """
 
+    # Return the HGVS genomic description if this variant has been searched for already. The description is read once,
+    # under the lock, so that it cannot be removed by another thread between checking for it and returning it.
+    if isinstance(variant, str):
+        with _MANE_NC_CACHE_LOCK:
+            cached_nc = _MANE_NC_CACHE.get(variant)
+        if cached_nc is not None:
+            logger.info(f"User's variant query: {variant}. HGVS genomic description retrieved from cache: {cached_nc}")
+            return cached_nc
+
+    nc_variant = _fetch_mane_nc(variant)
+
+    # Only store HGVS genomic descriptions, so that search terms that failed are sent to VariantValidator again.
+    if isinstance(nc_variant, str) and nc_variant.startswith('NC_'):
+        with _MANE_NC_CACHE_LOCK:
+            # Remove the oldest search term once the cache is full.
+            if variant not in _MANE_NC_CACHE and len(_MANE_NC_CACHE) >= MANE_NC_CACHE_SIZE:
+                _MANE_NC_CACHE.pop(next(iter(_MANE_NC_CACHE)), None)
+            _MANE_NC_CACHE[variant] = nc_variant
+
+    return nc_variant
+
+
+def _fetch_mane_nc(variant: str):
+    """
+    This function queries VariantValidator for the HGVS genomic description of a variant search term, for get_mane_nc.
+    Search terms that use a gene symbol are converted into the MANE select transcript and passed back to get_mane_nc.
+
+    :params: variant: A variant described by the gene it is located in followed by the variant, in HGVS nomenclature.
+                E.g.: LDLR:c.301G>A
+
+    :output: nc_variant: The HGVS genomic description, or None if it could not be retrieved.
+                   E.g.: NC_000019.10:g.11102774G>A
+
+    :command: nc_variant = _fetch_mane_nc('LDLR:c.301G>A')
+    """
+
     # Base URL for the VariantValidator API.
     base_url_vv = "https://rest.variantvalidator.org/VariantValidator/"
 
@@ -605,20 +830,20 @@ def get_mane_nc(variant: str):
 
     # ----- Make the API request and handle the response -----
 
-    # For loop enables 5 attempts to query VariantValidator API, in case 408 or 429 request errors occur.
+    # For loop enables 5 attempts to query VariantValidator API, in case 408, 429, 502, 503 or 504 request errors occur.
     for attempt in range(5):
 
         try:
+            # Wait for the next free time to send a request, so that VariantValidator (VV) is not overloaded with
+            # requests.
+            _wait_for_vv()
+
             # Send an HTTP GET request to the API.
-            response = requests.get(url_vv)
+            response = vv_session.get(url_vv)
 
             # Raise an exception if the HTTP status code is not 200 (OK).
             response.raise_for_status()
 
-            # The time module creates a 0.5s delay after each request to VariantValidator (VV), so that VV is not
-            # overloaded with requests.
-            time.sleep(0.5)
-
             # Parse the API response into a Python dictionary.
             data = response.json()
 
@@ -626,7 +851,7 @@ def get_mane_nc(variant: str):
         except requests.exceptions.HTTPError as e:
 
             # Handle HTTP errors that need to be tried again.
-            if e.response.status_code in [408, 429]:
+            if e.response.status_code in RETRY_STATUS_CODES:
                 error_message = request_status_codes(e, variant, url_vv, 'VariantValidator', attempt)
 
                 # Once received, display a flash message to the User that will help them understand why the API request
@@ -634,7 +859,7 @@ def get_mane_nc(variant: str):
                 if error_message:
                     flash(f'Variant Query Error: {error_message}')
                     return
-                # Move to the next attempt to see if the 408 or 429 error response can be avoided.
+                # Move to the next attempt to see if the error response can be avoided.
                 continue
 
             # Handle HTTP errors that do not need to be tried again.
@@ -9,6 +9,7 @@ The exceptions included in this script are:
                         - 408
                         - 429
                         - 500
+                        - 502
                         - 503
                         - 504
     - requests.exceptions.ConnectionError
@@ -18,6 +19,10 @@ The exceptions included in this script are:
     - sqlite3.DatabaseError
     - sqlite3.ProgrammingError
 
+Requests that fail with a 408, 429, 502, 503 or 504 status code are
+retried with an exponential backoff, using retry_delay, which honours
+the Retry-After header sent by the server.
+
 The purpose of each function is to log the exception and
 provide Users of the flask app with messages to help them
 understand the nature of the error.
@@ -27,15 +32,68 @@ Some of the code used in this script derived from ChatGPT.
 """
 
 import time
+import random
 import sqlite3
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
 from tools.utils.logger import logger
 from http.client import RemoteDisconnected
 
+# The HTTP status codes of responses that are worth requesting again, because the server is temporarily overloaded or
+# unavailable.
+RETRY_STATUS_CODES = (408, 429, 502, 503, 504)
+
+# The longest time, in seconds, to wait before requesting again.
+MAX_RETRY_DELAY = 30
+
+
+def retry_delay(e, attempt):
+    """
+    This function calculates how long to wait before sending a request again, after a response with one of the
+    RETRY_STATUS_CODES was received.
+    If the server sent a Retry-After header, stating the number of seconds or the date to wait until, it is honoured.
+    Otherwise, the delay doubles with each attempt (1, 2, 4, 8... seconds), with up to 1 second of random jitter so that
+    concurrent requests do not all retry at the same moment. The delay is never longer than MAX_RETRY_DELAY.
+
+    :params: e: The requests.exceptions.HTTPError exception that was raised.
+
+       attempt: The number of the attempt when the HTTPError exception was raised.
+          E.g.: 0, 1, 2, 3, 4
+
+    :output: delay: The number of seconds to wait before the next attempt.
+               E.g.: 2.37
+
+    :command: time.sleep(retry_delay(e, attempt))
+    """
+
+    # Retrieve the Retry-After header from the response, if there was one.
+    headers = getattr(e.response, 'headers', None) or {}
+    retry_after = headers.get('Retry-After')
+
+    if retry_after:
+        try:
+            # Retry-After can be a number of seconds...
+            delay = float(retry_after)
+        except ValueError:
+            try:
+                # ...or an HTTP date to wait until.
+                delay = (parsedate_to_datetime(retry_after) - datetime.now(timezone.utc)).total_seconds()
+            except (TypeError, ValueError):
+                delay = None
+
+        if delay is not None:
+            # Log the delay requested by the server.
+            logger.debug(f'Server requested a delay of {retry_after} before trying again.')
+            return min(max(delay, 0), MAX_RETRY_DELAY)
+
+    # Exponential backoff with jitter.
+    return min(2 ** attempt + random.uniform(0, 1), MAX_RETRY_DELAY)
+
 
 def request_status_codes(e, variant, url, API, attempt):
     """
     This function handles requests.exceptions.HTTPError exceptions that arise from requests.get responses that have one
-    of the following status codes: 400, 404, 408, 429, 500, 503 or 504. These are some of the most common status codes
+    of the following status codes: 400, 404, 408, 429, 500, 502, 503 or 504. These are some of the most common status codes
     to receive when an HTTPError exception is raised.
     This function uses the exception (e), the variant, the API being queried, the request URL and attempt (if multiple
     attempts are being made to receive a response) to configure log messages and flash messages tailored around the
@@ -67,7 +125,7 @@ def request_status_codes(e, variant, url, API, attempt):
                 'ClinVar'
 
        Attempt: The number of the attempt when the HTTPError exception was raised. Requests are retried when a
-                response has either a 408 or 429 status code, by iterating through up to 5 attempts.
+                response has a 408, 429, 502, 503 or 504 status code, by iterating through up to 5 attempts.
           E.g.: '0', '1', '2', '3', '4'
 
     :output: A message that will be incorporated into a flash message that will be displayed to the User on the
@@ -102,7 +160,7 @@ def request_status_codes(e, variant, url, API, attempt):
 
         if attempt < 3:
             # Create a delay between attempts if 408 error is raised.
-            time.sleep(2 ** attempt)
+            time.sleep(retry_delay(e, attempt))
             # Log a warning if another request needs to be sent.
             logger.warning(
                 f'{variant}: HTTPError 408: Request Timeout. Request could not reach {API} server in time: {url}')
@@ -118,8 +176,8 @@ def request_status_codes(e, variant, url, API, attempt):
     elif e.response.status_code == 429:
 
         if attempt < 4:
-            # Create a delay between attempts if 429 error is raised.
-            time.sleep(2 ** attempt)
+            # Create a delay between attempts if 429 error is raised, honouring the Retry-After header.
+            time.sleep(retry_delay(e, attempt))
             # Log a warning if another request needs to be sent.
             logger.warning(
                 f'{variant}: HTTPError 429: Too Many Requests. {API} is currently overloaded with requests.{url}')
@@ -137,6 +195,21 @@ def request_status_codes(e, variant, url, API, attempt):
         return (f'{variant}: ❌ HTTPError 500: '
                 f'Internal Server Error. {API} API server crashed. Its not your fault. Please try again later.')
 
+    # Handle 502, 503 and 504 status error codes, which are usually temporary, by trying again.
+    elif e.response.status_code in [502, 503, 504] and attempt < 4:
+        # Create a delay between attempts, honouring the Retry-After header.
+        time.sleep(retry_delay(e, attempt))
+        # Log a warning if another request needs to be sent.
+        logger.warning(f'{variant}: HTTPError {e.response.status_code}: {API} API is temporarily unavailable. {url}')
+        # Log a description of which attempt out of 5 is going to be tried.
+        logger.info(f'{variant}: Trying to retrieve variant information from {API} again. Attempt: {attempt + 2}/5')
+
+    # Handle a 502 Bad Gateway status error code. Log the error and return a message to notify the User.
+    elif e.response.status_code == 502:
+        logger.error(f'{variant}: HTTPError 502: Bad Gateway. {API} API received an invalid response upstream. {url}')
+        return (f'{variant}: ❌ HTTPError 502: '
+                f'Bad Gateway. {API} API is unavailable. Its not your fault. Please try again later.')
+
     # Handle a 503 Service Unavailable status error code. Log the error and return a message to notify the User.
     elif e.response.status_code == 503:
         logger.error(f'{variant}: HTTPError 503: '
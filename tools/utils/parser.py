@@ -4,14 +4,25 @@ reference nucleotide sequence and variant sequence from every line/
 row that describes a variant detected by NGS, in a VCF or CSV file
 uploaded to the SEA - Variant Database Query tool flask app.
 
-The variant_parser function is responsible for:
-    - Reading each variant reported in the file uploaded by User of
-      the flask_app
-    - Converting each variant into VCF format:
-      {chromosome}-{position}-{ref}-{alt}
-    - Storing the variants from a file, into a list that is most
-      likely fed to the fetch_vv function before being stored in a
-      variant database.
+The functions included in this script are:
+    - iter_variants:
+        - Reading each variant reported in the file uploaded by User
+          of the flask_app, one line at a time.
+        - Converting each variant into VCF format:
+          {chromosome}-{position}-{ref}-{alt}
+        - Yielding each variant as soon as it has been parsed, so
+          that the whole file never has to be held in memory.
+
+    - open_variant_file:
+        - Opening plain-text and gzip/bgzip-compressed variant files,
+          detected by their first two bytes, so that compressed
+          files do not need to be decompressed before upload.
+
+    - variant_parser:
+        - Storing the variants from a file, into a list that is most
+          likely fed to the fetch_vv function before being stored in
+          a variant database.
+        - Handling Errors related to opening the variant file.
 
 This function has only been tested on Single Nucleotide Polymorphisms.
 We cannot confirm if it will work as well on other variant types such
@@ -19,36 +30,70 @@ as Indels, CNVs and splice-site variants.
 """
 
 import csv
+import gzip
 from flask import flash
 from tools.utils.logger import logger
 
 
-def variant_parser(file):
+# The size of the buffer used to read variant files (1 MiB), so that large files are read in fewer system calls.
+READ_BUFFER_SIZE = 1 << 20
+
+# The file extensions of the variant files that can be uploaded to the flask app. Compressed files are decompressed
+# while they are being read. Filenames are converted to lower case before they are compared with these extensions.
+VARIANT_FILE_EXTENSIONS = ('.vcf', '.csv', '.vcf.gz', '.vcf.bgz', '.csv.gz')
+
+# The first two bytes of every gzip (and bgzip) compressed file.
+GZIP_MAGIC = b'\x1f\x8b'
+
+
+def open_variant_file(file):
     '''
-    This function  extracts and parses the variants from .vcf and .csv files. It then stores the variants in a
-    list.
-    The variant_list is returned.
+    This function opens a variant file as text. gzip and bgzip compressed files are recognised by their first two bytes
+    rather than their file extension, and are decompressed while they are being read.
+
+    :params: file: This is a filepath that leads to the .csv or.vcf file uploaded by the user, which may be compressed.
+
+             E.g.: '/<path>/<from>/<root>/<to>/<base>/<directory>/<of>/
+                      Software_Engineering_Assessment_2025_AR_RW_RS/temp/<Patient ID>.vcf.gz'
+
+    :output: A text file object that yields the lines of the variant file.
+
+    :command: with open_variant_file(file) as lines:
+                  for line in lines:
+                      print(line)
+    '''
+
+    # Read the first two bytes of the file to check if it is compressed.
+    with open(file, 'rb') as f:
+        magic = f.read(2)
+
+    # Decompress gzip and bgzip files (bgzip files are gzip files made of multiple blocks).
+    if magic == GZIP_MAGIC:
+        logger.info(f"Variant Parser: {file.split('/')[-1]} is compressed and will be decompressed while parsing.")
+        return gzip.open(file, 'rt')
+
+    return open(file, 'r', buffering=READ_BUFFER_SIZE)
+
+
+def iter_variants(file):
+    '''
+    This function extracts and parses the variants from .vcf and .csv files, one line at a time, and yields each variant
+    as soon as it has been parsed. The file is only read as far as the caller iterates, and is closed afterwards.
+    Irregular lines are skipped, logged and reported to the User.
 
     :params: file: This is a filepath that leads to the .csv or.vcf file uploaded by the user.
-                   The files are stored in the 'temp' subdirectory, located in the base-directory of this software
-                   package. The filepath is not hardcoded into the script because it is the absolute filepath within
-                   the respective system that this software package was loaded in.
 
              E.g.: '/<path>/<from>/<root>/<to>/<base>/<directory>/<of>/
                       Software_Engineering_Assessment_2025_AR_RW_RS/temp/<Patient ID>.<vcf or csv>'
 
-    :output: variant_list: A list of the variants extracted from the input file. Variants are denoted as
-                           {chromosome}-{position}-{ref}-{alt}
+    :output: variant: Each variant extracted from the input file, denoted as {chromosome}-{position}-{ref}-{alt}
 
-                     E.g.: ['17-45983420-G-T', '4-89822305-C-G', '1-7984999-T-A', '19-41968837-C-G']
+               E.g.: '17-45983420-G-T'
 
-    :command: file = '/<path>/<to>/<base>/<directory>/<of>/
-                        Software_Engineering_Assessment_2025_AR_RW_RS/temp/Patient1.vcf'
-              variant_parser(file)
+    :command: for variant in iter_variants(file):
+                  print(variant)
     '''
 
-    # A list in which to store the variants extracted from the input file.
-    variant_list = []
     # A counter to count the lines.
     line_number = 0
     # A counter to count the lines that were skipped (recommended by ChatGPT).
@@ -58,14 +103,17 @@ def variant_parser(file):
     # The filename of the variant file that variants are being parsed from, including the file extension.
     filename = file.split('/')[-1]
 
-    # Check that the filepath at the end of the file path can be accessed.
-    try:
-        # Checks if the input file is a .vcf file.
-        if file.endswith(('.vcf', '.VCF')):
-            # Log which type of file variants are being parsed from.
-            logger.info('Parsing variants from .VCF file.')
-            # Reads the content of the .vcf file.
-            lines = open(file, 'r')
+    # The file extension of a compressed file is ignored when checking the type of the variant file. The extension is
+    # compared in lower case, so that .VCF, .CSV and .VCF.GZ files are recognised.
+    file_type = file.lower().removesuffix('.gz').removesuffix('.bgz')
+
+    # Checks if the input file is a .vcf file.
+    if file_type.endswith('.vcf'):
+        # Log which type of file variants are being parsed from.
+        logger.info('Parsing variants from .VCF file.')
+
+        # Reads the content of the .vcf file. The file is closed once every line has been read.
+        with open_variant_file(file) as lines:
 
             # Iterates through each line in the .vcf file.
             for line in lines:
@@ -74,8 +122,12 @@ def variant_parser(file):
                     line_number = line_number + 1
                     continue
 
+                # Split the variant line into its columns once. Only the first five columns are needed, so the INFO,
+                # FORMAT and sample columns at the end of the line are left together.
+                fields = line.split('\t', 5)
+
                 # Identify variant lines without at least CHROMOSOME; POSITION; ID; REF; ALT values and skip them.
-                elif len(line.split('\t')) < 5:
+                if len(fields) < 5:
                     # Identify the line number of the line currently being processed through the loop.
                     line_number = line_number + 1
                     # Increase the counter for the number of lines that were skipped by 1.
@@ -93,21 +145,22 @@ def variant_parser(file):
                     # Check that the values parsed from the variant file are as they should be.
                     try:
                         # Extracts the chromosome from the variant line.
-                        chromosome = line.split('\t')[0].replace('chr', '')
+                        chromosome = fields[0].replace('chr', '')
                         # Extracts the position from the variant line and validates that it is an integer.
-                        position = int(line.split('\t')[1])
+                        position = int(fields[1])
                         # Extracts the REF allele from the variant line.
-                        ref = line.split('\t')[3]
-                        # Extracts the ALT allele from the variant line.
-                        alt = line.split('\t')[4]
+                        ref = fields[3]
+                        # Extracts the ALT allele from the variant line. If ALT is the last column, the line ending is
+                        # removed from it.
+                        alt = fields[4].rstrip('\r\n')
                         # Combines the above values into a format that will support queries to Variant Validator.
                         variant = f'{chromosome}-{position}-{ref}-{alt}'
 
                         # Identify the line number of the line currently being processed through the loop.
                         line_number = line_number + 1
-                        # Log the variant that was parsed.
-                        logger.info(f'Variant Parser: {variant} parsed from line {line_number} in {filename}.')
-                        # Increase the counter that counts the number of variants that were parsed by 1.
+                        # Increase the counter that counts the number of variants that were parsed by 1. Each variant
+                        # is not logged individually, since a VCF can contain millions of variants; the number of
+                        # variants parsed is logged once the whole file has been read.
                         parsed_number = parsed_number + 1
 
                     # Raise a ValueError exception if the values parsed from the variant file is irregular.
@@ -123,17 +176,16 @@ def variant_parser(file):
                               f"irregular and was not parsed.")
                         continue
 
-                # Appends the variant to a list.
-                variant_list.append(variant.split('\n')[0])
-
+                # Yields the variant to the caller.
+                yield variant
 
-        # Checks if the input file is a .csv file.
-        if file.endswith(('.csv', '.CSV')):
-            # Log which type of file variants are being parsed from.
-            logger.info('Parsing variants from .CSV file.')
+    # Checks if the input file is a .csv file.
+    if file_type.endswith('.csv'):
+        # Log which type of file variants are being parsed from.
+        logger.info('Parsing variants from .CSV file.')
 
-            # Reads the content of the .csv file.
-            csv_file = open(file, 'r')
+        # Reads the content of the .csv file. The file is closed once every row has been read.
+        with open_variant_file(file) as csv_file:
             rows = csv.reader(csv_file)
 
             # Iterates through each row in the .csv file.
@@ -176,9 +228,8 @@ def variant_parser(file):
                         # Combines the above values into a format that will support queries to Variant Validator.
                         variant = f'{chromosome}-{position}-{ref}-{alt}'
 
-                        # Log the variant that was parsed.
-                        logger.info(f'Variant Parser: {variant} parsed from row {line_number} in {filename}.')
-                        # Increase the counter that counts the number of variants that were parsed by 1.
+                        # Increase the counter that counts the number of variants that were parsed by 1. The number of
+                        # variants parsed is logged once the whole file has been read.
                         parsed_number = parsed_number + 1
 
                     # Raise a ValueError exception if the values parsed from the variant file is irregular.
@@ -194,8 +245,45 @@ def variant_parser(file):
                               f"irregular and was not parsed.")
                         continue
 
-                # Appends the variant to a list.
-                variant_list.append(variant)
+                # Yields the variant to the caller.
+                yield variant
+
+    # Log the number of variants that were parsed and the number of variants that were skipped.
+    if parsed_number:
+        logger.info(f'Variant Parser: {filename}: Parsed: {parsed_number}; Skipped: {skip_number}.')
+
+
+def variant_parser(file):
+    '''
+    This function  extracts and parses the variants from .vcf and .csv files, using iter_variants. It then stores the
+    variants in a list.
+    The variant_list is returned.
+
+    :params: file: This is a filepath that leads to the .csv or.vcf file uploaded by the user.
+                   The files are stored in the 'temp' subdirectory, located in the base-directory of this software
+                   package. The filepath is not hardcoded into the script because it is the absolute filepath within
+                   the respective system that this software package was loaded in.
+
+             E.g.: '/<path>/<from>/<root>/<to>/<base>/<directory>/<of>/
+                      Software_Engineering_Assessment_2025_AR_RW_RS/temp/<Patient ID>.<vcf or csv>'
+
+    :output: variant_list: A list of the variants extracted from the input file. Variants are denoted as
+                           {chromosome}-{position}-{ref}-{alt}
+
+                     E.g.: ['17-45983420-G-T', '4-89822305-C-G', '1-7984999-T-A', '19-41968837-C-G']
+
+    :command: file = '/<path>/<to>/<base>/<directory>/<of>/
+                        Software_Engineering_Assessment_2025_AR_RW_RS/temp/Patient1.vcf'
+              variant_parser(file)
+    '''
+
+    # The filename of the variant file that variants are being parsed from, including the file extension.
+    filename = file.split('/')[-1]
+
+    # Check that the filepath at the end of the file path can be accessed.
+    try:
+        # Store the variants extracted from the input file in a list.
+        variant_list = list(iter_variants(file))
 
     # Raise an exception if the variant file could not be found.
     except FileNotFoundError as e:
@@ -213,6 +301,14 @@ def variant_parser(file):
         flash(f'❌ Variant Parser Error: You do not have permission to access {filename}.')
         return
 
+    # Raise an exception if a compressed variant file is corrupted or truncated.
+    except (gzip.BadGzipFile, EOFError) as e:
+        # Log the error.
+        logger.error(f"Variant Parser Error: Compressed variant file '{filename}' could not be decompressed: {e}")
+        # Notify the User.
+        flash(f'❌ Variant Parser Error: {filename} could not be decompressed. Please check the file.')
+        return
+
     if not variant_list or len(variant_list) == 0:
         # Log that no variants were parsed.
         logger.warning(f'Variant Parser: Nothing was parsed from {filename}.')
@@ -220,8 +316,5 @@ def variant_parser(file):
         flash(f'⚠ Variant Parser: Nothing was parsed from {filename}.')
         return
 
-    # Log the number of variants that were parsed and the number of variants that were skipped.
-    logger.info(f'Variant Parser: {filename}: Parsed: {parsed_number}; Skipped: {skip_number}.')
-
     # Returns the patient ID and the list of variants from the input file.
-    return variant_list
\ No newline at end of file
+    return variant_list
@@ -0,0 +1,161 @@
+"""
+vv_cache.py: This script stores the responses received from
+VariantValidator in a small SQLite database on disk, so that the
+same variant does not have to be sent to VariantValidator again
+every time a variant file is uploaded to the SEA - Variant Database
+Query tool flask app.
+
+The functions included in this script are:
+    - read_vv_cache:
+        - Retrieve the stored VariantValidator responses for a list
+          of variants.
+        - Ignore responses that are older than VV_CACHE_EXPIRY.
+
+    - write_vv_cache:
+        - Store the successful VariantValidator responses returned
+          by fetch_vv.
+
+Only complete responses from fetch_vv (the HGVS genomic, transcript
+and protein descriptions, gene symbol and HGNC ID) are stored. Error
+messages are never stored so that they are retried on the next
+upload. The cache is an optimisation: if it cannot be read or
+written, the error is logged and VariantValidator is queried as
+normal.
+"""
+
+import os
+import time
+import json
+import sqlite3
+from tools.utils.logger import logger
+
+# The absolute filepath to the cache database, stored in the 'cache' directory in the base-directory of this software
+# package. It is kept out of the 'databases' directory so that it is not listed as a variant database on the flask app.
+VV_CACHE_PATH = os.path.abspath(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'cache', 'vv_cache.db'))
+
+# The number of seconds that a response is stored for before VariantValidator is queried again (7 days).
+VV_CACHE_EXPIRY = 7 * 24 * 60 * 60
+
+
+def _connect():
+    """
+    This function connects to the cache database and creates the vv_cache table, if it does not already exist.
+
+    :output: conn: A connection to the cache database at VV_CACHE_PATH.
+    """
+
+    # Make the 'cache' directory if it does not exist.
+    os.makedirs(os.path.dirname(VV_CACHE_PATH), exist_ok=True)
+
+    # Connect to the cache database.
+    conn = sqlite3.connect(VV_CACHE_PATH)
+
+    # Create the vv_cache table, where each variant is stored once with its response and the time it was stored.
+    conn.execute("""
+                 CREATE TABLE IF NOT EXISTS vv_cache (
+                                                        variant TEXT PRIMARY KEY,
+                                                        response TEXT NOT NULL,
+                                                        created REAL NOT NULL
+                     )
+                 """)
+
+    return conn
+
+
+def read_vv_cache(variant_list):
+    """
+    This function retrieves the VariantValidator responses stored for the variants in a list, that were stored less than
+    VV_CACHE_EXPIRY seconds ago.
+
+    :params: variant_list: A list of variants parsed from a variant file by variant_parser.
+
+                     E.g.: ['17-45983420-G-T', '4-89822305-C-G']
+
+    :output: cached: A dictionary where each variant found in the cache is a key and its value is the response that was
+                     returned by fetch_vv. Variants that were not found are not included.
+
+               E.g.: {'17-45983420-G-T': ('NC_000017.11:g.45983420G>T', 'NM_001377265.1:c.841G>T',
+                                          'NP_001364194.1:p.(Val281Phe)', 'MAPT', 'HGNC:6893')}
+
+    :command: cached = read_vv_cache(['17-45983420-G-T', '4-89822305-C-G'])
+    """
+
+    # Create a dictionary to store the responses found in the cache.
+    cached = {}
+
+    # Nothing needs to be read if there aren't any variants or the cache has not been created yet.
+    if not variant_list or not os.path.exists(VV_CACHE_PATH):
+        return cached
+
+    # Responses stored before this time have expired.
+    oldest = time.time() - VV_CACHE_EXPIRY
+
+    try:
+        conn = _connect()
+        try:
+            # SQLite limits the number of '?' placeholders in a query, so the variants are looked up in chunks.
+            variants = list(dict.fromkeys(variant_list))
+            for i in range(0, len(variants), 500):
+                chunk = variants[i:i + 500]
+                placeholders = ','.join('?' * len(chunk))
+                rows = conn.execute(f"SELECT variant, response FROM vv_cache "
+                                    f"WHERE created >= ? AND variant IN ({placeholders})", (oldest, *chunk))
+                for variant, response in rows:
+                    # JSON stores the tuple from fetch_vv as a list, so it is converted back into a tuple.
+                    cached[variant] = tuple(json.loads(response))
+        finally:
+            # Close the connection to the cache database.
+            conn.close()
+
+    # If the cache cannot be read, VariantValidator is queried for every variant instead.
+    except Exception as e:
+        logger.warning(f'read_vv_cache: Could not read VariantValidator cache at {VV_CACHE_PATH}: {e}')
+        return {}
+
+    # Log the number of variants that were found in the cache.
+    logger.info(f'read_vv_cache: {len(cached)} of {len(variant_list)} variants found in the VariantValidator cache.')
+
+    return cached
+
+
+def write_vv_cache(vv_responses):
+    """
+    This function stores the successful responses returned by fetch_vv in the cache database. Responses that are not a
+    tuple (error messages or exceptions) are not stored.
+
+    :params: vv_responses: A dictionary where each variant is a key and its value is the output from fetch_vv.
+
+                     E.g.: {'17-45983420-G-T': ('NC_000017.11:g.45983420G>T', 'NM_001377265.1:c.841G>T',
+                                                'NP_001364194.1:p.(Val281Phe)', 'MAPT', 'HGNC:6893'),
+                            '4-89822305-C-G': 'VariantValidator unavailable'}
+
+    :command: write_vv_cache(vv_responses)
+    """
+
+    # Only keep the complete responses from fetch_vv.
+    rows = [(variant, json.dumps(list(response)), time.time())
+            for variant, response in vv_responses.items()
+            if isinstance(response, tuple) and len(response) == 5]
+
+    # Nothing needs to be written if there aren't any successful responses.
+    if not rows:
+        return
+
+    try:
+        conn = _connect()
+        try:
+            # Store the responses, replacing any responses that were previously stored for the same variants.
+            with conn:
+                conn.executemany("INSERT OR REPLACE INTO vv_cache (variant, response, created) VALUES (?, ?, ?)", rows)
+        finally:
+            # Close the connection to the cache database.
+            conn.close()
+
+    # If the cache cannot be written to, the responses will be requested from VariantValidator again next time.
+    except Exception as e:
+        logger.warning(f'write_vv_cache: Could not write to VariantValidator cache at {VV_CACHE_PATH}: {e}')
+        return
+
+    # Log the number of responses that were stored.
+    logger.info(f'write_vv_cache: {len(rows)} VariantValidator responses stored in the cache.')